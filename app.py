@@ -1,27 +1,103 @@
 # app.py — object-oriented, modular Flask app with docstrings and comments
 from __future__ import annotations
 
+import atexit
+import gzip
+import hashlib
+import itertools
 import json
 import logging
+import mimetypes
 import os
+import queue
 import shutil
-from dataclasses import dataclass
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from flask import (
     Flask,
+    Response,
     abort,
     flash,
+    g,
     jsonify,
     redirect,
     render_template,
     request,
-    send_from_directory,
+    send_file,
+    stream_with_context,
     url_for,
 )
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 
+from blobstore import BLOBS_DIR_NAME, BlobStore
+from chunked_upload import (
+    UPLOAD_MAX_CHUNK_SIZE,
+    UPLOAD_MAX_SIZE,
+    UPLOAD_SESSIONS_DIR_NAME,
+    ChunkedUploadManager,
+    UploadError,
+)
+from compression import (
+    COMPRESS_MIN_BYTES,
+    COMPRESS_STORE_DIR_NAME,
+    CompressedCache,
+    CompressedFileStore,
+    available_encodings,
+    find_sidecar,
+    is_compressible,
+    negotiate,
+)
+from css_schema import (
+    CSS_COMPLETE_DEFAULT_LIMIT,
+    CSS_COMPLETE_MAX_LIMIT,
+    CssSchemaIndex,
+)
+from fsutil import STATE_DIR_NAME, CoalescingWriter
+from patching import (
+    PatchConflict,
+    PatchError,
+    apply_edits,
+    apply_unified_diff,
+    content_hash,
+)
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, cache_samples, fs_timed
+from profiling import PROFILE_DIR_NAME, SlowRequestProfiler
+from quota import LimitedReader, Quota, QuotaExceeded, QuotaManager, Reservation
+from reaper import TRASH_DIR_NAME, TrashReaper
+from registry import REGISTRY_SORT_KEYS, ProjectRegistry
+from sharedcache import ProjectGenerations, SharedCache, open_backend, parse_size
+from startup import Lazy, StartupReport
+
+# Imported where first used, to keep startup fast: archive, batch, build,
+# clone, dom, history, images, live and search
+if TYPE_CHECKING:  # pragma: no cover
+    from batch import BatchRunner
+    from build import BuildReport, ProjectBuilder
+    from clone import CloneReport, TreeCloner
+    from dom import DomDocument, DomIndex
+    from history import HistoryStore
+    from images import ImageVariantPipeline
+    from live import LiveReloadHub
+    from search import SearchIndex
+
 # -----------------------------------------------------------------------------
 # Configuration & defaults
 # -----------------------------------------------------------------------------
@@ -36,9 +112,32 @@ ALLOWED_UPLOAD_EXT: Dict[str, Optional[set]] = {
     "files": None,
 }
 
+# Top-level project files that accept delta saves (see ProjectManager.patch_file)
+PATCHABLE_FILES = ("index.html", "style.css")
+
+# Staging area (under projects/) for archive imports and duplicates
+STAGING_DIR_NAME = ".staging"
+
+# Worker threads used for parallel file copies (duplicate_project)
+COPY_WORKERS = 8
+
+# Cache lifetime (seconds) of fingerprinted files in published builds
+PUBLISHED_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Live-reload streams one process serves through WSGI at once: each holds a
+# worker thread for as long as the page stays open (asgi.py serves them on
+# its event loop, without a thread, and is not limited). Past the cap the
+# stream is refused with 503 and the editor backs off, so under WSGI live
+# reload is best-effort: some open editors may go without it
+LIVE_MAX_WSGI_STREAMS = 2
+
+# Hot-file cache limits for project file serving (see FileCache)
+FILE_CACHE_MAX_ENTRIES = 512
+FILE_CACHE_MAX_FILE_BYTES = 512 * 1024
+FILE_CACHE_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
 
 LOG = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 
 # -----------------------------------------------------------------------------
@@ -49,6 +148,232 @@ def ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
+def accepts_gzip() -> bool:
+    """Return True if the current request accepts a gzip-encoded response."""
+    return "gzip" in request.accept_encodings
+
+
+@dataclass
+class JsonPayload:
+    """A JSON document serialized once, with a gzip copy and a strong ETag."""
+
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+    @classmethod
+    def from_obj(cls, obj) -> "JsonPayload":
+        body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=hashlib.sha1(body).hexdigest(),
+        )
+
+
+def payload_response(payload: JsonPayload) -> Response:
+    """Return a conditional JSON response, gzip-encoded when the client allows it."""
+    if accepts_gzip():
+        resp = Response(payload.gzipped, mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(payload.body, mimetype="application/json")
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(payload.etag)
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def cached_file_response(
+    entry: "CachedFile", compressed: Optional[CompressedCache] = None
+) -> Response:
+    """
+    Build a conditional response for a cached file. Text-like files are sent
+    compressed when the client accepts it; the compressed body comes from
+    `compressed` (or a fresh .br/.gz sidecar), keyed by the content hash.
+    """
+    body, etag, encoding = entry.data, entry.etag, None
+    negotiable = compressed is not None and is_compressible(entry.mimetype, entry.size)
+    if negotiable:
+        encoding = negotiate(request.accept_encodings, available_encodings())
+        if encoding is not None:
+            packed = compressed.get(entry.etag, encoding, entry.data, Path(entry.path))
+            if packed is None:
+                encoding = None
+            else:
+                body, etag = packed, f"{entry.etag}-{encoding}"
+    resp = Response(body, mimetype=entry.mimetype)
+    if encoding is not None:
+        resp.headers["Content-Encoding"] = encoding
+    if negotiable:
+        resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.last_modified = entry.mtime_ns / 1e9
+    # always revalidate: the preview must see edits immediately
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def file_response(
+    path: Path,
+    *,
+    max_age: Optional[int] = None,
+    store: Optional[CompressedFileStore] = None,
+) -> Response:
+    """
+    Stream a file from disk, sending its precompressed .br/.gz sidecar
+    instead when one is fresh and the client accepts it. Without a sidecar,
+    a text-like file is compressed once into `store` and sent from there.
+    """
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    negotiable = is_compressible(mimetype, COMPRESS_MIN_BYTES)
+    found = find_sidecar(path, request.accept_encodings) if negotiable else None
+    if found is None and negotiable and store is not None:
+        encoding = negotiate(request.accept_encodings, available_encodings())
+        packed = store.get(path, encoding) if encoding is not None else None
+        if packed is not None:
+            found = (encoding, packed)
+    encoding, source = found if found is not None else (None, path)
+    resp = send_file(
+        str(source), mimetype=mimetype, conditional=True, etag=True, max_age=max_age
+    )
+    if encoding is not None:
+        resp.headers["Content-Encoding"] = encoding
+    if negotiable:
+        resp.vary.add("Accept-Encoding")
+    return resp
+
+
+# -----------------------------------------------------------------------------
+# Caches
+# -----------------------------------------------------------------------------
+@dataclass
+class CachedFile:
+    """A small project file held in memory together with its validators."""
+
+    path: str
+    mtime_ns: int
+    size: int
+    data: bytes
+    etag: str
+    mimetype: str
+
+
+@dataclass
+class FileCache:
+    """
+    Bounded LRU cache of small project files.
+
+    Entries are looked up by (project, filename) and validated against the
+    file's current mtime/size, so a hit costs one stat() and no read.
+    Writers (saves, uploads) call `invalidate` to drop an entry eagerly.
+    """
+
+    max_entries: int = FILE_CACHE_MAX_ENTRIES
+    max_file_bytes: int = FILE_CACHE_MAX_FILE_BYTES
+    max_total_bytes: int = FILE_CACHE_MAX_TOTAL_BYTES
+    _entries: "OrderedDict[Tuple[str, str], CachedFile]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _total_bytes: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def get(self, key: Tuple[str, str]) -> Optional[CachedFile]:
+        """Return a still-valid entry for key, or None (stale entries are dropped)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            self._discard(key)
+            return None
+        if st.st_mtime_ns != entry.mtime_ns or st.st_size != entry.size:
+            self._discard(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry
+
+    @fs_timed("file_cache", "read")
+    def load(self, key: Tuple[str, str], path: Path) -> Optional[CachedFile]:
+        """
+        Read `path` into the cache under `key`.
+        Returns None (and caches nothing) if the file is too large to hold.
+        """
+        st = path.stat()
+        if st.st_size > self.max_file_bytes:
+            return None
+        data = path.read_bytes()
+        # the file changed between stat and read; let the caller stream it instead
+        if len(data) != st.st_size:
+            return None
+        entry = CachedFile(
+            path=str(path),
+            mtime_ns=st.st_mtime_ns,
+            size=st.st_size,
+            data=data,
+            etag=content_hash(data),
+            mimetype=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        )
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.size
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or self._total_bytes > self.max_total_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+        return entry
+
+    def invalidate(self, path: Path) -> None:
+        """Drop every entry for `path`, or for anything below it if it is a directory."""
+        target = str(path)
+        prefix = target.rstrip(os.sep) + os.sep
+        with self._lock:
+            stale = [
+                k
+                for k, e in self._entries.items()
+                if e.path == target or e.path.startswith(prefix)
+            ]
+            for k in stale:
+                self._total_bytes -= self._entries.pop(k).size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        """Drop a stale entry (counted as a miss)."""
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.size
+
+
+@dataclass
+class DeletedProject:
+    """A project `delete_project_held` keeps in the trash until restored or released."""
+
+    name: str
+    refs: Dict[str, str]
+    # (trash entry, path it was moved from): the project, its builds, its history
+    entries: List[Tuple[Path, Path]]
+
+
 # -----------------------------------------------------------------------------
 # Core managers (OOP)
 # -----------------------------------------------------------------------------
@@ -63,18 +388,138 @@ class ProjectManager:
 
     base_dir: Path
     projects_dir: Path
-
-    def __init__(self, base_dir: Optional[str] = None):
+    file_cache: FileCache
+    registry: ProjectRegistry
+    writer: CoalescingWriter
+    blobs: BlobStore
+    reaper: TrashReaper
+
+    def __init__(
+        self, base_dir: Optional[str] = None, file_cache: Optional[FileCache] = None
+    ):
         base = Path(base_dir) if base_dir else Path(__file__).parent
         self.base_dir = base.resolve()
         self.projects_dir = (self.base_dir / "projects").resolve()
+        self.file_cache = file_cache if file_cache is not None else FileCache()
+        self.compressed_cache = CompressedCache()
+        self.compressed_files = CompressedFileStore(
+            self.projects_dir / STATE_DIR_NAME / COMPRESS_STORE_DIR_NAME
+        )
         ensure_dir(self.projects_dir)
+        self.registry = ProjectRegistry(self.projects_dir)
+        self.writer = CoalescingWriter()
+        self.blobs = BlobStore(self.projects_dir / BLOBS_DIR_NAME)
+        self.reaper = TrashReaper(self.projects_dir / TRASH_DIR_NAME, self.blobs)
+        # blobs whose last project link went away outside `forget` (a file
+        # deleted by hand, a project reaped) are reclaimed by a full sweep
+        self.reaper.on_reaped.append(self.blobs.gc)
+        # per-project quotas that imports and copies reserve room in (set by
+        # create_app, which builds them on the registry)
+        self.quotas: Optional[QuotaManager] = None
+        self._builder: Optional[ProjectBuilder] = None
+        self._history: Optional[HistoryStore] = None
+        self._lazy_lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+        self._cloner: Optional[TreeCloner] = None
+        # callables(project_path, file_path) run after every in-app file write
+        self.write_listeners: List[Callable[[Path, Path], None]] = []
+        # callables(project name) run after a project is created, copied or deleted
+        self.project_listeners: List[Callable[[str], None]] = []
+        # ProjectGenerations shared with the other workers (None: single process)
+        self.generations: Optional[ProjectGenerations] = None
+
+    @property
+    def builder(self) -> ProjectBuilder:
+        """Publisher of project builds (created on first use)."""
+        if self._builder is None:
+            from build import BUILDS_DIR_NAME, ProjectBuilder
+
+            with self._lazy_lock:
+                if self._builder is None:
+                    self._builder = ProjectBuilder(self.projects_dir / BUILDS_DIR_NAME)
+        return self._builder
+
+    @property
+    def history(self) -> HistoryStore:
+        """Version history of saved files (created on first use)."""
+        if self._history is None:
+            from history import HISTORY_DIR_NAME, HistoryStore
+
+            with self._lazy_lock:
+                if self._history is None:
+                    self._history = HistoryStore(self.projects_dir / HISTORY_DIR_NAME)
+        return self._history
 
     def list_projects(self) -> List[str]:
-        """Return a list of project directory names."""
-        if not self.projects_dir.exists():
-            return []
-        return sorted([p.name for p in self.projects_dir.iterdir() if p.is_dir()])
+        """Return a list of project directory names (served from the registry)."""
+        return self.registry.names()
+
+    def file_written(
+        self, project_path: Path, file_path: Path, previous_size: Optional[int]
+    ) -> None:
+        """
+        Bookkeeping after a file inside a project was written (save or upload):
+        drop it from the hot-file cache, update the registry counters and
+        notify `write_listeners` (live reload, ...).
+        """
+        self.file_cache.invalidate(file_path)
+        self.registry.record_write(project_path.name, file_path, previous_size)
+        self._publish(project_path.name)
+        for listener in self.write_listeners:
+            try:
+                listener(project_path, file_path)
+            except Exception:
+                LOG.exception("write listener failed for %s", file_path)
+
+    def project_changed(self, name: str) -> None:
+        """Notify `project_listeners` that a whole project appeared or went away."""
+        self._publish(name, listing=True)
+        for listener in self.project_listeners:
+            try:
+                listener(name)
+            except Exception:
+                LOG.exception("project listener failed for %s", name)
+
+    def _publish(self, name: str, listing: bool = False) -> None:
+        """Bump the shared generations so other workers pick up the change."""
+        if self.generations is None:
+            return
+        try:
+            self.generations.bump(name, listing=listing)
+        except Exception:
+            LOG.exception("Failed to publish change of project %s", name)
+
+    @fs_timed("project", "write")
+    def _write_project_file(
+        self, path: Path, name: str, content: Union[str, bytes]
+    ) -> None:
+        """Atomically write a text file at the top level of a project and record the write."""
+        target = path / name
+        with self._file_lock(target):
+            try:
+                previous: Optional[bytes] = target.read_bytes()
+            except OSError:
+                previous = None
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            self.writer.write(target, data)
+            previous_size = len(previous) if previous is not None else None
+            self.file_written(path, target, previous_size)
+            self._record_version(path, name, data, previous)
+
+    def _record_version(
+        self, path: Path, name: str, data: bytes, previous: Optional[bytes]
+    ) -> None:
+        """Add a save of one of PATCHABLE_FILES to the project history."""
+        if name not in PATCHABLE_FILES:
+            return
+        try:
+            self.history.record(path.name, name, data, previous=previous)
+        except Exception:
+            # history is best effort: never fail the save itself
+            LOG.exception("Failed to record history of %s/%s", path.name, name)
+
+    def _file_lock(self, target: Path) -> threading.Lock:
+        return self._file_locks.setdefault(str(target), threading.Lock())
 
     def project_path(self, project: str) -> Path:
         """Return absolute path to a project directory."""
@@ -84,6 +529,7 @@ class ProjectManager:
         """Return True if project folder exists."""
         return self.project_path(project).is_dir()
 
+    @fs_timed("project", "create")
     def create_project(
         self, project: str, *, add_css: bool = False, add_js: bool = False
     ) -> Tuple[bool, str]:
@@ -229,52 +675,371 @@ a{color:inherit;text-decoration:none}
                     encoding="utf-8",
                 )
 
+            self.registry.refresh(project_name)
+            self.project_changed(project_name)
             return True, "Project created"
         except Exception as e:
             LOG.exception("Failed to create project %s", project_name)
             return False, str(e)
 
+    @fs_timed("project", "delete")
     def delete_project(self, project: str) -> Tuple[bool, str]:
-        """Remove a project directory entirely. Returns (ok, message)."""
+        """
+        Remove a project directory. Returns (ok, message).
+
+        The folder is renamed into the trash (one atomic rename) and disappears
+        from listings at once; the files and any shared assets only it
+        referenced are reclaimed by the background reaper.
+        """
+        ok, result = self.delete_project_held(project, hold=False)
+        return ok, "deleted" if ok else str(result)
+
+    def delete_project_held(
+        self, project: str, *, hold: bool = True
+    ) -> Tuple[bool, Union[str, DeletedProject]]:
+        """
+        Delete a project like `delete_project`, but keep its trash entries
+        until `release_deleted` (or `restore_project`) is called. Returns
+        (True, DeletedProject) or (False, message).
+        """
         path = self.project_path(project)
         if not path.exists():
             return False, "not found"
         try:
-            shutil.rmtree(path)
-            return True, "deleted"
+            refs = self.blobs.refs(path.name)
+            entries = [(self.reaper.discard(path, refs.values(), hold=hold), path)]
+            # only once the folder is gone: a failed rename keeps its references
+            self.blobs.forget_project(path.name)
+            for extra in (
+                self.builder.output_dir(path.name),
+                self.history.project_dir(path.name),
+            ):
+                if extra.is_dir():
+                    entries.append((self.reaper.discard(extra, hold=hold), extra))
+            self.history.forget_project(path.name)
+            self.file_cache.invalidate(path)
+            self.registry.remove(path.name)
+            self.project_changed(path.name)
+            return True, DeletedProject(path.name, refs, entries)
         except Exception as e:
             LOG.exception("Failed to delete project %s", project)
             return False, str(e)
 
-    def save_index_html(self, project: str, html: str) -> Tuple[bool, str]:
-        """Write html content to project's index.html."""
+    def restore_project(self, deleted: DeletedProject) -> None:
+        """
+        Put a held deleted project back where it was.
+
+        :raises OSError: if it cannot be moved back (e.g. the name was reused).
+        """
+        for entry, path in deleted.entries:
+            self.reaper.restore(entry, path)
+        self.blobs.set_refs(deleted.name, deleted.refs)
+        self.registry.refresh(deleted.name)
+        self.project_changed(deleted.name)
+
+    def release_deleted(self, deleted: DeletedProject) -> None:
+        """Let the reaper reclaim a held deleted project."""
+        for entry, _ in deleted.entries:
+            self.reaper.release(entry)
+
+    @fs_timed("project", "remove_file")
+    def remove_file(self, project: str, rel: str) -> bool:
+        """
+        Delete one file of a project (e.g. to undo a batch upload), releasing
+        its shared blob if it had one. Returns False if there was no such file.
+        """
+        path = self.project_path(project)
+        target = (path / rel).resolve()
+        if not str(target).startswith(str(path) + os.sep) or not target.is_file():
+            return False
+        with self._file_lock(target):
+            size = target.stat().st_size
+            target.unlink()
+        rel = os.path.relpath(target, path).replace(os.sep, "/")
+        digest = self.blobs.forget(path.name, rel)
+        if digest is not None:
+            self.blobs.release([digest])
+        self.file_written(path, target, size)
+        return True
+
+    @fs_timed("project", "import")
+    def import_project(self, project: str, fileobj) -> Tuple[bool, str]:
+        """
+        Create a new project from a ZIP archive (seekable file object).
+        The archive is unpacked into a staging folder and renamed into place.
+        Room for the files and bytes it declares is reserved in the new
+        project's quota first. Returns (ok, message).
+
+        :raises QuotaExceeded: if the archive does not fit the quota.
+        """
+        project_name = secure_filename(project)
+        if not project_name:
+            return False, "Invalid project name"
+        path = self.project_path(project_name)
+        if path.exists():
+            return False, "Project already exists"
+        from archive import ArchiveError, declared_totals, import_into
+
+        try:
+            declared_files, declared_bytes = declared_totals(fileobj)
+        except ArchiveError as e:
+            return False, str(e)
+        staging = self.projects_dir / STAGING_DIR_NAME / uuid.uuid4().hex
+        with self._reserve(project_name, declared_bytes, declared_files):
+            try:
+                files, size = import_into(fileobj, staging, path)
+            except ArchiveError as e:
+                return False, str(e)
+            except Exception as e:
+                LOG.exception("Failed to import project %s", project_name)
+                return False, str(e)
+            # counted before the reservation is released
+            self.registry.refresh(project_name)
+        self.project_changed(project_name)
+        LOG.info("Imported project %s (%d files, %d bytes)", project_name, files, size)
+        return True, "Project imported"
+
+    def _reserve(
+        self, project: str, nbytes: int, files: int
+    ) -> ContextManager[Optional[Reservation]]:
+        """Reserve room for a whole new project's content, if quotas are set."""
+        if self.quotas is None:
+            return nullcontext(None)
+        return self.quotas.reserve(project, nbytes, files=files)
+
+    @fs_timed("project", "duplicate")
+    def duplicate_project(
+        self, project: str, new_name: str
+    ) -> Tuple[bool, Union[str, CloneReport]]:
+        """
+        Copy a project to `new_name` as cheaply as the filesystem allows.
+
+        Shared assets from the blob store are hardlinked (keeping their
+        reference counts right); other files are reflinked where supported
+        and otherwise copied in parallel. The copy is built in a staging
+        folder and renamed into place.
+
+        Room for the source's current usage is reserved in the copy's quota.
+
+        :return: Tuple (True, CloneReport) or (False, error message).
+        :raises QuotaExceeded: if the copy does not fit the quota.
+        """
+        src = self.project_path(project)
+        if not src.is_dir():
+            return False, "not found"
+        dest_name = secure_filename(new_name)
+        if not dest_name:
+            return False, "Invalid project name"
+        dest = self.project_path(dest_name)
+        if dest.exists():
+            return False, "Project already exists"
+
+        shared = set(self.blobs.refs(src.name))
+        usage = self.registry.get(src.name)
+        staging = self.projects_dir / STAGING_DIR_NAME / uuid.uuid4().hex
+        nbytes, files = (usage.bytes, usage.files) if usage is not None else (0, 0)
+        with self._reserve(dest_name, nbytes, files):
+            try:
+                report = self._get_cloner().clone(
+                    src,
+                    staging,
+                    shareable=lambda rel, st: rel in shared and st.st_nlink > 1,
+                    skip=lambda rel: os.path.basename(rel).startswith("."),
+                )
+                self.blobs.copy_refs(src.name, dest_name)
+                os.rename(staging, dest)
+            except Exception as e:
+                LOG.exception(
+                    "Failed to duplicate project %s to %s", project, dest_name
+                )
+                shutil.rmtree(staging, ignore_errors=True)
+                self.blobs.forget_project(dest_name)
+                return False, str(e)
+            # counted before the reservation is released
+            self.registry.refresh(dest_name)
+        self.project_changed(dest_name)
+        LOG.info(
+            "Duplicated %s -> %s via %s in %.1f ms",
+            src.name,
+            dest_name,
+            report.strategy,
+            report.elapsed_ms,
+        )
+        return True, report
+
+    def _get_cloner(self) -> TreeCloner:
+        if self._cloner is None:
+            from clone import TreeCloner
+
+            self._cloner = TreeCloner(
+                ThreadPoolExecutor(max_workers=COPY_WORKERS, thread_name_prefix="copy")
+            )
+        return self._cloner
+
+    @fs_timed("project", "build")
+    def build_project(self, project: str) -> Tuple[bool, Union[str, BuildReport]]:
+        """
+        Publish a project: minified, fingerprinted and precompressed output
+        under projects/.builds/<project>/ (see build.ProjectBuilder).
+        Only files whose inputs changed since the last build are redone.
+
+        :return: Tuple (True, BuildReport) or (False, error message).
+        """
+        path = self.project_path(project)
+        if not path.is_dir():
+            return False, "not found"
+        try:
+            report = self.builder.build(path.name, path)
+        except Exception as e:
+            LOG.exception("Failed to build project %s", project)
+            return False, str(e)
+        LOG.info(
+            "Built %s: %d rebuilt, %d reused in %.1f ms",
+            path.name,
+            report.built,
+            report.reused,
+            report.elapsed_ms,
+        )
+        return True, report
+
+    def serve_published_file(self, project: str, filename: str):
+        """
+        Return a response for a file of the project's last build.
+
+        Fingerprinted names are cached for a year; other names revalidate.
+        The build's precompressed .br/.gz sidecars are sent when accepted.
+        """
+        project = secure_filename(project)
+        path = self.builder.resolve(project, filename)
+        if path is None:
+            abort(404)
+        if self.builder.is_fingerprinted(project, filename):
+            resp = file_response(
+                path,
+                max_age=PUBLISHED_IMMUTABLE_MAX_AGE,
+                store=self.compressed_files,
+            )
+            resp.cache_control.immutable = True
+        else:
+            resp = file_response(path, store=self.compressed_files)
+            resp.cache_control.no_cache = True
+        return resp
+
+    @fs_timed("project", "restore")
+    def restore_version(self, project: str, name: str, version: int) -> str:
+        """
+        Write an earlier version of one of PATCHABLE_FILES back (recorded as a
+        new version, so the restore itself can be undone).
+
+        :return: content_hash of the restored content.
+        :raises FileNotFoundError: if the project does not exist.
+        :raises KeyError: if the version does not exist.
+        """
+        path = self.project_path(project)
+        if not path.is_dir():
+            raise FileNotFoundError(project)
+        data = self.history.get(path.name, name, version)
+        # the bytes as recorded, so the file matches the returned hash
+        self._write_project_file(path, name, data)
+        return content_hash(data)
+
+    def save_index_html(
+        self, project: str, html: Union[str, bytes]
+    ) -> Tuple[bool, str]:
+        """Write html content (text, or bytes as they are) to project's index.html."""
         path = self.project_path(project)
         if not path.exists():
             return False, "project not found"
         try:
-            (path / "index.html").write_text(html, encoding="utf-8")
+            self._write_project_file(path, "index.html", html)
             return True, "ok"
         except Exception as e:
             LOG.exception("Failed to save index.html for %s", project)
             return False, str(e)
 
-    def save_css(self, project: str, css: str) -> Tuple[bool, str]:
-        """Write css content to project's style.css."""
+    def save_css(self, project: str, css: Union[str, bytes]) -> Tuple[bool, str]:
+        """Write css content (text, or bytes as they are) to project's style.css."""
         path = self.project_path(project)
         if not path.exists():
             return False, "project not found"
         try:
-            (path / "style.css").write_text(css, encoding="utf-8")
+            self._write_project_file(path, "style.css", css)
             return True, "ok"
         except Exception as e:
             LOG.exception("Failed to save style.css for %s", project)
             return False, str(e)
 
+    @fs_timed("project", "patch")
+    def patch_file(
+        self,
+        project: str,
+        name: str,
+        base_hash: str,
+        *,
+        edits: Optional[List[dict]] = None,
+        diff: Optional[str] = None,
+    ) -> str:
+        """
+        Apply a delta to one of PATCHABLE_FILES and write it atomically.
+
+        :param project: Project name.
+        :param name: File name (index.html or style.css).
+        :param base_hash: content_hash of the version the delta was made against.
+        :param edits: Range edits, see patching.apply_edits.
+        :param diff: Unified diff, see patching.apply_unified_diff.
+        :return: content_hash of the new content.
+        :raises PatchConflict: if base_hash does not match the file.
+        :raises PatchError: if the delta is malformed or does not apply.
+        :raises FileNotFoundError: if the project does not exist.
+        """
+        if name not in PATCHABLE_FILES:
+            raise PatchError(f"file cannot be patched: {name}")
+        if (edits is None) == (diff is None):
+            raise PatchError("provide exactly one of edits or diff")
+        path = self.project_path(project)
+        if not path.is_dir():
+            raise FileNotFoundError(project)
+        target = path / name
+        with self._file_lock(target):
+            try:
+                current = target.read_bytes()
+                existed = True
+            except FileNotFoundError:
+                current = b""
+                existed = False
+            current_hash = content_hash(current)
+            if base_hash != current_hash:
+                raise PatchConflict(current_hash)
+            try:
+                text = current.decode("utf-8")
+            except UnicodeDecodeError:
+                raise PatchError("file is not valid UTF-8")
+            if edits is not None:
+                new_text = apply_edits(text, edits)
+            else:
+                new_text = apply_unified_diff(text, diff)
+            data = new_text.encode("utf-8")
+            self.writer.write(target, data)
+            self.file_written(path, target, len(current) if existed else None)
+            self._record_version(path, name, data, current if existed else None)
+        return content_hash(data)
+
     def serve_project_file(self, project: str, filename: str):
         """
-        Return a Flask-compatible send_from_directory for a file inside the project.
+        Return a response for a file inside the project.
+
+        Small files are answered from the hot-file cache with a strong ETag;
+        conditional requests (If-None-Match / If-Modified-Since) get a 304.
+        Text files are compressed per Accept-Encoding (see
+        cached_file_response). Larger files are streamed from disk, or
+        their .br/.gz sidecar or compressed copy (see file_response).
         This does minimal path-safety checks (normalization).
         """
+        key = (secure_filename(project), filename)
+        entry = self.file_cache.get(key)
+        if entry is not None:
+            return cached_file_response(entry, self.compressed_cache)
+
         path = self.project_path(project)
         if not path.exists():
             LOG.debug("serve_project_file: project path not exists: %s", path)
@@ -284,12 +1049,33 @@ a{color:inherit;text-decoration:none}
         if not str(candidate).startswith(str(path)):
             LOG.warning("Attempt to access outside project dir: %s", candidate)
             abort(403)
-        if not candidate.exists():
+        if not candidate.is_file():
             LOG.debug("serve_project_file: candidate not found: %s", candidate)
             abort(404)
-        # send relative to project path
-        rel = os.path.relpath(candidate, path)
-        return send_from_directory(str(path), rel)
+        try:
+            entry = self.file_cache.load(key, candidate)
+        except OSError:
+            LOG.debug("serve_project_file: could not cache %s", candidate)
+            entry = None
+        if entry is not None:
+            return cached_file_response(entry, self.compressed_cache)
+        return file_response(candidate, store=self.compressed_files)
+
+
+def _stream_size(file_storage) -> Optional[int]:
+    """Size of an uploaded file if known without reading it (multipart parts are seekable)."""
+    if file_storage.content_length:
+        return file_storage.content_length
+    stream = file_storage.stream
+    try:
+        if not stream.seekable():
+            return None
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END) - position
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
 
 
 @dataclass
@@ -298,9 +1084,17 @@ class UploadManager:
     Handle uploads into project subfolders with validation.
 
     - allowed_ext_map: mapping category -> set(ext)
+    - on_saved: optional callback(project_path, saved_path, previous_size)
+      invoked after a successful save (cache invalidation, registry update)
+    - blobs: optional content-addressed store; when set, uploads are hashed
+      while streaming, stored once and hardlinked into the project
+    - quotas: optional per-project quotas, checked before a file is written
     """
 
     allowed_ext_map: Dict[str, set]
+    on_saved: Optional[Callable[[Path, Path, Optional[int]], None]] = None
+    blobs: Optional[BlobStore] = None
+    quotas: Optional[QuotaManager] = None
 
     def validate_category(self, category: str) -> str:
         """
@@ -331,19 +1125,18 @@ class UploadManager:
         # otherwise allowed is expected to be a set of extensions
         return ext.lower() in allowed
 
-    def save_upload(
-        self, project_path: Path, file_storage, target_category: str
-    ) -> Tuple[bool, Optional[str]]:
+    def resolve_destination(
+        self, project_path: Path, raw_filename: str, target_category: str
+    ) -> Tuple[bool, Union[Path, str]]:
         """
-        Save an uploaded file into a project's subfolder. Returns (ok, rel_path or error).
+        Validate an upload's filename/category and return where it should be saved.
+        Returns (True, absolute save path) or (False, error message).
         """
-        filename = secure_filename(file_storage.filename or "")
+        filename = secure_filename(raw_filename or "")
         if not filename:
             return False, "empty filename"
 
         category = self.validate_category(target_category)
-        dest_dir = project_path / category
-        ensure_dir(dest_dir)
 
         # extension validation
         ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
@@ -352,54 +1145,273 @@ class UploadManager:
         ):
             return False, "invalid extension"
 
-        save_path = (dest_dir / filename).resolve()
+        save_path = (project_path / category / filename).resolve()
         # path take care: ensure inside project path
         if not str(save_path).startswith(str(project_path.resolve())):
             return False, "invalid path"
+        return True, save_path
+
+    @fs_timed("upload", "save")
+    def save_upload(
+        self, project_path: Path, file_storage, target_category: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Save an uploaded file into a project's subfolder. Returns (ok, rel_path or error).
+
+        :raises QuotaExceeded: if the file does not fit the project's quota.
+        """
+        ok, dest = self.resolve_destination(
+            project_path, file_storage.filename or "", target_category
+        )
+        if not ok:
+            return False, str(dest)
+        save_path = Path(dest)
+        ensure_dir(save_path.parent)
+
+        try:
+            previous_size: Optional[int] = save_path.stat().st_size
+        except OSError:
+            previous_size = None
 
         try:
-            file_storage.save(str(save_path))
-            rel = os.path.relpath(save_path, project_path).replace("\\", "/")
-            return True, rel
+            size = _stream_size(file_storage)
+            with self._quota(project_path, size, previous_size) as reservation:
+                stream = file_storage.stream
+                if reservation is not None and reservation.limit is not None:
+                    stream = LimitedReader(stream, reservation.limit, project_path.name)
+                if self.blobs is not None:
+                    digest = self.blobs.ingest_stream(stream)
+                    self._link_blob(project_path, digest, save_path)
+                else:
+                    tmp = save_path.with_name(f".{save_path.name}.{uuid.uuid4().hex}")
+                    try:
+                        with tmp.open("wb") as fh:
+                            shutil.copyfileobj(stream, fh)
+                        os.replace(tmp, save_path)
+                    finally:
+                        tmp.unlink(missing_ok=True)
+                if reservation is not None and isinstance(stream, LimitedReader):
+                    # give back what an upload of unknown size did not use
+                    reservation.settle(stream.count)
+                return True, self._saved(project_path, save_path, previous_size)
+        except QuotaExceeded:
+            raise
         except Exception as e:
             LOG.exception("Failed to save upload to %s", save_path)
             return False, str(e)
 
+    @fs_timed("upload", "install")
+    def install_file(
+        self, project_path: Path, src: Path, save_path: Path
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Move a fully received file (e.g. an assembled chunked upload) to
+        `save_path` — as returned by `resolve_destination`. Returns (ok, rel_path or error).
+
+        :raises QuotaExceeded: if the file does not fit the project's quota.
+        """
+        ensure_dir(save_path.parent)
+        try:
+            previous_size: Optional[int] = save_path.stat().st_size
+        except OSError:
+            previous_size = None
+        try:
+            with self._quota(project_path, src.stat().st_size, previous_size):
+                if self.blobs is not None:
+                    digest = self.blobs.ingest_file(src)
+                    self._link_blob(project_path, digest, save_path)
+                else:
+                    os.replace(src, save_path)
+                return True, self._saved(project_path, save_path, previous_size)
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            LOG.exception("Failed to install upload to %s", save_path)
+            return False, str(e)
+
+    def _quota(
+        self, project_path: Path, size: Optional[int], previous_size: Optional[int]
+    ) -> ContextManager[Optional[Reservation]]:
+        """Reserve room for an upload (see QuotaManager.reserve), if quotas are set."""
+        if self.quotas is None:
+            return nullcontext(None)
+        return self.quotas.reserve(project_path.name, size, previous_size)
+
+    def _link_blob(self, project_path: Path, digest: str, save_path: Path) -> None:
+        """Point save_path at a stored blob and release the blob it replaced, if any."""
+        assert self.blobs is not None
+        self.blobs.link(digest, save_path)
+        rel = os.path.relpath(save_path, project_path).replace("\\", "/")
+        previous = self.blobs.record(project_path.name, rel, digest)
+        if previous and previous != digest:
+            self.blobs.release([previous])
+
+    def _saved(self, project_path: Path, save_path: Path, previous_size: Optional[int]) -> str:
+        """Run the on_saved hook and return the project-relative path."""
+        if self.on_saved is not None:
+            self.on_saved(project_path, save_path, previous_size)
+        return os.path.relpath(save_path, project_path).replace("\\", "/")
+
 
 @dataclass
 class TagsLoader:
     """
     Load html_tags_attributes.json from a few sensible locations.
-    Returns parsed JSON if found, otherwise None.
+
+    The parsed document is kept in memory and only re-read when the file's
+    mtime changes. Alongside it the loader keeps the serialized payload
+    (plain and gzip) and, per tag, the global attributes merged with the
+    tag's own so the inspector can fetch a single tag cheaply.
     """
 
     base_dir: Path
+    _path: Optional[Path] = field(default=None, init=False, repr=False)
+    _mtime_ns: Optional[int] = field(default=None, init=False, repr=False)
+    _data: Optional[dict] = field(default=None, init=False, repr=False)
+    _payload: Optional[JsonPayload] = field(default=None, init=False, repr=False)
+    _merged: Dict[str, List[str]] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def candidates(self) -> List[Path]:
+        """Return the candidate locations, in lookup order."""
+        return [
+            self.base_dir / "html_tags_attributes.json",
+            self.base_dir / "static" / "html_tags_attributes.json",
+            self.base_dir / "static" / "data" / "html_tags_attributes.json",
+        ]
 
     def load(self) -> Tuple[Optional[dict], Optional[str]]:
         """
-        Attempt to load the tags/attributes JSON from multiple candidate locations.
+        Return the tags/attributes JSON, re-reading it only when it changed on disk.
         Returns (data, path_used) or (None, None) if not found.
         """
-        candidates = [
-            self.base_dir / "html_tags_attributes.json",
-            self.base_dir / "static" / "html_tags_attributes.json",
-            self.base_dir / "static" / "data" / "html_tags_attributes.json",
-        ]
-        tried = []
-        for p in candidates:
-            tried.append(str(p))
-            if p.exists():
-                try:
-                    with p.open("r", encoding="utf-8") as fh:
-                        data = json.load(fh)
-                    return data, str(p)
-                except Exception as e:
-                    LOG.exception("Failed to load tags file %s: %s", p, e)
-                    return None, str(p)
-        LOG.debug("TagsLoader tried candidates: %s", tried)
+        with self._lock:
+            self._refresh()
+            return self._data, str(self._path) if self._path else None
+
+    def payload(self) -> Optional[JsonPayload]:
+        """Return the serialized (and gzip-compressed) document, or None."""
+        with self._lock:
+            self._refresh()
+            return self._payload
+
+    def tag_names(self) -> Optional[dict]:
+        """Return {"tags": sorted tag names, "global": global attributes}, or None."""
+        with self._lock:
+            self._refresh()
+            if self._data is None:
+                return None
+            global_attrs = self._data.get("global") or []
+            return {"tags": sorted(self._merged), "global": global_attrs}
+
+    def attributes_for(self, tag: str) -> Optional[List[str]]:
+        """Return global + tag-specific attributes for `tag`, or None if unknown."""
+        with self._lock:
+            self._refresh()
+            return self._merged.get(tag.lower())
+
+    def _refresh(self) -> None:
+        """Locate the file and reload it if its mtime differs from the cached one."""
+        path, mtime_ns = self._locate()
+        if path == self._path and mtime_ns == self._mtime_ns:
+            return
+        self._path, self._mtime_ns = path, mtime_ns
+        self._data, self._payload, self._merged = None, None, {}
+        if path is None:
+            LOG.debug("TagsLoader tried candidates: %s", [str(p) for p in self.candidates()])
+            return
+        try:
+            with path.open("r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except Exception as e:
+            LOG.exception("Failed to load tags file %s: %s", path, e)
+            return
+        global_attrs = list(data.get("global") or [])
+        self._data = data
+        self._payload = JsonPayload.from_obj(data)
+        self._merged = {
+            tag: global_attrs + [a for a in attrs if a not in global_attrs]
+            for tag, attrs in data.items()
+            if tag != "global" and isinstance(attrs, list)
+        }
+        LOG.info("Loaded tags_attributes from: %s", path)
+
+    def _locate(self) -> Tuple[Optional[Path], Optional[int]]:
+        """Return (path, mtime_ns) of the first existing candidate."""
+        # fast path: the previously used file is still there
+        if self._path is not None:
+            try:
+                return self._path, self._path.stat().st_mtime_ns
+            except OSError:
+                pass
+        for p in self.candidates():
+            try:
+                return p, p.stat().st_mtime_ns
+            except OSError:
+                continue
         return None, None
 
 
+# -----------------------------------------------------------------------------
+# Pre-fork warm-up (gunicorn master)
+# -----------------------------------------------------------------------------
+# Read-only loaders by base directory, built once per process; when the
+# gunicorn master builds them (prewarm or preload_app), forked workers reuse
+# them and share their memory copy-on-write
+_PREWARMED: Dict[str, Tuple[TagsLoader, CssSchemaIndex]] = {}
+
+
+def shared_loaders(base: Path) -> Tuple[TagsLoader, CssSchemaIndex]:
+    """The tag and CSS schema loaders of `base`, created on the first call."""
+    key = str(base.resolve())
+    loaders = _PREWARMED.get(key)
+    if loaders is None:
+        css_index = CssSchemaIndex(base / "static" / "css-schema-full.json")
+        loaders = (TagsLoader(base), css_index)
+        _PREWARMED[key] = loaders
+    return loaders
+
+
+def prewarm(base_dir: Optional[str] = None, cache_url: Optional[str] = None) -> None:
+    """
+    Do the expensive start-up work once, in the gunicorn master before it
+    forks the workers (see gunicorn.conf.py).
+
+    Parses the tag and CSS schema documents for create_app to reuse, brings
+    the project registry index up to date so workers load it without
+    rescanning, opens the shared cache and fills it with the compressed
+    static files, then freezes the heap so it stays shared after fork.
+    Starts no threads: they would not survive the fork.
+    """
+    import gc
+
+    base = (Path(base_dir) if base_dir else Path(__file__).parent).resolve()
+    tl, css_index = shared_loaders(base)
+    tl.payload()
+    css_index.available()
+
+    projects_dir = (base / "projects").resolve()
+    ensure_dir(projects_dir)
+    registry = ProjectRegistry(projects_dir)
+    registry.load()
+    registry.flush()
+
+    url = cache_url or os.environ.get("CACHE_URL")
+    shared_cache = SharedCache(open_backend(url, projects_dir))
+    if shared_cache.shared:
+        compressed = CompressedCache(shared=shared_cache)
+        static_root = base / "static"
+        for path in sorted(p for p in static_root.rglob("*") if p.is_file()):
+            entry = FileCache().load(("", path.name), path)
+            if entry is None or not is_compressible(entry.mimetype, entry.size):
+                continue
+            for encoding in available_encodings():
+                compressed.get(entry.etag, encoding, entry.data, path)
+    gc.collect()
+    gc.freeze()
+    LOG.info("Pre-warmed %s (shared cache: %s)", base, shared_cache.backend.name)
+
+
 # -----------------------------------------------------------------------------
 # Flask application factory
 # -----------------------------------------------------------------------------
@@ -408,7 +1420,13 @@ def create_app(config: Optional[dict] = None) -> Flask:
     Create and configure the Flask application.
 
     This function registers routes and instantiates managers used by handlers.
+    Components that are costly to import or build are created on first use
+    and background threads start with the first request, so creating the
+    app is cheap and safe before a fork (see gunicorn.conf.py). The time of
+    each phase is logged and kept in `app.startup_report`.
     """
+    report = StartupReport()
+    logging.basicConfig(level=logging.INFO)
     app = Flask(__name__, static_folder="static", template_folder="templates")
     # Prefer reading a secret from environment; fallback to config default.
     # This ensures the Flask instance used by create_app has a usable secret key
@@ -440,16 +1458,318 @@ def create_app(config: Optional[dict] = None) -> Flask:
     if config:
         app.config.update(config)
 
+    report.mark("config")
+
     # instantiate managers
     base = Path(app.root_path)
     pm = ProjectManager(str(base))
-    um = UploadManager(ALLOWED_UPLOAD_EXT)
-    tl = TagsLoader(base)
+    # cache shared by the workers of one deployment (see sharedcache.open_backend)
+    cache_url = app.config.get("CACHE_URL") or os.environ.get("CACHE_URL")
+    shared_cache = SharedCache(open_backend(cache_url, pm.projects_dir))
+    if shared_cache.shared:
+        pm.generations = ProjectGenerations(shared_cache)
+        pm.registry.generations = pm.generations
+        pm.compressed_cache.shared = shared_cache
+    report.mark("project_manager")
+
+    # per-project quotas: PROJECT_QUOTA_BYTES (e.g. "500M") and PROJECT_QUOTA_FILES,
+    # PROJECT_QUOTAS maps project names to their own {"max_bytes", "max_files"}
+    quota_bytes = app.config.get("PROJECT_QUOTA_BYTES") or os.environ.get(
+        "PROJECT_QUOTA_BYTES"
+    )
+    quota_files = app.config.get("PROJECT_QUOTA_FILES") or os.environ.get(
+        "PROJECT_QUOTA_FILES"
+    )
+    quotas = QuotaManager(
+        pm.registry,
+        default=Quota(
+            max_bytes=parse_size(str(quota_bytes)) if quota_bytes else None,
+            max_files=int(quota_files) if quota_files else None,
+        ),
+        overrides={
+            name: Quota(**limits)
+            for name, limits in (app.config.get("PROJECT_QUOTAS") or {}).items()
+        },
+    )
+    pm.quotas = quotas
+    um = UploadManager(
+        ALLOWED_UPLOAD_EXT, on_saved=pm.file_written, blobs=pm.blobs, quotas=quotas
+    )
+    # largest file a chunked upload may declare: UPLOAD_MAX_SIZE (e.g. "2G"),
+    # else Flask's MAX_CONTENT_LENGTH, else chunked_upload.UPLOAD_MAX_SIZE
+    upload_max = (
+        app.config.get("UPLOAD_MAX_SIZE")
+        or os.environ.get("UPLOAD_MAX_SIZE")
+        or app.config.get("MAX_CONTENT_LENGTH")
+    )
+    cu = ChunkedUploadManager(
+        um,
+        pm.projects_dir / UPLOAD_SESSIONS_DIR_NAME,
+        max_size=parse_size(str(upload_max)) if upload_max else UPLOAD_MAX_SIZE,
+    )
+
+    # LIVE_MAX_STREAMS overrides LIVE_MAX_WSGI_STREAMS; 0 turns live reload
+    # off for WSGI deployments
+    max_streams = int(
+        app.config.get(
+            "LIVE_MAX_STREAMS",
+            os.environ.get("LIVE_MAX_STREAMS", LIVE_MAX_WSGI_STREAMS),
+        )
+    )
+    stream_slots = threading.BoundedSemaphore(max_streams) if max_streams > 0 else None
+
+    # built on first use; until then their change listeners do nothing
+    def make_hub() -> LiveReloadHub:
+        from live import LiveReloadHub
+
+        return LiveReloadHub(pm.projects_dir)
 
-    # expose managers on app for debugging/testing convenience
+    def make_variants() -> ImageVariantPipeline:
+        from images import VARIANTS_DIR_NAME, ImageVariantPipeline
+
+        pipeline = ImageVariantPipeline(
+            pm.projects_dir / VARIANTS_DIR_NAME,
+            on_linked=pm.file_written,
+            source_path=pm.blobs.blob_path,
+        )
+        atexit.register(pipeline.shutdown)
+        return pipeline
+
+    def asset_signature(name: str) -> Optional[Tuple]:
+        info = pm.registry.get(name)
+        return (info.files, info.bytes, info.mtime) if info is not None else None
+
+    def make_search_index() -> SearchIndex:
+        from search import SearchIndex
+
+        index = SearchIndex(pm.projects_dir, asset_signature=asset_signature)
+        # load the persisted index and re-index whatever changed since
+        index.start(pm.registry.names())
+        atexit.register(index.flush)
+        return index
+
+    def make_dom_index() -> DomIndex:
+        from dom import DomIndex
+
+        return DomIndex()
+
+    hub: Lazy[LiveReloadHub] = Lazy("live_reload", make_hub, report)
+    variants: Lazy[ImageVariantPipeline] = Lazy("image_variants", make_variants, report)
+    search_index: Lazy[SearchIndex] = Lazy("search_index", make_search_index, report)
+    dom_index: Lazy[DomIndex] = Lazy("dom_index", make_dom_index, report)
+    pm.write_listeners.append(hub.forward("file_written"))
+    pm.write_listeners.append(search_index.forward("file_written"))
+    pm.project_listeners.append(search_index.forward("project_changed"))
+    pm.registry.remote_listeners.append(search_index.forward("project_changed"))
+    pm.write_listeners.append(dom_index.forward("file_written"))
+    # drop the variants of reclaimed projects (the pipeline is built if needed)
+    pm.reaper.on_reaped.append(lambda: variants.get().gc())
+    report.mark("managers")
+
+    # build the project registry once per process and persist it on exit
+    pm.registry.load()
+    atexit.register(pm.registry.flush)
+    atexit.register(pm.writer.flush)
+    report.mark("registry")
+    tl, css_index = shared_loaders(base)
+    report.mark("loaders")
+
+    # expose managers on app for debugging/testing convenience (components
+    # built on first use are Lazy holders: `.get()` them)
     app.project_manager = pm  # type: ignore[attr-defined]
     app.upload_manager = um  # type: ignore[attr-defined]
+    app.quotas = quotas  # type: ignore[attr-defined]
+    app.chunked_uploads = cu  # type: ignore[attr-defined]
+    app.live_reload = hub  # type: ignore[attr-defined]
+    app.image_variants = variants  # type: ignore[attr-defined]
+    app.search_index = search_index  # type: ignore[attr-defined]
+    app.dom_index = dom_index  # type: ignore[attr-defined]
+    app.shared_cache = shared_cache  # type: ignore[attr-defined]
     app.tags_loader = tl  # type: ignore[attr-defined]
+    app.css_schema = css_index  # type: ignore[attr-defined]
+    app.startup_report = report  # type: ignore[attr-defined]
+
+    def upload_result(project_path: Path, rel: str, target: str) -> dict:
+        """Build the upload response, scheduling image variants when enabled."""
+        result: dict = {"ok": True, "path": rel}
+        wants_variants = app.config.get("IMAGE_VARIANTS", True)
+        if wants_variants and um.validate_category(target) == "images":
+            from images import srcset
+
+            digest = pm.blobs.refs(project_path.name).get(rel)
+            planned = variants.get().process(project_path, rel, digest)
+            result["variants"] = [v.to_dict() for v in planned]
+            result["srcset"] = srcset(planned)
+        return result
+
+    def make_batch_runner() -> BatchRunner:
+        from batch import BatchRunner
+
+        return BatchRunner(pm, um, upload_result=upload_result)
+
+    batch_runner: Lazy[BatchRunner] = Lazy("batch_runner", make_batch_runner, report)
+    app.batch_runner = batch_runner  # type: ignore[attr-defined]
+
+    # background threads start with the first request of each process (or
+    # when a gunicorn worker boots, see gunicorn.conf.py) rather than here,
+    # so the app can be created in a gunicorn master before it forks
+    background_pid: List[int] = []
+    background_lock = threading.Lock()
+
+    @app.before_request
+    def start_background():
+        if background_pid == [os.getpid()]:
+            return
+        with background_lock:
+            if background_pid == [os.getpid()]:
+                return
+            background_pid[:] = [os.getpid()]
+        # resume reclaiming anything left in the trash by a previous run
+        pm.reaper.start()
+        # and blobs left unreferenced while the app was not running
+        threading.Thread(target=pm.blobs.gc, name="blob-gc", daemon=True).start()
+        # correct usage counters that drifted from the disk
+        quotas.start()
+        # warm the search index without holding up this request
+        search_index.prefetch()
+
+    app.start_background = start_background  # type: ignore[attr-defined]
+
+    # ---- static files (cached and compressed like project files) ----
+    static_cache = FileCache()
+    static_root = Path(app.static_folder or "static").resolve()
+
+    def serve_static(filename: str):
+        """Replacement view for Flask's `static` endpoint."""
+        key = ("", filename)
+        entry = static_cache.get(key)
+        if entry is None:
+            candidate = (static_root / filename).resolve()
+            if not str(candidate).startswith(str(static_root) + os.sep):
+                abort(404)
+            if not candidate.is_file():
+                abort(404)
+            entry = static_cache.load(key, candidate)
+            if entry is None:
+                return file_response(candidate, store=pm.compressed_files)
+        return cached_file_response(entry, pm.compressed_cache)
+
+    app.view_functions["static"] = serve_static
+
+    # ---- metrics (Prometheus /metrics) and opt-in slow-request profiling ----
+    http_requests = REGISTRY.counter(
+        "http_requests_total",
+        "HTTP requests by endpoint, method and status.",
+        ("endpoint", "method", "status"),
+    )
+    http_latency = REGISTRY.histogram(
+        "http_request_duration_seconds",
+        "Time until the response was ready (streamed bodies excluded).",
+        ("endpoint", "method"),
+    )
+    http_in_flight = REGISTRY.gauge(
+        "http_requests_in_flight", "Requests being handled.", ("endpoint",)
+    )
+    http_bytes_in = REGISTRY.counter(
+        "http_request_bytes_total", "Request body bytes received.", ("endpoint",)
+    )
+    http_bytes_out = REGISTRY.counter(
+        "http_response_bytes_total",
+        "Response body bytes sent, for responses of known length.",
+        ("endpoint",),
+    )
+    caches = {
+        "project_files": pm.file_cache,
+        "static_files": static_cache,
+        "compressed": pm.compressed_cache,
+        "compressed_files": pm.compressed_files,
+        "css_complete": css_index,
+        "image_variants": variants.peek,
+        "dom": dom_index.peek,
+        "shared": shared_cache.backend,
+    }
+    REGISTRY.collected(
+        "cache_hits_total",
+        "Cache hits per cache layer.",
+        lambda: cache_samples(caches, "hits"),
+        kind="counter",
+    )
+    REGISTRY.collected(
+        "cache_misses_total",
+        "Cache misses per cache layer.",
+        lambda: cache_samples(caches, "misses"),
+        kind="counter",
+    )
+    REGISTRY.collected(
+        "projects", "Projects in the registry.", lambda: [({}, len(pm.list_projects()))]
+    )
+
+    # components not built yet report zero rather than being built here
+    def live_subscribers():
+        live = hub.peek()
+        return [({}, live.subscriber_count() if live is not None else 0)]
+
+    def search_pending():
+        index = search_index.peek()
+        return [({}, index.stats()["pending"] if index is not None else 0)]
+
+    REGISTRY.collected(
+        "live_reload_subscribers", "Open live-reload event streams.", live_subscribers
+    )
+    REGISTRY.collected(
+        "search_index_pending", "Documents waiting to be (re)indexed.", search_pending
+    )
+    REGISTRY.collected(
+        "startup_phase_seconds",
+        "Wall time of each create_app phase, and of components built on first use.",
+        lambda: [({"phase": name}, seconds) for name, seconds in report.timings()],
+    )
+
+    slow_ms = app.config.get("PROFILE_SLOW_REQUEST_MS") or os.environ.get(
+        "PROFILE_SLOW_REQUEST_MS"
+    )
+    profiler: Optional[SlowRequestProfiler] = None
+    if slow_ms:
+        profiler = SlowRequestProfiler(base / PROFILE_DIR_NAME, float(slow_ms))
+    app.profiler = profiler  # type: ignore[attr-defined]
+
+    @app.before_request
+    def metrics_begin():
+        endpoint = request.endpoint or "unmatched"
+        g.metrics_endpoint = endpoint
+        g.metrics_start = time.perf_counter()
+        http_in_flight.labels(endpoint).inc()
+        if request.content_length:
+            http_bytes_in.labels(endpoint).inc(request.content_length)
+        if profiler is not None:
+            g.profile_token = profiler.begin()
+
+    @app.after_request
+    def metrics_response(resp: Response) -> Response:
+        endpoint = g.get("metrics_endpoint", "unmatched")
+        http_requests.labels(endpoint, request.method, resp.status_code).inc()
+        if resp.content_length:
+            http_bytes_out.labels(endpoint).inc(resp.content_length)
+        return resp
+
+    @app.teardown_request
+    def metrics_end(exc: Optional[BaseException]) -> None:
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        endpoint = g.metrics_endpoint
+        http_in_flight.labels(endpoint).dec()
+        http_latency.labels(endpoint, request.method).observe(elapsed)
+        if profiler is not None:
+            token = g.pop("profile_token", None)
+            if token is not None:
+                profiler.end(token, elapsed * 1000, f"{request.method}-{endpoint}")
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Prometheus scrape endpoint (per process: scrape every worker)."""
+        return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
     # ---- simple pages ----
     @app.route("/")
@@ -482,8 +1802,83 @@ def create_app(config: Optional[dict] = None) -> Flask:
     # ---- project list API ----
     @app.route("/api/projects", methods=["GET"])
     def api_projects():
-        """Return JSON list of projects."""
-        return jsonify(pm.list_projects())
+        """
+        Return JSON list of project names.
+
+        With any of the query params below, return
+        {"total", "offset", "items": [metadata...]} instead:
+          - offset, limit: pagination
+          - sort: one of name/mtime/bytes/files; order: asc/desc
+          - q: case-insensitive substring filter on the name
+          - has_css, has_js: 1/0 filters
+        """
+        args = request.args
+        if not args:
+            return jsonify(pm.list_projects())
+
+        def flag(name: str) -> Optional[bool]:
+            value = args.get(name)
+            return None if value is None else value.lower() in ("1", "true", "yes")
+
+        try:
+            offset = max(0, int(args.get("offset", 0)))
+            limit = int(args["limit"]) if "limit" in args else None
+        except ValueError:
+            return jsonify({"error": "invalid offset/limit"}), 400
+        sort = args.get("sort", "name")
+        if sort not in REGISTRY_SORT_KEYS:
+            return jsonify({"error": "invalid sort"}), 400
+        total, items = pm.registry.query(
+            offset=offset,
+            limit=limit,
+            sort=sort,
+            descending=args.get("order") == "desc",
+            contains=args.get("q"),
+            has_css=flag("has_css"),
+            has_js=flag("has_js"),
+        )
+        return jsonify(
+            {"total": total, "offset": offset, "items": [i.to_dict() for i in items]}
+        )
+
+    @app.route("/api/search", methods=["GET"])
+    def api_search():
+        """
+        Full-text search over page text, tags, classes, ids, CSS selectors
+        and asset paths of every project. Terms can be scoped with a field
+        prefix (class:hero or .hero, tag:video, id:main, asset:logo.png);
+        all terms must match.
+        Query params: q, project (optional), limit, offset.
+        """
+        from search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+
+        q = request.args.get("q", "").strip()
+        if not q:
+            return jsonify({"error": "q is required"}), 400
+        try:
+            limit = int(request.args.get("limit", SEARCH_DEFAULT_LIMIT))
+            limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+            offset = max(0, int(request.args.get("offset", 0)))
+        except ValueError:
+            return jsonify({"error": "invalid limit or offset"}), 400
+        project = request.args.get("project")
+        # queue re-indexing of whatever other workers changed
+        pm.registry.sync()
+        started = time.perf_counter()
+        total, hits = search_index.get().search(
+            q,
+            limit=limit,
+            offset=offset,
+            project=secure_filename(project) if project else None,
+        )
+        return jsonify(
+            {
+                "q": q,
+                "total": total,
+                "took_ms": round((time.perf_counter() - started) * 1000, 2),
+                "results": [hit.to_dict() for hit in hits],
+            }
+        )
 
     # ---- serve project files safely ----
     @app.route("/projects/<project>/<path:filename>", methods=["GET"])
@@ -494,11 +1889,56 @@ def create_app(config: Optional[dict] = None) -> Flask:
     @app.route("/projects/<project>/index.html", methods=["GET"])
     def serve_project_index(project: str):
         """Serve project's index.html file (if exists)."""
+        return pm.serve_project_file(project, "index.html")
+
+    # ---- live-reload push channel ----
+    @app.route("/api/projects/<project>/events", methods=["GET"])
+    def project_events(project: str):
+        """
+        Server-Sent Events stream of file changes in a project.
+        Each "change" event carries JSON {file, hash, kind, deleted}; kind is
+        css/html/js/asset, or "reload" when the client fell too far behind.
+        Served here (WSGI) a stream holds a worker thread, so a process
+        serves at most LIVE_MAX_STREAMS of them and answers 503 past that.
+        """
+        from live import SSE_HEARTBEAT, sse_format
+
         project_path = pm.project_path(project)
-        index_file = project_path / "index.html"
-        if not index_file.exists():
+        if not project_path.is_dir():
             abort(404)
-        return send_from_directory(str(project_path), "index.html")
+        if stream_slots is None or not stream_slots.acquire(blocking=False):
+            resp = jsonify({"error": "too many live-reload streams"})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = str(int(SSE_HEARTBEAT))
+            return resp
+        name = project_path.name
+        try:
+            live = hub.get()
+            q = live.subscribe(name)
+        except BaseException:
+            stream_slots.release()
+            raise
+
+        def stream():
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_format("change", json.dumps(event))
+
+        def close() -> None:
+            # also runs for a stream closed before it was iterated
+            live.unsubscribe(name, q)
+            stream_slots.release()
+
+        resp = Response(stream(), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"
+        resp.call_on_close(close)
+        return resp
 
     # ---- save project HTML endpoint ----
     @app.route("/api/projects/<project>/save", methods=["POST"])
@@ -513,6 +1953,367 @@ def create_app(config: Optional[dict] = None) -> Flask:
         else:
             return jsonify({"error": msg}), 500
 
+    # ---- delta save endpoint (index.html / style.css) ----
+    @app.route("/api/projects/<project>/patch", methods=["POST"])
+    def patch_project_file(project: str):
+        """
+        Apply a delta to index.html or style.css.
+        Expected JSON: {"file", "base" (hash/ETag of the base version), and
+        either "edits": [{"start", "end", "text"}] or "diff": unified diff}.
+        Returns 409 with the current hash if the base does not match.
+        """
+        data = request.get_json(force=True, silent=True) or {}
+        name = data.get("file", "index.html")
+        base_hash = str(data.get("base", "")).strip('"')
+        if not base_hash:
+            return jsonify({"error": "no base hash provided"}), 400
+        try:
+            new_hash = pm.patch_file(
+                project, name, base_hash, edits=data.get("edits"), diff=data.get("diff")
+            )
+        except FileNotFoundError:
+            return jsonify({"error": "project not found"}), 404
+        except PatchConflict as e:
+            return jsonify({"error": str(e), "hash": e.current_hash}), 409
+        except PatchError as e:
+            return jsonify({"error": str(e)}), 400
+        except OSError as e:
+            LOG.exception("Failed to patch %s for %s", name, project)
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"ok": True, "hash": new_hash})
+
+    # ---- version history ----
+    def history_file_arg() -> Optional[str]:
+        name = request.args.get("file", "index.html")
+        return name if name in PATCHABLE_FILES else None
+
+    @app.route("/api/projects/<project>/history", methods=["GET"])
+    def project_history(project: str):
+        """
+        List stored versions of a file, newest first.
+        Query params: file (index.html or style.css), limit, before (version).
+        """
+        name = history_file_arg()
+        if name is None:
+            return jsonify({"error": "file has no history"}), 400
+        if not pm.exists(project):
+            return jsonify({"error": "project not found"}), 404
+        try:
+            limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+            before = int(request.args["before"]) if "before" in request.args else None
+        except ValueError:
+            return jsonify({"error": "invalid limit or before"}), 400
+        versions = pm.history.versions(secure_filename(project), name)
+        if before is not None:
+            versions = [v for v in versions if v.version < before]
+        newest = versions[::-1][:limit]
+        return jsonify({"file": name, "versions": [v.to_dict() for v in newest]})
+
+    @app.route("/api/projects/<project>/history/<int:version>", methods=["GET"])
+    def project_history_version(project: str, version: int):
+        """Return the content of one version. Query param: file."""
+        name = history_file_arg()
+        if name is None:
+            return jsonify({"error": "file has no history"}), 400
+        try:
+            data = pm.history.get(secure_filename(project), name, version)
+        except KeyError:
+            return jsonify({"error": "version not found"}), 404
+        return jsonify(
+            {
+                "file": name,
+                "version": version,
+                "hash": content_hash(data),
+                "content": data.decode("utf-8", "replace"),
+            }
+        )
+
+    @app.route("/api/projects/<project>/history/diff", methods=["GET"])
+    def project_history_diff(project: str):
+        """
+        Unified diff between two versions.
+        Query params: file, from (version), to (version; default: current file).
+        """
+        name = history_file_arg()
+        if name is None:
+            return jsonify({"error": "file has no history"}), 400
+        path = pm.project_path(project)
+        if not path.is_dir():
+            return jsonify({"error": "project not found"}), 404
+        try:
+            old = int(request.args["from"])
+            new = int(request.args["to"]) if request.args.get("to") else None
+        except (KeyError, ValueError):
+            return jsonify({"error": "from (and optional to) must be versions"}), 400
+        try:
+            current = (path / name).read_bytes() if new is None else b""
+            diff = pm.history.diff(path.name, name, old, new, current)
+        except KeyError:
+            return jsonify({"error": "version not found"}), 404
+        except FileNotFoundError:
+            return jsonify({"error": "file not found"}), 404
+        return jsonify({"file": name, "from": old, "to": new, "diff": diff})
+
+    @app.route(
+        "/api/projects/<project>/history/<int:version>/restore", methods=["POST"]
+    )
+    def project_history_restore(project: str, version: int):
+        """Write a version back as the current file. JSON body: {"file"}."""
+        data = request.get_json(force=True, silent=True) or {}
+        name = data.get("file", "index.html")
+        if name not in PATCHABLE_FILES:
+            return jsonify({"error": "file has no history"}), 400
+        try:
+            new_hash = pm.restore_version(project, name, version)
+        except FileNotFoundError:
+            return jsonify({"error": "project not found"}), 404
+        except KeyError:
+            return jsonify({"error": "version not found"}), 404
+        except OSError as e:
+            LOG.exception("Failed to restore %s@%d for %s", name, version, project)
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"ok": True, "hash": new_hash})
+
+    # ---- element index of index.html (queries and subtree edits) ----
+    def project_dom(project: str) -> DomDocument:
+        """
+        :raises FileNotFoundError: if the project or its index.html is missing.
+        :raises DomError: if the page is not valid UTF-8.
+        """
+        path = pm.project_path(project)
+        if not path.is_dir():
+            raise FileNotFoundError(project)
+        return dom_index.get().document(path / "index.html")
+
+    @app.route("/api/projects/<project>/dom", methods=["GET"])
+    def project_dom_query(project: str):
+        """
+        Find elements of index.html.
+        Query params: id, class, tag (combined), limit, offset.
+        Without id, class or tag, returns the page's index statistics.
+        """
+        from dom import DOM_QUERY_DEFAULT_LIMIT, DOM_QUERY_MAX_LIMIT, DomError
+
+        try:
+            doc = project_dom(project)
+        except FileNotFoundError:
+            return jsonify({"error": "page not found"}), 404
+        except DomError as e:
+            return jsonify({"error": str(e)}), 400
+        ident, cls, tag = (request.args.get(k) or None for k in ("id", "class", "tag"))
+        if ident is None and cls is None and tag is None:
+            return jsonify(doc.stats())
+        try:
+            limit = int(request.args.get("limit", DOM_QUERY_DEFAULT_LIMIT))
+            limit = max(1, min(limit, DOM_QUERY_MAX_LIMIT))
+            offset = max(0, int(request.args.get("offset", 0)))
+        except ValueError:
+            return jsonify({"error": "invalid limit or offset"}), 400
+        matches = doc.find(id=ident, cls=cls, tag=tag)
+        nodes = list(itertools.islice(matches, offset, offset + limit + 1))
+        return jsonify(
+            {
+                "hash": doc.hash,
+                "nodes": [n.summary() for n in nodes[:limit]],
+                "more": len(nodes) > limit,
+            }
+        )
+
+    @app.route("/api/projects/<project>/dom/<path:node>", methods=["GET"])
+    def project_dom_node(project: str, node: str):
+        """Return one element: its attributes and source (outer HTML)."""
+        from dom import DomError
+
+        try:
+            doc = project_dom(project)
+            element = doc.node(node)
+        except FileNotFoundError:
+            return jsonify({"error": "page not found"}), 404
+        except DomError as e:
+            return jsonify({"error": str(e)}), 404
+        body = element.summary()
+        body["hash"] = doc.hash
+        body["attrs"] = [list(a) for a in element.attrs]
+        body["html"] = doc.outer_html(element)
+        return jsonify(body)
+
+    @app.route("/api/projects/<project>/dom/<path:node>", methods=["POST"])
+    def project_dom_edit(project: str, node: str):
+        """
+        Change one element of index.html; only the changed region is sent
+        and re-serialized.
+        Expected JSON: {"base" (hash of the page the path refers to), and one
+        of "attrs": {name: value, true or null}, "html", "inner_html" or
+        "text"}. Returns 409 with the current hash if the page changed.
+        """
+        from dom import DomError
+
+        data = request.get_json(force=True, silent=True) or {}
+        base_hash = str(data.get("base", "")).strip('"')
+        if not base_hash:
+            return jsonify({"error": "no base hash provided"}), 400
+        try:
+            doc = project_dom(project)
+            doc.node(node)
+        except FileNotFoundError:
+            return jsonify({"error": "page not found"}), 404
+        except DomError as e:
+            return jsonify({"error": str(e)}), 404
+        if doc.hash != base_hash:
+            return jsonify({"error": "base hash mismatch", "hash": doc.hash}), 409
+        try:
+            edit, updated = doc.apply(node, data)
+        except DomError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            new_hash = pm.patch_file(project, "index.html", base_hash, edits=[edit])
+        except FileNotFoundError:
+            return jsonify({"error": "project not found"}), 404
+        except PatchConflict as e:
+            return jsonify({"error": str(e), "hash": e.current_hash}), 409
+        except PatchError as e:
+            return jsonify({"error": str(e)}), 400
+        except OSError as e:
+            LOG.exception("Failed to edit %s of %s", node, project)
+            return jsonify({"error": str(e)}), 500
+        if new_hash == updated.hash:
+            dom_index.get().put(updated)
+        try:
+            summary: Optional[dict] = updated.node(node).summary()
+        except DomError:
+            summary = None  # the element was removed
+        return jsonify({"ok": True, "hash": new_hash, "node": summary})
+
+    # ---- export / import ----
+    @app.route("/api/projects/<project>/export.zip", methods=["GET"])
+    def export_project(project: str):
+        """Stream the project folder as a ZIP archive (built on the fly)."""
+        from archive import stream_zip
+
+        project_path = pm.project_path(project)
+        if not project_path.is_dir():
+            abort(404)
+        resp = Response(
+            stream_with_context(stream_zip(project_path)), mimetype="application/zip"
+        )
+        resp.headers["Content-Disposition"] = (
+            f'attachment; filename="{project_path.name}.zip"'
+        )
+        return resp
+
+    @app.route("/api/projects/import", methods=["POST"])
+    def import_project_route():
+        """
+        Create a project from an uploaded ZIP.
+        Expected form-data fields:
+          - file: the archive
+          - project_name: optional; defaults to the archive's file name
+        """
+        if "file" not in request.files:
+            return jsonify({"error": "no file"}), 400
+        file = request.files["file"]
+        name = request.form.get("project_name") or Path(file.filename or "").stem
+        try:
+            ok, msg = pm.import_project(name, file.stream)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), e.status
+        if not ok:
+            status = 409 if msg == "Project already exists" else 400
+            return jsonify({"error": msg}), status
+        return jsonify({"ok": True, "project": secure_filename(name)})
+
+    # ---- duplicate project ----
+    @app.route("/api/projects/<project>/duplicate", methods=["POST"])
+    def duplicate_project_route(project: str):
+        """
+        Duplicate a project. Expected JSON: {"name": new project name}
+        (defaults to "<project>_copy"). Reports the copy strategy and timing.
+        """
+        data = request.get_json(force=True, silent=True) or {}
+        new_name = data.get("name") or f"{project}_copy"
+        try:
+            ok, result = pm.duplicate_project(project, new_name)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), e.status
+        if not ok:
+            status = {"not found": 404, "Project already exists": 409}.get(
+                str(result), 400
+            )
+            return jsonify({"error": result}), status
+        assert not isinstance(result, str)
+        return jsonify(
+            {"ok": True, "project": secure_filename(new_name), **result.to_dict()}
+        )
+
+    # ---- publish (build) ----
+    @app.route("/api/projects/<project>/build", methods=["POST"])
+    def build_project_route(project: str):
+        """Build the project's published output and report per-step timings."""
+        ok, result = pm.build_project(project)
+        if not ok:
+            status = 404 if result == "not found" else 500
+            return jsonify({"error": result}), status
+        assert not isinstance(result, str)
+        url = url_for("serve_published_index", project=secure_filename(project))
+        return jsonify({"ok": True, "url": url, **result.to_dict()})
+
+    @app.route("/published/<project>/", methods=["GET"])
+    def serve_published_index(project: str):
+        """Serve the built index.html of a project."""
+        return pm.serve_published_file(project, "index.html")
+
+    @app.route("/published/<project>/<path:filename>", methods=["GET"])
+    def serve_published_file(project: str, filename: str):
+        """Serve a file of a project's last build."""
+        return pm.serve_published_file(project, filename)
+
+    # ---- batch operations ----
+    @app.route("/api/batch", methods=["POST"])
+    def api_batch():
+        """
+        Run many project operations in one request.
+
+        Body: {"operations": [...], "atomic": false, "stream": false}; each
+        operation is {"op", "project", "id"?} plus, per op:
+          - create: add_css, add_js (optional)
+          - delete: nothing
+          - save: html; save_css: css
+          - upload: filename, content_base64, target (optional)
+          - duplicate: new_name
+        Operations on different projects run in parallel, those on the same
+        project in order. With atomic, the first failure rolls back the
+        rest. Returns {"ok", "results": [...], ...summary}, or with stream
+        (or Accept: application/x-ndjson) one JSON line per finished
+        operation followed by the summary line.
+        """
+        from batch import NDJSON_MIMETYPE, BatchError, parse_batch
+
+        data = request.get_json(force=True, silent=True)
+        try:
+            ops, atomic = parse_batch(data)
+        except BatchError as e:
+            return jsonify({"error": str(e), "index": e.index}), 400
+        events = batch_runner.get().run(ops, atomic=atomic)
+        stream = bool(data.get("stream")) or (
+            request.accept_mimetypes.best == NDJSON_MIMETYPE
+        )
+        if stream:
+            resp = Response(
+                (json.dumps(event) + "\n" for event in events), mimetype=NDJSON_MIMETYPE
+            )
+            resp.headers["Cache-Control"] = "no-cache"
+            resp.headers["X-Accel-Buffering"] = "no"
+            return resp
+        results = []
+        summary: dict = {}
+        for event in events:
+            if event.get("done"):
+                summary = event
+            else:
+                results.append(event)
+        results.sort(key=lambda event: event["index"])
+        return jsonify(dict(summary, results=results))
+
     # ---- delete project ----
     @app.route("/api/projects/<project>", methods=["DELETE"])
     def delete_project_route(project: str):
@@ -529,12 +2330,69 @@ def create_app(config: Optional[dict] = None) -> Flask:
         Load and return html_tags_attributes.json from one of a few sensible locations.
         Returns 404 if not found.
         """
-        data, path_used = tl.load()
-        if data is None:
+        payload = tl.payload()
+        if payload is None:
+            return jsonify({"error": "not found"}), 404
+        return payload_response(payload)
+
+    @app.route("/api/tags", methods=["GET"])
+    def api_tags():
+        """Return the tag names and global attributes, without the per-tag lists."""
+        names = tl.tag_names()
+        if names is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify(names)
+
+    @app.route("/api/tags_attributes/<tag>", methods=["GET"])
+    def api_tag_attributes(tag: str):
+        """Return the global attributes merged with those specific to `tag`."""
+        attrs = tl.attributes_for(tag)
+        if attrs is None:
+            return jsonify({"error": "unknown tag"}), 404
+        return jsonify({"tag": tag.lower(), "attributes": attrs})
+
+    # ---- CSS schema autocompletion ----
+    @app.route("/api/css/complete", methods=["GET"])
+    def api_css_complete():
+        """
+        Complete CSS property names / value keywords for a prefix.
+        Query params: prefix, property (optional, complete its values), limit,
+        match ("prefix" or "contains") and documents (1: include the schema
+        entry of each matched property, so a list needs no further requests).
+        """
+        if not css_index.available():
             return jsonify({"error": "not found"}), 404
-        # debug log which file was used
-        LOG.info("Serving tags_attributes from: %s", path_used)
-        return jsonify(data)
+        try:
+            limit = int(request.args.get("limit", CSS_COMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({"error": "invalid limit"}), 400
+        result = css_index.complete(
+            request.args.get("prefix", ""),
+            prop=request.args.get("property") or None,
+            limit=limit,
+            contains=request.args.get("match") == "contains",
+            documents=request.args.get("documents") in ("1", "true"),
+        )
+        return jsonify(result)
+
+    @app.route("/api/css/properties", methods=["GET"])
+    def api_css_properties():
+        """
+        Return the schema entries of several properties at once.
+        Query param: names (comma-separated, at most CSS_COMPLETE_MAX_LIMIT).
+        """
+        names = [n for n in request.args.get("names", "").split(",") if n.strip()]
+        if len(names) > CSS_COMPLETE_MAX_LIMIT:
+            return jsonify({"error": "too many names"}), 400
+        return jsonify({"properties": css_index.properties(names)})
+
+    @app.route("/api/css/property/<name>", methods=["GET"])
+    def api_css_property(name: str):
+        """Return the schema entry for a single CSS property."""
+        doc = css_index.property(name)
+        if doc is None:
+            return jsonify({"error": "unknown property"}), 404
+        return jsonify(doc)
 
     # ---- save css endpoint ----
     @app.route("/api/projects/<project>/save_css", methods=["POST"])
@@ -556,7 +2414,16 @@ def create_app(config: Optional[dict] = None) -> Flask:
         Expected form-data fields:
           - file: the uploaded file
           - target: optional subfolder / category (images/videos/audio or custom)
+        A body larger than the project's remaining quota is refused (413)
+        before it is read.
         """
+        project_path = pm.project_path(project)
+        if request.content_length:
+            try:
+                # bytes only: the part could replace a file, so no file slot is needed
+                quotas.check(project_path.name, request.content_length, 0)
+            except QuotaExceeded as e:
+                return jsonify({"error": str(e)}), e.status
         if "file" not in request.files:
             return jsonify({"error": "no file"}), 400
         file = request.files["file"]
@@ -564,15 +2431,133 @@ def create_app(config: Optional[dict] = None) -> Flask:
         if file.filename == "":
             return jsonify({"error": "empty filename"}), 400
 
-        project_path = pm.project_path(project)
         if not project_path.exists():
             return jsonify({"error": "project not found"}), 404
 
-        ok, result = um.save_upload(project_path, file, target)
+        try:
+            ok, result = um.save_upload(project_path, file, target)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), e.status
         if not ok:
             return jsonify({"error": result}), 400
-        return jsonify({"ok": True, "path": result})
+        return jsonify(upload_result(project_path, result or "", target))
+
+    @app.route("/api/projects/<project>/usage", methods=["GET"])
+    def project_usage(project: str):
+        """
+        Bytes and files used by a project, its quota and what is left.
+        Served from the registry's counters, without walking the project.
+        """
+        usage = quotas.usage(pm.project_path(project).name)
+        if usage is None:
+            return jsonify({"error": "project not found"}), 404
+        return jsonify(usage)
 
+    # ---- chunked / resumable upload endpoints ----
+    @app.route("/api/projects/<project>/uploads", methods=["POST"])
+    def start_chunked_upload(project: str):
+        """
+        Start a chunked upload.
+        Expected JSON: filename, size, optional target (default images),
+        chunk_size and sha256 (whole-file hex digest, checked on finish).
+        Returns the session status including upload_id and chunk_size.
+        """
+        project_path = pm.project_path(project)
+        if not project_path.is_dir():
+            return jsonify({"error": "project not found"}), 404
+        data = request.get_json(force=True, silent=True) or {}
+        try:
+            size = int(data["size"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "no size provided"}), 400
+        try:
+            session = cu.start(
+                project,
+                project_path,
+                data.get("filename", ""),
+                data.get("target", "images"),
+                size,
+                chunk_size=data.get("chunk_size"),
+                sha256=data.get("sha256"),
+            )
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+        return jsonify(session.status()), 201
+
+    @app.route("/api/projects/<project>/uploads/<upload_id>", methods=["GET"])
+    def chunked_upload_status(project: str, upload_id: str):
+        """Return received chunks and the next chunk to send (for resuming)."""
+        try:
+            return jsonify(cu.get(project, upload_id).status())
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+
+    @app.route(
+        "/api/projects/<project>/uploads/<upload_id>/<int:index>", methods=["PUT"]
+    )
+    def put_upload_chunk(project: str, upload_id: str, index: int):
+        """
+        Store chunk `index` from the raw request body.
+        The X-Chunk-SHA256 header must carry the chunk's hex SHA-256.
+        """
+        try:
+            session = cu.write_chunk(
+                project,
+                upload_id,
+                index,
+                request.stream,
+                request.headers.get("X-Chunk-SHA256"),
+            )
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+        return jsonify(session.status())
+
+    @app.route("/api/projects/<project>/uploads/<upload_id>/finish", methods=["POST"])
+    def finish_chunked_upload(project: str, upload_id: str):
+        """Assemble the upload into the project; response matches /upload."""
+        project_path = pm.project_path(project)
+        if not project_path.is_dir():
+            return jsonify({"error": "project not found"}), 404
+        try:
+            session = cu.get(project, upload_id)
+            rel = cu.finish(project, project_path, upload_id)
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+        return jsonify(upload_result(project_path, rel, session.target))
+
+    @app.route("/api/projects/<project>/uploads/<upload_id>", methods=["DELETE"])
+    def abort_chunked_upload(project: str, upload_id: str):
+        """Cancel a chunked upload and discard received data."""
+        try:
+            cu.abort(project, upload_id)
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+        return jsonify({"ok": True})
+
+    def request_body_limit(environ: dict) -> Optional[int]:
+        """
+        Largest request body accepted for `environ`, for servers that
+        receive the body before the view runs (asgi.py): MAX_CONTENT_LENGTH
+        or the chunked upload cap, a chunk's largest size for chunk PUTs and
+        the project's remaining quota for uploads.
+        """
+        limit = app.config.get("MAX_CONTENT_LENGTH") or cu.max_size
+        try:
+            endpoint, args = app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return limit
+        if endpoint == "put_upload_chunk":
+            return min(limit, UPLOAD_MAX_CHUNK_SIZE)
+        if endpoint == "upload_project_file":
+            usage = quotas.usage(pm.project_path(args["project"]).name)
+            if usage is not None and usage["available_bytes"] is not None:
+                return min(limit, usage["available_bytes"])
+        return limit
+
+    app.request_body_limit = request_body_limit  # type: ignore[attr-defined]
+
+    report.mark("routes")
+    LOG.info("create_app took %s", report.summary())
     # end create_app
     return app
 
@@ -585,6 +2570,8 @@ if __name__ == "__main__":
     import secrets
     from pathlib import Path
 
+    logging.basicConfig(level=logging.INFO)
+
     # Ensure a FLASK_SECRET exists for the process (dev-safe).
     # In production you should set FLASK_SECRET in the environment permanently.
     if not os.environ.get("FLASK_SECRET"):
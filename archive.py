@@ -0,0 +1,221 @@
+# archive.py — streaming ZIP export / import of project folders
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import stat
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, List, Tuple
+
+LOG = logging.getLogger(__name__)
+
+# Bytes copied per iteration; also roughly the size of each yielded chunk
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+
+# Extensions whose content is already compressed: stored, not deflated
+ARCHIVE_STORED_EXT = {
+    "png", "jpg", "jpeg", "gif", "webp", "avif",
+    "mp4", "webm", "ogg", "mov", "mp3", "m4a",
+    "zip", "gz", "br", "bz2", "xz", "7z",
+    "woff", "woff2", "pdf",
+}
+
+# Import safety limits
+IMPORT_MAX_ENTRIES = 10000
+IMPORT_MAX_TOTAL_BYTES = 4 * 1024 * 1024 * 1024
+# Maximum uncompressed/compressed ratio per entry (zip-bomb guard)
+IMPORT_MAX_RATIO = 200
+
+
+class ArchiveError(ValueError):
+    """The archive is malformed or exceeds an import limit."""
+
+
+class _ZipSink:
+    """
+    Write-only, non-seekable file object for zipfile.
+
+    zipfile falls back to data descriptors on unseekable output, so the
+    archive can be emitted front to back; `drain` hands out what has been
+    written since the last call.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._parts.append(bytes(data))
+            self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _is_internal(rel: PurePosixPath) -> bool:
+    """Dot-prefixed names are app-internal (temp files, caches)."""
+    return any(part.startswith(".") for part in rel.parts)
+
+
+def iter_project_files(project_path: Path) -> Iterator[Tuple[Path, str]]:
+    """Yield (absolute path, archive name) for every exportable file, sorted."""
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for fname in sorted(files):
+            full = Path(root) / fname
+            rel = PurePosixPath(full.relative_to(project_path).as_posix())
+            if not _is_internal(rel):
+                yield full, str(rel)
+
+
+def stream_zip(project_path: Path) -> Iterator[bytes]:
+    """
+    Generate a ZIP of `project_path` chunk by chunk.
+
+    Nothing is buffered beyond one ARCHIVE_CHUNK_SIZE block (plus the
+    central directory at the end), so memory stays fixed regardless of
+    project size. Already-compressed media are stored as-is.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:  # type: ignore[arg-type]
+        for full, arcname in iter_project_files(project_path):
+            try:
+                st = full.stat()
+            except OSError:
+                continue
+            zinfo = zipfile.ZipInfo.from_file(full, arcname)
+            ext = arcname.rsplit(".", 1)[-1].lower() if "." in arcname else ""
+            zinfo.compress_type = (
+                zipfile.ZIP_STORED if ext in ARCHIVE_STORED_EXT else zipfile.ZIP_DEFLATED
+            )
+            zinfo.file_size = st.st_size
+            with full.open("rb") as src, zf.open(zinfo, "w") as dst:
+                for block in iter(lambda: src.read(ARCHIVE_CHUNK_SIZE), b""):
+                    dst.write(block)
+                    out = sink.drain()
+                    if out:
+                        yield out
+            out = sink.drain()
+            if out:
+                yield out
+    out = sink.drain()
+    if out:
+        yield out
+
+
+def _safe_member_path(name: str) -> PurePosixPath:
+    """Validate an archive member name and return it as a relative path."""
+    rel = PurePosixPath(name.replace("\\", "/"))
+    if rel.is_absolute() or ".." in rel.parts or not rel.parts:
+        raise ArchiveError(f"unsafe path in archive: {name}")
+    return rel
+
+
+def _strip_common_root(names: List[PurePosixPath]) -> int:
+    """
+    Return 1 if every member lives under the same single top-level folder
+    (as produced by zipping a folder), else 0.
+    """
+    tops = {n.parts[0] for n in names}
+    if len(tops) == 1 and all(len(n.parts) > 1 for n in names):
+        return 1
+    return 0
+
+
+def declared_totals(fileobj: BinaryIO) -> Tuple[int, int]:
+    """
+    (files, uncompressed bytes) an archive declares, read from its central
+    directory without extracting. extract_zip never writes more than that.
+
+    :raises ArchiveError: if it is not a ZIP archive.
+    """
+    try:
+        with zipfile.ZipFile(fileobj) as zf:
+            members = [m for m in zf.infolist() if not m.is_dir()]
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"not a zip archive: {e}")
+    return len(members), sum(m.file_size for m in members)
+
+
+def extract_zip(
+    fileobj: BinaryIO,
+    dest: Path,
+    *,
+    max_entries: int = IMPORT_MAX_ENTRIES,
+    max_total_bytes: int = IMPORT_MAX_TOTAL_BYTES,
+    max_ratio: int = IMPORT_MAX_RATIO,
+) -> Tuple[int, int]:
+    """
+    Unpack a ZIP (seekable file object) into the empty directory `dest`.
+
+    Entries are copied in ARCHIVE_CHUNK_SIZE blocks; actual decompressed
+    bytes are counted against the limits, so lying headers do not help a
+    zip bomb. A single wrapping folder is stripped.
+
+    :return: Tuple (files written, bytes written).
+    :raises ArchiveError: on unsafe names or exceeded limits.
+    """
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"not a zip archive: {e}")
+    with zf:
+        members = [m for m in zf.infolist() if not m.is_dir()]
+        if len(members) > max_entries:
+            raise ArchiveError(f"too many entries ({len(members)} > {max_entries})")
+        declared = sum(m.file_size for m in members)
+        if declared > max_total_bytes:
+            raise ArchiveError("archive too large")
+        paths = [_safe_member_path(m.filename) for m in members]
+        strip = _strip_common_root(paths) if paths else 0
+
+        files = total = 0
+        for info, rel in zip(members, paths):
+            rel = PurePosixPath(*rel.parts[strip:])
+            if _is_internal(rel):
+                continue
+            mode = info.external_attr >> 16
+            if mode and stat.S_ISLNK(mode):
+                raise ArchiveError(f"symlinks are not allowed: {info.filename}")
+            target = dest.joinpath(*rel.parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            written = 0
+            limit = max(info.compress_size, 1) * max_ratio
+            with zf.open(info) as src, target.open("wb") as out:
+                for block in iter(lambda: src.read(ARCHIVE_CHUNK_SIZE), b""):
+                    written += len(block)
+                    total += len(block)
+                    if written > limit:
+                        raise ArchiveError(f"compression ratio too high: {info.filename}")
+                    if total > max_total_bytes:
+                        raise ArchiveError("archive too large")
+                    out.write(block)
+            files += 1
+        return files, total
+
+
+def import_into(fileobj: BinaryIO, staging: Path, final: Path) -> Tuple[int, int]:
+    """
+    Extract into `staging` and rename it to `final` when complete, so a
+    failed import never leaves a half-populated project behind.
+    """
+    staging.mkdir(parents=True)
+    try:
+        result = extract_zip(fileobj, staging)
+        os.rename(staging, final)
+        return result
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
@@ -0,0 +1,350 @@
+# asgi.py — ASGI entry point: the Flask app behind a thread-offloading bridge
+"""
+Serve the app from an ASGI server so that slow clients cost a coroutine
+instead of a worker:
+
+    uvicorn --factory asgi:create_asgi_app
+    gunicorn -k uvicorn.workers.UvicornWorker "asgi:create_asgi_app()"
+
+The WSGI entry point (`gunicorn "app:create_app()"`) keeps working; both
+run the same Flask app and managers. Under ASGI:
+
+- request bodies are received on the event loop (spooled to a temporary
+  file past ASGI_SPOOL_MAX_MEMORY) before a thread runs the view, so an
+  upload trickling in holds no thread. As the view cannot refuse a body
+  it has not seen yet, one larger than the app's `request_body_limit`
+  (size caps and quotas) is answered with 413 here: at once when its
+  content-length says so, else as soon as that many bytes arrived;
+- response bodies are pulled from the view one block at a time in the
+  thread pool and sent from the loop, so a big file going to a slow reader
+  holds a thread only while a block is read;
+- the live-reload SSE stream is served natively as a coroutine.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from werkzeug.wsgi import FileWrapper
+
+from app import create_app
+from live import SSE_HEARTBEAT, sse_format
+
+LOG = logging.getLogger(__name__)
+
+# Threads running Flask views (the equivalent of sync worker slots)
+ASGI_THREADS = 32
+# Request bodies larger than this are spooled to disk while they arrive
+ASGI_SPOOL_MAX_MEMORY = 1024 * 1024
+# Read size of files streamed through wsgi.file_wrapper
+ASGI_FILE_BLOCK = 256 * 1024
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+_EVENTS_RE = re.compile(r"^/api/projects/([^/]+)/events$")
+_END = object()
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request body was complete."""
+
+
+class BodyTooLarge(Exception):
+    """The request body is larger than the app accepts for the request."""
+
+
+def _file_wrapper(file: IO[bytes], buffer_size: int = 8192) -> FileWrapper:
+    return FileWrapper(file, max(buffer_size, ASGI_FILE_BLOCK))
+
+
+def build_environ(scope: Scope, body: IO[bytes], length: int) -> dict:
+    """Translate an ASGI http scope into a PEP 3333 environ."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": str(client[0]),
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": _file_wrapper,
+    }
+    for raw_name, raw_value in scope.get("headers", ()):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue  # the body is complete: its real size was set above
+        if name != "CONTENT_TYPE":
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class AsgiBridge:
+    """
+    ASGI application serving a WSGI (Flask) app from a thread pool, plus a
+    native coroutine for the live-reload event stream.
+    """
+
+    def __init__(self, wsgi_app, *, threads: int = ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="asgi"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            # no websocket routes
+            await send({"type": "websocket.close", "code": 1000})
+            return
+        match = _EVENTS_RE.match(scope["path"])
+        if match and scope["method"] == "GET":
+            await self._events(match.group(1), scope, receive, send)
+            return
+        await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # in-flight views finish on their own; persistence runs at exit
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---- WSGI views ----
+    async def _read_body(
+        self, receive: Receive, limit: Optional[int] = None
+    ) -> Tuple[IO[bytes], int]:
+        """
+        Receive the whole request body without holding a thread.
+
+        :raises BodyTooLarge: once more than `limit` bytes were received.
+        """
+        loop = asyncio.get_running_loop()
+        body = tempfile.SpooledTemporaryFile(max_size=ASGI_SPOOL_MAX_MEMORY)
+        size = 0
+        more = True
+        try:
+            while more:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ClientDisconnected()
+                chunk = message.get("body", b"")
+                if chunk:
+                    size += len(chunk)
+                    if limit is not None and size > limit:
+                        raise BodyTooLarge()
+                    if size > ASGI_SPOOL_MAX_MEMORY:
+                        # rolled over to disk: keep file writes off the loop
+                        await loop.run_in_executor(self.executor, body.write, chunk)
+                    else:
+                        body.write(chunk)
+                more = message.get("more_body", False)
+            body.seek(0)
+        except BaseException:
+            body.close()
+            raise
+        return body, size
+
+    async def _wsgi(self, scope: Scope, receive: Receive, send: Send) -> None:
+        loop = asyncio.get_running_loop()
+        limit = await loop.run_in_executor(self.executor, self._body_limit, scope)
+        if limit is not None and _content_length(scope) > limit:
+            await _send_too_large(send, limit)
+            return
+        try:
+            body, size = await self._read_body(receive, limit)
+        except ClientDisconnected:
+            return
+        except BodyTooLarge:
+            await _send_too_large(send, limit)
+            return
+        environ = build_environ(scope, body, size)
+        started: List[Any] = []
+
+        def start_response(status: str, headers: list, exc_info=None):
+            if exc_info is not None and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [status, headers]
+            return _no_write
+
+        def run():
+            result = self.wsgi_app(environ, start_response)
+            try:
+                chunks = iter(result)
+                # the first block is pulled here so start_response has been called
+                return result, chunks, next(chunks, _END)
+            except BaseException:
+                if hasattr(result, "close"):
+                    result.close()
+                raise
+
+        result = None
+        try:
+            result, chunks, chunk = await loop.run_in_executor(self.executor, run)
+            status, headers = started
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [
+                        (k.lower().encode("latin-1"), v.encode("latin-1"))
+                        for k, v in headers
+                    ],
+                }
+            )
+            while chunk is not _END:
+                if chunk:
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                chunk = await loop.run_in_executor(self.executor, next, chunks, _END)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+            body.close()
+
+    def _body_limit(self, scope: Scope) -> Optional[int]:
+        limit = getattr(self.wsgi_app, "request_body_limit", None)
+        if limit is None:
+            return None
+        return limit(build_environ(scope, io.BytesIO(), 0))
+
+    # ---- live-reload stream ----
+    async def _events(
+        self, project: str, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        """
+        Same stream as the WSGI `project_events` view, as a coroutine: an
+        idle subscriber costs a queue and a task, not a thread.
+        """
+        pm = self.wsgi_app.project_manager
+        hub = self.wsgi_app.live_reload.get()
+        project_path = pm.project_path(project)
+        if not project_path.is_dir():
+            # let the Flask view produce its usual 404
+            await self._wsgi(scope, receive, send)
+            return
+        name = project_path.name
+        loop = asyncio.get_running_loop()
+        # the first subscriber of a project walks its tree to add watches
+        sub = await loop.run_in_executor(self.executor, hub.subscribe_async, name, loop)
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            payload: Optional[str] = "retry: 2000\n\n"
+            while payload is not None:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": payload.encode("utf-8"),
+                        "more_body": True,
+                    }
+                )
+                payload = await _next_event(sub, disconnected)
+        finally:
+            disconnected.cancel()
+            hub.unsubscribe(name, sub)
+
+
+async def _next_event(sub, disconnected: "asyncio.Future[None]") -> Optional[str]:
+    """The next SSE payload (an event or a keep-alive), None on disconnect."""
+    getter = asyncio.ensure_future(sub.get())
+    done, _ = await asyncio.wait(
+        {getter, disconnected},
+        timeout=SSE_HEARTBEAT,
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+    if getter in done:
+        return sse_format("change", json.dumps(getter.result()))
+    getter.cancel()
+    if disconnected in done:
+        return None
+    return ": keep-alive\n\n"
+
+
+async def _wait_disconnect(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _content_length(scope: Scope) -> int:
+    for name, value in scope.get("headers", ()):
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+async def _send_too_large(send: Send, limit: Optional[int]) -> None:
+    body = json.dumps({"error": f"request body larger than {limit} bytes"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def _no_write(data: bytes) -> None:
+    raise NotImplementedError("the WSGI write() callable is not supported")
+
+
+def create_asgi_app(config: Optional[dict] = None, **kwargs) -> AsgiBridge:
+    """
+    Build the Flask app (see app.create_app) and wrap it for ASGI servers.
+    Keyword arguments are passed to AsgiBridge.
+    """
+    return AsgiBridge(create_app(config), **kwargs)
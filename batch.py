@@ -0,0 +1,420 @@
+# batch.py — run many project operations from one request, in parallel
+from __future__ import annotations
+
+import base64
+import binascii
+import io
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from quota import QuotaExceeded
+
+LOG = logging.getLogger(__name__)
+
+BATCH_MAX_OPERATIONS = 1000
+# Threads shared by all batches; operations never block waiting on each other
+BATCH_WORKERS = 8
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# op -> string fields it requires besides "project"
+BATCH_OPERATIONS: Dict[str, Tuple[str, ...]] = {
+    "create": (),
+    "delete": (),
+    "save": ("html",),
+    "save_css": ("css",),
+    "upload": ("filename", "content_base64"),
+    "duplicate": ("new_name",),
+}
+
+Undo = Callable[[], object]
+
+
+class BatchError(ValueError):
+    """A malformed batch (nothing was run)."""
+
+    def __init__(self, message: str, index: Optional[int] = None):
+        super().__init__(message)
+        self.index = index
+
+
+@dataclass
+class BatchOp:
+    """One parsed operation of a batch."""
+
+    index: int
+    op: str
+    project: str
+    args: dict
+    # normalized target name of a duplicate
+    dest: str = ""
+
+    @property
+    def keys(self) -> Tuple[str, ...]:
+        """Projects this operation touches (operations sharing one run in order)."""
+        return (self.project, self.dest) if self.dest else (self.project,)
+
+
+@dataclass
+class OpResult:
+    """Outcome of one operation."""
+
+    op: BatchOp
+    ok: bool
+    result: Any = None
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    undo: Optional[Undo] = field(default=None, repr=False)
+    # run once the batch is over, if the operation was not undone
+    release: Optional[Undo] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        out: dict = {
+            "index": self.op.index,
+            "op": self.op.op,
+            "project": self.op.project,
+            "ok": self.ok,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+        if "id" in self.op.args:
+            out["id"] = self.op.args["id"]
+        if self.ok:
+            out["result"] = self.result
+        else:
+            out["error"] = self.error
+        return out
+
+
+def parse_batch(payload: Any) -> Tuple[List[BatchOp], bool]:
+    """
+    Validate a batch request body.
+
+    :param payload: {"operations": [{"op", "project", ...}], "atomic": bool}
+    :return: Tuple (operations, atomic).
+    :raises BatchError: if the body or any operation is malformed.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("operations"), list):
+        raise BatchError("operations must be a list")
+    raw = payload["operations"]
+    if not raw:
+        raise BatchError("no operations")
+    if len(raw) > BATCH_MAX_OPERATIONS:
+        raise BatchError(f"too many operations (max {BATCH_MAX_OPERATIONS})")
+    ops: List[BatchOp] = []
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise BatchError("operation must be an object", index)
+        name = item.get("op")
+        required = BATCH_OPERATIONS.get(name) if isinstance(name, str) else None
+        if required is None:
+            raise BatchError(f"unknown op: {name}", index)
+        project = secure_filename(str(item.get("project") or ""))
+        if not project:
+            raise BatchError("invalid project name", index)
+        for key in required:
+            if not isinstance(item.get(key), str):
+                raise BatchError(f"{name} needs a string {key!r}", index)
+        op = BatchOp(index, name, project, item)
+        if name == "duplicate":
+            op.dest = secure_filename(item["new_name"])
+            if not op.dest:
+                raise BatchError("invalid new_name", index)
+        ops.append(op)
+    atomic = bool(payload.get("atomic"))
+    if atomic:
+        # deletes run last in an atomic batch (undoing one means moving the
+        # project back out of the trash), so they must not be ordered with
+        # other operations on the same project
+        deleted = {op.project for op in ops if op.op == "delete"}
+        for op in ops:
+            if op.op != "delete" and deleted.intersection(op.keys):
+                raise BatchError(
+                    "atomic batches cannot combine delete with other operations "
+                    "on the same project",
+                    op.index,
+                )
+    return ops, atomic
+
+
+class _Schedule:
+    """
+    Submit `ops` to `pool` as soon as every earlier operation on the same
+    project(s) has finished; results are put on `out` in completion order.
+    """
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        ops: List[BatchOp],
+        execute: Callable[[BatchOp], OpResult],
+        out: "queue.Queue[OpResult]",
+    ):
+        self._pool = pool
+        self._execute = execute
+        self._out = out
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = {}
+        self._dependents: Dict[int, List[BatchOp]] = {}
+        self.aborted = False
+        last: Dict[str, int] = {}
+        ready = []
+        for op in ops:
+            deps = {last[key] for key in op.keys if key in last}
+            self._pending[op.index] = len(deps)
+            for dep in deps:
+                self._dependents.setdefault(dep, []).append(op)
+            for key in op.keys:
+                last[key] = op.index
+            if not deps:
+                ready.append(op)
+        for op in ready:
+            self._pool.submit(self._run, op)
+
+    def _run(self, op: BatchOp) -> None:
+        if self.aborted:
+            result = OpResult(op, False, error="skipped: batch aborted")
+        else:
+            result = self._execute(op)
+        self._out.put(result)
+        with self._lock:
+            ready = []
+            for dependent in self._dependents.pop(op.index, ()):
+                self._pending[dependent.index] -= 1
+                if not self._pending[dependent.index]:
+                    ready.append(dependent)
+        for dependent in ready:
+            self._pool.submit(self._run, dependent)
+
+
+@dataclass
+class BatchRunner:
+    """
+    Execute parsed batches against the project and upload managers.
+
+    Operations on different projects run in parallel on one bounded pool;
+    operations touching the same project run in request order. In atomic
+    mode the first failure skips whatever has not started yet and undoes
+    what already succeeded: created or duplicated projects are deleted,
+    saved files get their previous content back, newly uploaded files
+    are removed and deleted projects are moved back out of the trash (where
+    they are held until the batch is over). Deletes run after everything
+    else has succeeded.
+
+    :param pm: ProjectManager
+    :param um: UploadManager
+    :param upload_result: optional callable(project_path, rel, target) -> dict
+        building an upload's result (as the upload endpoint does)
+    """
+
+    pm: Any
+    um: Any
+    upload_result: Optional[Callable[[Path, str, str], dict]] = None
+    max_workers: int = BATCH_WORKERS
+    _pool: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def run(self, ops: List[BatchOp], *, atomic: bool = False) -> Iterator[dict]:
+        """
+        Run a batch, yielding each operation's result as it completes and
+        finally a summary ({"done": true, ...}). If the consumer stops early
+        (client gone) the batch still runs to the end, rollback included.
+        """
+        events = self._events(ops, atomic)
+        try:
+            for event in events:
+                yield event
+        finally:
+            for _ in events:
+                pass
+
+    def _events(self, ops: List[BatchOp], atomic: bool) -> Iterator[dict]:
+        started = time.perf_counter()
+        if atomic:
+            phases = [
+                [op for op in ops if op.op != "delete"],
+                [op for op in ops if op.op == "delete"],
+            ]
+        else:
+            phases = [ops]
+        done: List[OpResult] = []
+        failed = 0
+        for phase in phases:
+            if failed and atomic:
+                for op in phase:
+                    result = OpResult(op, False, error="skipped: batch aborted")
+                    done.append(result)
+                    yield result.to_dict()
+                continue
+            out: "queue.Queue[OpResult]" = queue.Queue()
+            schedule = _Schedule(
+                self._get_pool(), phase, lambda op: self._execute(op, atomic), out
+            )
+            for _ in phase:
+                result = out.get()
+                if not result.ok:
+                    failed += 1
+                    schedule.aborted = atomic
+                done.append(result)
+                yield result.to_dict()
+        rolled_back: List[int] = []
+        if failed and atomic:
+            rolled_back = self._rollback(done)
+        for result in done:
+            if result.ok and result.release is not None:
+                if result.op.index not in rolled_back:
+                    self._release(result)
+        yield {
+            "done": True,
+            "ok": not failed,
+            "total": len(ops),
+            "succeeded": sum(1 for r in done if r.ok),
+            "failed": failed,
+            "atomic": atomic,
+            "rolled_back": rolled_back,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _rollback(self, done: List[OpResult]) -> List[int]:
+        """Undo successful operations, newest first. Returns their indices."""
+        undone = []
+        for result in reversed(done):
+            if not result.ok or result.undo is None:
+                continue
+            try:
+                result.undo()
+                undone.append(result.op.index)
+            except Exception:
+                LOG.exception("Failed to roll back batch operation %d", result.op.index)
+        return sorted(undone)
+
+    @staticmethod
+    def _release(result: OpResult) -> None:
+        assert result.release is not None
+        try:
+            result.release()
+        except Exception:
+            LOG.exception("Failed to release batch operation %d", result.op.index)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="batch"
+                )
+            return self._pool
+
+    # ---- operations ----
+    def _execute(self, op: BatchOp, atomic: bool) -> OpResult:
+        started = time.perf_counter()
+        try:
+            handler = getattr(self, f"_op_{op.op}")
+            # (ok, value, undo) plus, for some, a release callable
+            ok, value, undo, *release = handler(op, atomic)
+        except Exception as e:
+            LOG.exception("Batch operation %d (%s) failed", op.index, op.op)
+            ok, value, undo, release = False, str(e), None, []
+        elapsed = (time.perf_counter() - started) * 1000
+        if ok:
+            return OpResult(
+                op,
+                True,
+                result=value,
+                elapsed_ms=elapsed,
+                undo=undo,
+                release=release[0] if release else None,
+            )
+        return OpResult(op, False, error=str(value), elapsed_ms=elapsed)
+
+    def _op_create(self, op: BatchOp, atomic: bool):
+        ok, msg = self.pm.create_project(
+            op.project,
+            add_css=bool(op.args.get("add_css")),
+            add_js=bool(op.args.get("add_js")),
+        )
+        return ok, msg, lambda: self.pm.delete_project(op.project)
+
+    def _op_delete(self, op: BatchOp, atomic: bool):
+        if not atomic:
+            ok, msg = self.pm.delete_project(op.project)
+            return ok, msg, None
+        # held in the trash until the batch is over, so a rollback can restore it
+        ok, deleted = self.pm.delete_project_held(op.project)
+        if not ok:
+            return False, deleted, None
+        return (
+            True,
+            "deleted",
+            lambda: self.pm.restore_project(deleted),
+            lambda: self.pm.release_deleted(deleted),
+        )
+
+    def _op_duplicate(self, op: BatchOp, atomic: bool):
+        try:
+            ok, result = self.pm.duplicate_project(op.project, op.dest)
+        except QuotaExceeded as e:
+            return False, str(e), None
+        if not ok:
+            return False, result, None
+        return True, result.to_dict(), lambda: self.pm.delete_project(op.dest)
+
+    def _op_save(self, op: BatchOp, atomic: bool):
+        return self._save(op, "index.html", op.args["html"], self.pm.save_index_html)
+
+    def _op_save_css(self, op: BatchOp, atomic: bool):
+        return self._save(op, "style.css", op.args["css"], self.pm.save_css)
+
+    def _save(self, op: BatchOp, name: str, content: str, save: Callable):
+        target = self.pm.project_path(op.project) / name
+        try:
+            previous: Optional[bytes] = target.read_bytes()
+        except OSError:
+            previous = None
+        ok, msg = save(op.project, content)
+
+        def undo():
+            if previous is None:
+                self.pm.remove_file(op.project, name)
+            else:
+                # the bytes as they were, whatever their encoding
+                save(op.project, previous)
+
+        return ok, msg, undo
+
+    def _op_upload(self, op: BatchOp, atomic: bool):
+        project_path = self.pm.project_path(op.project)
+        if not project_path.is_dir():
+            return False, "project not found", None
+        try:
+            data = base64.b64decode(op.args["content_base64"], validate=True)
+        except (binascii.Error, ValueError):
+            return False, "content_base64 is not valid base64", None
+        filename = op.args["filename"]
+        target = str(op.args.get("target") or "images")
+        ok, dest = self.um.resolve_destination(project_path, filename, target)
+        if not ok:
+            return False, dest, None
+        existed = Path(dest).exists()
+        if existed and atomic:
+            # a replaced upload could not be restored on rollback
+            return False, "file exists (atomic batches do not replace uploads)", None
+        storage = FileStorage(stream=io.BytesIO(data), filename=filename)
+        try:
+            ok, rel = self.um.save_upload(project_path, storage, target)
+        except QuotaExceeded as e:
+            return False, str(e), None
+        if not ok:
+            return False, rel, None
+        if self.upload_result is not None:
+            result = self.upload_result(project_path, rel, target)
+        else:
+            result = {"ok": True, "path": rel}
+        undo = None if existed else (lambda: self.pm.remove_file(op.project, rel))
+        return True, result, undo
@@ -0,0 +1,225 @@
+# bench_asgi.py — concurrent-connection capacity of the WSGI vs. ASGI deployments
+"""
+Start the app under gunicorn sync workers (WSGI) and under an ASGI server,
+hold many long-lived connections open (live-reload SSE streams and slow
+uploads trickling their body), and measure how quick requests fare
+meanwhile.
+
+A mode is skipped when its server is not installed (the ASGI mode needs
+uvicorn). Each server runs on a private copy of the app, so the real
+projects/ directory is never touched.
+
+Usage:
+    python benchmarks/bench_asgi.py [--connections N] [--workers W] [--modes M]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+PROJECT = "bench"
+HOST = "127.0.0.1"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def make_tree(dest: Path) -> None:
+    """Copy the app into `dest` with one small project to serve."""
+    for path in ROOT.glob("*.py"):
+        shutil.copy2(path, dest / path.name)
+    for name in ("static", "templates"):
+        if (ROOT / name).is_dir():
+            shutil.copytree(ROOT / name, dest / name)
+    project = dest / "projects" / PROJECT
+    project.mkdir(parents=True)
+    (project / "index.html").write_text("<html><body><h1>bench</h1></body></html>")
+
+
+def server_command(mode: str, port: int, workers: int) -> Optional[List[str]]:
+    """Command line for `mode`, or None when its server is not installed."""
+    has_gunicorn = importlib.util.find_spec("gunicorn") is not None
+    has_uvicorn = importlib.util.find_spec("uvicorn") is not None
+    gunicorn = [sys.executable, "-m", "gunicorn", "-w", str(workers)]
+    gunicorn += ["-b", f"{HOST}:{port}", "--timeout", "120"]
+    if mode == "wsgi":
+        return gunicorn + ["app:create_app()"] if has_gunicorn else None
+    if not has_uvicorn:
+        return None
+    if has_gunicorn:
+        worker = ["-k", "uvicorn.workers.UvicornWorker"]
+        return gunicorn + worker + ["asgi:create_asgi_app()"]
+    uvicorn = [sys.executable, "-m", "uvicorn", "--factory", "asgi:create_asgi_app"]
+    return uvicorn + ["--host", HOST, "--port", str(port), "--workers", str(workers)]
+
+
+async def open_request(
+    port: int, head: str
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(head.encode("latin-1"))
+    await writer.drain()
+    return reader, writer
+
+
+async def hold_sse(port: int, ready: float, stop: asyncio.Event) -> bool:
+    """Subscribe to the event stream; True if it answered within `ready` seconds."""
+    try:
+        reader, writer = await open_request(
+            port, f"GET /api/projects/{PROJECT}/events HTTP/1.1\r\nHost: x\r\n\r\n"
+        )
+    except OSError:
+        return False
+    try:
+        line = await asyncio.wait_for(reader.readline(), ready)
+        ok = line.startswith(b"HTTP/1.1 200")
+    except (asyncio.TimeoutError, OSError):
+        ok = False
+    await stop.wait()
+    writer.close()
+    return ok
+
+
+async def hold_upload(port: int, stop: asyncio.Event) -> bool:
+    """Trickle a 1 MiB save request one small piece per second until stopped."""
+    body_size = 1024 * 1024
+    try:
+        _, writer = await open_request(
+            port,
+            f"POST /api/projects/{PROJECT}/save HTTP/1.1\r\nHost: x\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {body_size}\r\n\r\n",
+        )
+        while not stop.is_set():
+            writer.write(b" " * 16)
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+async def probe(port: int, timeout: float) -> Optional[float]:
+    """Latency in ms of one GET of the project page, None on timeout/error."""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            open_request(
+                port,
+                f"GET /projects/{PROJECT}/index.html HTTP/1.1\r\n"
+                "Host: x\r\nConnection: close\r\n\r\n",
+            ),
+            timeout,
+        )
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+    except (asyncio.TimeoutError, OSError):
+        return None
+    if not status.startswith(b"HTTP/1.1 200"):
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+async def load(
+    port: int, connections: int, probes: int, timeout: float
+) -> Dict[str, float]:
+    stop = asyncio.Event()
+    n_sse = connections // 2
+    sse = [asyncio.ensure_future(hold_sse(port, timeout, stop)) for _ in range(n_sse)]
+    uploads = [
+        asyncio.ensure_future(hold_upload(port, stop))
+        for _ in range(connections - n_sse)
+    ]
+    # let the long-lived connections take whatever they can
+    await asyncio.sleep(min(timeout, 2.0))
+    latencies = await asyncio.gather(*(probe(port, timeout) for _ in range(probes)))
+    stop.set()
+    sse_ok = await asyncio.gather(*sse)
+    await asyncio.gather(*uploads)
+    served = sorted(x for x in latencies if x is not None)
+    return {
+        "held_connections": connections,
+        "sse_streams_answered": sum(sse_ok),
+        "probes_ok": len(served),
+        "probes_failed": probes - len(served),
+        "probe_p50_ms": statistics.median(served) if served else float("nan"),
+        "probe_p95_ms": served[int(len(served) * 0.95) - 1] if served else float("nan"),
+    }
+
+
+def wait_ready(port: int, proc: subprocess.Popen, deadline: float) -> bool:
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> Optional[Dict[str, float]]:
+    port = free_port()
+    cmd = server_command(mode, port, args.workers)
+    if cmd is None:
+        print(f"[{mode}] skipped: server not installed")
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(Path(tmp))
+        env = dict(os.environ, FLASK_SECRET="bench")
+        proc = subprocess.Popen(
+            cmd, cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not wait_ready(port, proc, time.monotonic() + 30):
+                print(f"[{mode}] server did not start")
+                return None
+            return asyncio.run(load(port, args.connections, args.probes, args.timeout))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        results = run_mode(mode.strip(), args)
+        if results is None:
+            continue
+        print(f"[{mode}] workers={args.workers}")
+        for k, v in results.items():
+            print(f"  {k:30s} {v:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_css_schema.py — CssSchemaIndex lookups vs. scanning the full schema JSON
+"""
+Compare per-keystroke autocompletion cost of the server-side prefix index
+against what the front end used to do: fetch the whole schema and scan it.
+
+Usage:
+    python benchmarks/bench_css_schema.py [--rounds N]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from css_schema import CssSchemaIndex  # noqa: E402
+
+SCHEMA_PATH = ROOT / "static" / "css-schema-full.json"
+
+# keystroke sequences a user might type
+PREFIXES: List[str] = [
+    p[:i]
+    for p in ("background-color", "display", "flex-direction", "grid-template", "trans")
+    for i in range(1, len(p) + 1)
+]
+
+
+def scan_complete(schema: dict, prefix: str, limit: int = 20) -> dict:
+    """Baseline: linear scan over the parsed schema, as the client did."""
+    props = sorted(k for k in schema["properties"] if k.startswith(prefix))[:limit]
+    words = set()
+    for spec in schema["properties"].values():
+        for v in spec.get("values") or []:
+            if str(v).startswith(prefix):
+                words.add(str(v))
+    return {"prefix": prefix, "properties": props, "values": sorted(words)[:limit]}
+
+
+def timeit(fn: Callable[[str], object], rounds: int) -> float:
+    """Return mean microseconds per call over all PREFIXES x rounds."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for p in PREFIXES:
+            fn(p)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(PREFIXES)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    raw = SCHEMA_PATH.read_bytes()
+    schema = json.loads(raw)
+
+    index = CssSchemaIndex(SCHEMA_PATH)
+    index.available()  # build the index outside the timed region
+
+    cold = CssSchemaIndex(SCHEMA_PATH, cache_size=0)
+    cold.available()
+
+    results = {
+        "parse_full_json_us": timeit(lambda p: json.loads(raw), max(1, args.rounds // 20)),
+        "scan_full_json_us": timeit(lambda p: scan_complete(schema, p), args.rounds),
+        "index_uncached_us": timeit(lambda p: cold.complete(p), args.rounds),
+        "index_cached_us": timeit(lambda p: index.complete(p), args.rounds),
+    }
+    sizes = [len(json.dumps(index.complete(p)).encode()) for p in PREFIXES]
+    results["full_schema_bytes"] = len(raw)
+    results["complete_response_bytes_avg"] = sum(sizes) / len(sizes)
+
+    for k, v in results.items():
+        print(f"{k:32s} {v:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
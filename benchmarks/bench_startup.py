@@ -0,0 +1,159 @@
+# bench_startup.py — cold start: import app, create_app() and the first request
+"""
+Start fresh interpreters on a private copy of the app and time, in each,
+`import app`, `create_app()` and the first request, with create_app's own
+phase report. The median of import + create_app is checked against a
+budget: the exit status is 1 when cold start regressed past it.
+
+One more interpreter runs with `-X importtime` to list the modules that
+cost the most to import.
+
+Usage:
+    python benchmarks/bench_startup.py [--rounds N] [--budget-ms MS] [--out FILE]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+PROJECT = "bench"
+
+# run in each child interpreter; prints one JSON line
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app()
+t2 = time.perf_counter()
+status = flask_app.test_client().get("/api/projects").status_code
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "status": status,
+    "report": flask_app.startup_report.to_dict(),
+}))
+"""
+
+
+def make_tree(dest: Path) -> None:
+    """Copy the app into `dest` with one small project."""
+    for path in ROOT.glob("*.py"):
+        shutil.copy2(path, dest / path.name)
+    for name in ("static", "templates"):
+        if (ROOT / name).is_dir():
+            shutil.copytree(ROOT / name, dest / name)
+    project = dest / "projects" / PROJECT
+    project.mkdir(parents=True)
+    (project / "index.html").write_text("<html><body><h1>bench</h1></body></html>")
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ, FLASK_SECRET="bench", PYTHONDONTWRITEBYTECODE="1")
+    # per-process caches: a shared-memory file would outlive the run
+    env["CACHE_URL"] = "local"
+    return env
+
+
+def run_probe(tree: Path) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=tree,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(tree: Path, count: int) -> List[Tuple[str, float]]:
+    """(module, cumulative ms) of the `count` slowest modules app.py imports."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=tree,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: List[Tuple[str, float]] = []
+    for line in out.stderr.splitlines():
+        # "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # indented by nesting depth: keep what `import app` imports directly
+        # (the time of deeper imports is included in theirs)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda m: m[1], reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument(
+        "--budget-ms", type=float, default=600.0, help="median import + create_app"
+    )
+    parser.add_argument("--top", type=int, default=10, help="slowest imports listed")
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        tree = Path(tmp)
+        make_tree(tree)
+        runs = [run_probe(tree) for _ in range(args.rounds)]
+        slowest = top_imports(tree, args.top)
+
+    def median(key: str) -> float:
+        return statistics.median(r[key] for r in runs)
+
+    cold = statistics.median(r["import_ms"] + r["create_app_ms"] for r in runs)
+    phases = {
+        name: statistics.median(r["report"]["phases"].get(name, 0.0) for r in runs)
+        for name in runs[0]["report"]["phases"]
+    }
+    print(f"rounds={args.rounds} (medians)")
+    print(f"  {'import app':30s} {median('import_ms'):10.1f} ms")
+    print(f"  {'create_app()':30s} {median('create_app_ms'):10.1f} ms")
+    for name, ms in phases.items():
+        print(f"    {name:28s} {ms:10.1f} ms")
+    print(f"  {'first request':30s} {median('first_request_ms'):10.1f} ms")
+    print(f"  {'cold start':30s} {cold:10.1f} ms (budget {args.budget_ms:.0f})")
+    print("slowest imports (cumulative):")
+    for name, ms in slowest:
+        print(f"  {name:30s} {ms:10.1f} ms")
+
+    if args.out is not None:
+        result = {
+            "rounds": runs,
+            "cold_start_ms": cold,
+            "budget_ms": args.budget_ms,
+            "phases_ms": phases,
+            "slowest_imports_ms": dict(slowest),
+        }
+        args.out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"results written to {args.out}")
+    if cold > args.budget_ms:
+        print(f"cold start {cold:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
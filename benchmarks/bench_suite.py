@@ -0,0 +1,422 @@
+# bench_suite.py — HTTP and filesystem hot paths on a synthetic corpus, vs. a baseline
+"""
+Build a synthetic corpus (projects x files, assets of a given size) in a
+private copy of the app, drive the hot endpoints in-process (Flask test
+client) and through a local gunicorn, and report throughput and p50/p99
+latency per scenario:
+
+    list_projects   GET  /api/projects
+    serve_html      GET  /projects/<p>/index.html
+    serve_asset     GET  /projects/<p>/images/<asset>
+    save            POST /api/projects/<p>/save
+    save_css        POST /api/projects/<p>/save_css
+    upload          POST /api/projects/<p>/upload
+    tags            GET  /api/tags_attributes
+
+Results are written as JSON (--out). If a baseline exists (--baseline,
+written with --save-baseline) every scenario is compared against it and
+the script exits with status 1 when throughput or p50 got worse than
+--threshold percent, or p99 worse than --p99-threshold percent.
+
+Usage:
+    python benchmarks/bench_suite.py [--projects N] [--files N] [--asset-kb N]
+        [--requests N] [--drivers inprocess,gunicorn] [--save-baseline]
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench_asgi import HOST, free_port, wait_ready
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SCENARIOS = (
+    "list_projects",
+    "serve_html",
+    "serve_asset",
+    "save",
+    "save_css",
+    "upload",
+    "tags",
+)
+BOUNDARY = "benchsuiteboundary"
+
+# (method, path, body, headers)
+Request = Tuple[str, str, bytes, Dict[str, str]]
+
+
+# -----------------------------------------------------------------------------
+# Corpus
+# -----------------------------------------------------------------------------
+def build_corpus(dest: Path, args: argparse.Namespace) -> List[str]:
+    """Copy the app into `dest` and create the synthetic projects (names returned)."""
+    for path in ROOT.glob("*.py"):
+        shutil.copy2(path, dest / path.name)
+    for name in ("static", "templates"):
+        if (ROOT / name).is_dir():
+            shutil.copytree(ROOT / name, dest / name)
+    rng = random.Random(args.seed)
+    names = []
+    for p in range(args.projects):
+        name = f"bench{p:04d}"
+        root = dest / "projects" / name
+        (root / "images").mkdir(parents=True)
+        (root / "index.html").write_text(page(rng, p), encoding="utf-8")
+        (root / "style.css").write_text(stylesheet(rng), encoding="utf-8")
+        for f in range(args.files):
+            (root / "images" / f"asset{f:03d}.png").write_bytes(
+                rng.randbytes(args.asset_kb * 1024)
+            )
+        names.append(name)
+    return names
+
+
+def page(rng: random.Random, n: int, paragraphs: int = 40) -> str:
+    words = ["alpha", "beta", "gamma", "delta", "hero", "card", "grid", "lorem"]
+    body = "\n".join(
+        f'<p class="{rng.choice(words)}">{" ".join(rng.choices(words, k=30))}</p>'
+        for _ in range(paragraphs)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>bench {n}</title>'
+        f'<link rel="stylesheet" href="style.css"></head><body>{body}</body></html>'
+    )
+
+
+def stylesheet(rng: random.Random, rules: int = 60) -> str:
+    return "\n".join(
+        f".c{i} {{ color: #{rng.randrange(0x1000000):06x}; margin: {i % 16}px; }}"
+        for i in range(rules)
+    )
+
+
+def multipart(filename: str, data: bytes, target: str = "images") -> Tuple[bytes, str]:
+    """Encode an upload form; returns (body, content type)."""
+    head = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    tail = (
+        f"\r\n--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="target"\r\n\r\n'
+        f"{target}\r\n--{BOUNDARY}--\r\n"
+    ).encode()
+    return head + data + tail, f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def scenario_requests(
+    name: str, projects: List[str], args: argparse.Namespace
+) -> Callable[[int], Request]:
+    """Return i -> request for the i-th call of a scenario (rotating over projects)."""
+    rng = random.Random(f"{args.seed}-{name}")
+    json_headers = {"Content-Type": "application/json"}
+    if name == "list_projects":
+        return lambda i: ("GET", "/api/projects", b"", {})
+    if name == "serve_html":
+        return lambda i: (
+            "GET", f"/projects/{projects[i % len(projects)]}/index.html", b"", {}
+        )
+    if name == "serve_asset":
+        files = max(1, args.files)
+
+        def serve_asset(i: int) -> Request:
+            project = projects[i % len(projects)]
+            path = f"/projects/{project}/images/asset{i % files:03d}.png"
+            return ("GET", path, b"", {})
+
+        return serve_asset
+    if name == "save":
+        html = page(rng, 0)
+
+        def save(i: int) -> Request:
+            body = json.dumps({"html": html.replace("bench 0", f"bench {i}")}).encode()
+            project = projects[i % len(projects)]
+            return ("POST", f"/api/projects/{project}/save", body, json_headers)
+
+        return save
+    if name == "save_css":
+        css = stylesheet(rng)
+
+        def save_css(i: int) -> Request:
+            body = json.dumps({"css": f"/* {i} */\n{css}"}).encode()
+            project = projects[i % len(projects)]
+            return ("POST", f"/api/projects/{project}/save_css", body, json_headers)
+
+        return save_css
+    if name == "upload":
+        data = rng.randbytes(args.asset_kb * 1024)
+
+        def upload(i: int) -> Request:
+            body, ctype = multipart(f"upload{i:05d}.png", data)
+            project = projects[i % len(projects)]
+            path = f"/api/projects/{project}/upload"
+            return ("POST", path, body, {"Content-Type": ctype})
+
+        return upload
+    if name == "tags":
+        gzip = {"Accept-Encoding": "gzip"}
+        return lambda i: ("GET", "/api/tags_attributes", b"", gzip)
+    raise ValueError(f"unknown scenario: {name}")
+
+
+# -----------------------------------------------------------------------------
+# Drivers
+# -----------------------------------------------------------------------------
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(q: float) -> float:
+        if not ordered:
+            return float("nan")
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": len(ordered) / wall if wall > 0 else 0.0,
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else float("nan"),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+
+
+def run_inprocess(tree: Path, projects: List[str], args: argparse.Namespace) -> dict:
+    """Drive the app through Flask's test client in this process (no network)."""
+    sys.path.insert(0, str(tree))
+    os.environ.setdefault("FLASK_SECRET", "bench")
+    import app as app_module
+
+    client = app_module.create_app().test_client()
+    results = {}
+    for name in args.scenarios:
+        make = scenario_requests(name, projects, args)
+        for i in range(args.warmup):
+            method, path, body, headers = make(i)
+            client.open(path, method=method, data=body, headers=headers)
+        latencies: List[float] = []
+        errors = 0
+        started = time.perf_counter()
+        for i in range(args.warmup, args.warmup + args.requests):
+            method, path, body, headers = make(i)
+            t0 = time.perf_counter()
+            resp = client.open(path, method=method, data=body, headers=headers)
+            resp.get_data()
+            elapsed = time.perf_counter() - t0
+            if resp.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+
+def run_gunicorn(
+    tree: Path, projects: List[str], args: argparse.Namespace
+) -> Optional[dict]:
+    """Drive a local gunicorn (sync workers) with `--concurrency` client threads."""
+    if importlib.util.find_spec("gunicorn") is None:
+        print("[gunicorn] skipped: gunicorn not installed")
+        return None
+    port = free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(args.workers)]
+    cmd += ["-b", f"{HOST}:{port}", "app:create_app()"]
+    env = dict(os.environ, FLASK_SECRET="bench")
+    proc = subprocess.Popen(
+        cmd, cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_ready(port, proc, time.monotonic() + 30):
+            print("[gunicorn] server did not start")
+            return None
+        return {
+            name: _http_scenario(port, name, projects, args) for name in args.scenarios
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _http_scenario(
+    port: int, name: str, projects: List[str], args: argparse.Namespace
+) -> dict:
+    make = scenario_requests(name, projects, args)
+    local = threading.local()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = [0]
+
+    def call(i: int, record: bool) -> None:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        method, path, body, headers = make(i)
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body or None, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            ok = False
+        elapsed = time.perf_counter() - t0
+        if record:
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda i: call(i, False), range(args.warmup)))
+        started = time.perf_counter()
+        timed = range(args.warmup, args.warmup + args.requests)
+        list(pool.map(lambda i: call(i, True), timed))
+        wall = time.perf_counter() - started
+    return summarize(latencies, errors[0], wall)
+
+
+# -----------------------------------------------------------------------------
+# Baseline comparison
+# -----------------------------------------------------------------------------
+def compare(current: dict, baseline: dict, args: argparse.Namespace) -> List[str]:
+    """Print a comparison table; return the regressions found."""
+    regressions = []
+    for driver, scenarios in current["results"].items():
+        base_driver = baseline.get("results", {}).get(driver)
+        if not base_driver:
+            continue
+        for name, now in scenarios.items():
+            then = base_driver.get(name)
+            if not then:
+                continue
+            checks = (
+                ("throughput_rps", -1, args.threshold),
+                ("p50_ms", 1, args.threshold),
+                ("p99_ms", 1, args.p99_threshold),
+            )
+            for key, direction, limit in checks:
+                if not then.get(key) or now.get(key) is None:
+                    continue
+                change = (now[key] - then[key]) / then[key] * 100
+                worse = change * direction > limit
+                flag = "REGRESSION" if worse else ""
+                print(
+                    f"  {driver:10s} {name:14s} {key:15s} "
+                    f"{then[key]:10.2f} -> {now[key]:10.2f} ({change:+6.1f}%) {flag}"
+                )
+                if worse:
+                    regressions.append(f"{driver}/{name}/{key} {change:+.1f}%")
+    return regressions
+
+
+def corpus_meta(args: argparse.Namespace) -> dict:
+    return {
+        "projects": args.projects,
+        "files": args.files,
+        "asset_kb": args.asset_kb,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "seed": args.seed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--files", type=int, default=10, help="assets per project")
+    parser.add_argument("--asset-kb", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="gunicorn clients")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--drivers", default="inprocess,gunicorn")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=15.0, help="percent")
+    parser.add_argument("--p99-threshold", type=float, default=30.0, help="percent")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "corpus": corpus_meta(args),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": {},
+    }
+    for driver in (d.strip() for d in args.drivers.split(",") if d.strip()):
+        if driver not in ("inprocess", "gunicorn"):
+            parser.error(f"unknown driver: {driver}")
+        # a fresh corpus per driver: saves and uploads of one must not skew the
+        # other. Removed at exit, after the in-process app has flushed its state.
+        tree = Path(tempfile.mkdtemp(prefix="bench-"))
+        atexit.register(shutil.rmtree, tree, True)
+        projects = build_corpus(tree, args)
+        if driver == "inprocess":
+            results = run_inprocess(tree, projects, args)
+        else:
+            results = run_gunicorn(tree, projects, args)
+        if results is None:
+            continue
+        report["results"][driver] = results
+        print(f"[{driver}]")
+        for name, r in results.items():
+            print(
+                f"  {name:14s} {r['throughput_rps']:10.1f} req/s  "
+                f"p50 {r['p50_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  "
+                f"errors {r['errors']}"
+            )
+
+    args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"results written to {args.out}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.is_file():
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("meta", {}).get("corpus") != report["meta"]["corpus"]:
+        print("warning: baseline was recorded with a different corpus/load")
+    print(f"compared with {args.baseline}:")
+    regressions = compare(report, baseline, args)
+    if regressions:
+        print("regressions: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
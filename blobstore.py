@@ -0,0 +1,210 @@
+# blobstore.py — content-addressed asset store shared across projects
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from fsutil import atomic_write
+
+LOG = logging.getLogger(__name__)
+
+BLOBS_DIR_NAME = ".blobs"
+# Bytes read per iteration while hashing a stream
+BLOB_STREAM_BUFFER = 64 * 1024
+# Temp files and unlinked blobs older than this are considered abandoned by gc
+BLOB_TMP_TTL = 3600
+
+
+@dataclass
+class BlobStore:
+    """
+    Store uploaded assets once, by SHA-256, and hardlink them into projects.
+
+    Layout under `root`:
+      objects/ab/cdef...   one file per distinct content
+      refs/<project>.json  project-relative path -> hash, for that project
+      tmp/                 in-flight ingests
+
+    The reference count of a blob is its hardlink count minus the store's
+    own link, so it stays correct however a project file disappears. When
+    hardlinks are unavailable (e.g. another filesystem) files are copied,
+    which still works but does not deduplicate.
+    """
+
+    root: Path
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        for sub in ("objects", "refs", "tmp"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest[2:]
+
+    def ingest_stream(self, stream: BinaryIO) -> str:
+        """Copy `stream` into the store while hashing it. Returns the hash."""
+        tmp = self._tmp_path()
+        digest = hashlib.sha256()
+        try:
+            with tmp.open("wb") as fh:
+                for block in iter(lambda: stream.read(BLOB_STREAM_BUFFER), b""):
+                    digest.update(block)
+                    fh.write(block)
+            return self._commit(tmp, digest.hexdigest())
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def ingest_file(self, src: Path) -> str:
+        """Move an existing file into the store (hashing it once). Returns the hash."""
+        digest = hashlib.sha256()
+        with src.open("rb") as fh:
+            for block in iter(lambda: fh.read(BLOB_STREAM_BUFFER), b""):
+                digest.update(block)
+        tmp = self._tmp_path()
+        os.replace(src, tmp)
+        return self._commit(tmp, digest.hexdigest())
+
+    def link(self, digest: str, dest: Path) -> None:
+        """Atomically make `dest` a reference to blob `digest`."""
+        blob = self.blob_path(digest)
+        tmp = dest.with_name(f".{dest.name}.{secrets.token_hex(4)}.tmp")
+        # under the lock so a concurrent `release` cannot drop the blob mid-link
+        with self._lock:
+            try:
+                os.link(blob, tmp)
+            except OSError:
+                shutil.copyfile(blob, tmp)
+        try:
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def refcount(self, digest: str) -> int:
+        """Number of project files referencing `digest`."""
+        try:
+            return self.blob_path(digest).stat().st_nlink - 1
+        except OSError:
+            return 0
+
+    def release(self, digests: Iterable[str]) -> int:
+        """Delete the given blobs if nothing references them anymore. Returns bytes freed."""
+        freed = 0
+        with self._lock:
+            for digest in set(digests):
+                blob = self.blob_path(digest)
+                try:
+                    st = blob.stat()
+                    if st.st_nlink <= 1:
+                        blob.unlink()
+                        freed += st.st_size
+                except OSError:
+                    continue
+        return freed
+
+    def record(self, project: str, rel: str, digest: str) -> Optional[str]:
+        """Remember that `project/rel` references `digest`. Returns the previous hash."""
+        with self._lock:
+            refs = self._read_refs(project)
+            previous = refs.get(rel)
+            refs[rel] = digest
+            self._write_refs(project, refs)
+        return previous
+
+    def forget(self, project: str, rel: str) -> Optional[str]:
+        """Drop one reference of a project and return its hash (call `release` after)."""
+        with self._lock:
+            refs = self._read_refs(project)
+            digest = refs.pop(rel, None)
+            if digest is not None:
+                self._write_refs(project, refs)
+        return digest
+
+    def refs(self, project: str) -> Dict[str, str]:
+        """Return project-relative path -> hash for a project."""
+        with self._lock:
+            return self._read_refs(project)
+
+    def set_refs(self, project: str, refs: Dict[str, str]) -> None:
+        """Replace a project's reference list (e.g. with a saved `refs` result)."""
+        with self._lock:
+            self._write_refs(project, refs)
+
+    def copy_refs(self, source: str, dest: str) -> None:
+        """Give `dest` the same reference list as `source` (after a duplicate)."""
+        with self._lock:
+            refs = self._read_refs(source)
+            if refs:
+                self._write_refs(dest, refs)
+
+    def forget_project(self, project: str) -> Dict[str, str]:
+        """Drop a project's reference list and return it (call `release` after deleting files)."""
+        with self._lock:
+            refs = self._read_refs(project)
+            self._refs_path(project).unlink(missing_ok=True)
+        return refs
+
+    def gc(self) -> int:
+        """Remove every unreferenced blob and stale temp file. Returns bytes freed."""
+        freed = 0
+        cutoff = time.time() - BLOB_TMP_TTL
+        with self._lock:
+            for tmp in (self.root / "tmp").iterdir():
+                try:
+                    # in-flight ingests write outside the lock; leave recent ones alone
+                    if tmp.stat().st_mtime < cutoff:
+                        tmp.unlink()
+                except OSError:
+                    continue
+            for bucket in (self.root / "objects").iterdir():
+                for blob in bucket.iterdir():
+                    try:
+                        st = blob.stat()
+                        # another process may have just committed it and
+                        # not linked it yet (the lock is per process)
+                        if st.st_nlink <= 1 and st.st_ctime < cutoff:
+                            blob.unlink()
+                            freed += st.st_size
+                    except OSError:
+                        continue
+        if freed:
+            LOG.info("Blob store gc freed %d bytes", freed)
+        return freed
+
+    def _commit(self, tmp: Path, digest: str) -> str:
+        blob = self.blob_path(digest)
+        with self._lock:
+            if blob.exists():
+                tmp.unlink(missing_ok=True)
+            else:
+                blob.parent.mkdir(exist_ok=True)
+                os.replace(tmp, blob)
+                # blobs are shared: keep them read-only
+                os.chmod(blob, 0o444)
+        return digest
+
+    def _tmp_path(self) -> Path:
+        return self.root / "tmp" / secrets.token_hex(16)
+
+    def _refs_path(self, project: str) -> Path:
+        return self.root / "refs" / f"{project}.json"
+
+    def _read_refs(self, project: str) -> Dict[str, str]:
+        try:
+            return json.loads(self._refs_path(project).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_refs(self, project: str, refs: Dict[str, str]) -> None:
+        data = json.dumps(refs, separators=(",", ":")).encode("utf-8")
+        atomic_write(self._refs_path(project), data, fsync=False)
@@ -0,0 +1,657 @@
+# build.py — publish pipeline: minify, inline, fingerprint and precompress projects
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+from compression import ENCODINGS, available_encodings, encode
+from fsutil import atomic_write
+
+LOG = logging.getLogger(__name__)
+
+BUILDS_DIR_NAME = ".builds"
+BUILD_MANIFEST_NAME = ".manifest.json"
+# Bump to invalidate every manifest when the build rules change
+BUILD_MANIFEST_VERSION = 1
+BUILD_WORKERS = 4
+# CSS/JS at most this large is inlined into the referencing HTML page
+BUILD_INLINE_MAX_BYTES = 4 * 1024
+# Images at most this large become data: URIs
+BUILD_INLINE_IMAGE_MAX_BYTES = 2 * 1024
+# Outputs smaller than this are not precompressed
+BUILD_COMPRESS_MIN_BYTES = 1024
+BUILD_COMPRESS_EXT = {
+    "html", "htm", "css", "js", "mjs", "json", "svg", "txt", "xml", "map",
+}
+# Hex digits of the content hash put into fingerprinted names
+FINGERPRINT_LENGTH = 10
+
+_INLINE_IMAGE_EXT = {"png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"}
+_JS_TYPES = {"text/javascript", "application/javascript"}
+_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+_CSS_SPLIT = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/)""", re.S)
+_CSS_URL = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)\s"']*))\s*\)""", re.I)
+
+_HTML_TOKEN = re.compile(
+    r"<!--.*?-->"
+    r"|<(script|style|pre|textarea)\b([^>]*)>(.*?)</\1\s*>"
+    r"|<[a-zA-Z/!][^>]*>",
+    re.S | re.I,
+)
+_HTML_URL_ATTR = re.compile(
+    r"""(\s)(src|href|poster|srcset)(\s*=\s*)(?:"([^"]*)"|'([^']*)'|([^\s>"']+))""",
+    re.I,
+)
+
+
+def _attr(attrs: str, name: str) -> Optional[str]:
+    """Value of attribute `name` in a tag's attribute text, or None."""
+    m = re.search(
+        r"""\s%s\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+))""" % re.escape(name),
+        attrs,
+        re.I,
+    )
+    if m is None:
+        return "" if re.search(r"\s%s\b" % re.escape(name), attrs, re.I) else None
+    return next(g for g in m.groups() if g is not None)
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from CSS, leaving strings intact."""
+    out: List[str] = []
+    for i, part in enumerate(_CSS_SPLIT.split(css)):
+        if i % 2:
+            if not part.startswith("/*"):
+                out.append(part)
+            continue
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r"\s*([{};,])\s*", r"\1", part)
+        part = re.sub(r":\s+", ":", part)
+        out.append(part.replace(";}", "}"))
+    return "".join(out).strip()
+
+
+def minify_html(html: str, rewrite_tag: Callable[[str], str] = lambda t: t) -> str:
+    """
+    Collapse whitespace and drop comments outside raw-text elements.
+
+    `<pre>`, `<textarea>` and `<script>` bodies are kept verbatim and
+    `<style>` bodies are CSS-minified. Every other tag (and each raw-text
+    element as a whole) is passed through `rewrite_tag`, so callers can
+    rewrite URLs or inline resources in the same pass.
+    """
+    out: List[str] = []
+
+    def text(chunk: str) -> None:
+        chunk = re.sub(r"\s+", " ", chunk)
+        # runs of whitespace separated only by a dropped comment collapse too
+        if chunk.startswith(" ") and out and out[-1].endswith(" "):
+            chunk = chunk[1:]
+        out.append(chunk)
+
+    pos = 0
+    for m in _HTML_TOKEN.finditer(html):
+        text(html[pos:m.start()])
+        pos = m.end()
+        token = m.group(0)
+        if token.startswith("<!--"):
+            # conditional comments are markup, not comments
+            if token.startswith("<!--[if"):
+                out.append(token)
+            continue
+        if m.group(1) and m.group(1).lower() == "style":
+            token = f"<{m.group(1)}{m.group(2)}>{minify_css(m.group(3))}</{m.group(1)}>"
+        out.append(rewrite_tag(token))
+    text(html[pos:])
+    return "".join(out).strip()
+
+
+def fingerprint_name(rel: str, digest: str) -> str:
+    """`css/site.css` + digest -> `css/site.<hash>.css`."""
+    head, ext = posixpath.splitext(rel)
+    return f"{head}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def _ext(rel: str) -> str:
+    return rel.rsplit(".", 1)[-1].lower() if "." in posixpath.basename(rel) else ""
+
+
+def _sha1_file(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class BuiltFile:
+    """One file of the build output, as seen by files that reference it."""
+
+    rel: str  # source path (also the unfingerprinted output name)
+    name: str  # fingerprinted output name ("" for HTML pages)
+    size: int
+    inline: Optional[str] = None  # text (CSS/JS) or data: URI, when small enough
+
+
+@dataclass
+class BuildReport:
+    """What a build did: per-step timings and files built, reused and removed."""
+
+    steps: Dict[str, float] = field(default_factory=dict)
+    built: int = 0
+    reused: int = 0
+    removed: int = 0
+    compressed: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "steps_ms": {k: round(v, 3) for k, v in self.steps.items()},
+            "built": self.built,
+            "reused": self.reused,
+            "removed": self.removed,
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+        }
+
+
+class _Step:
+    """Context manager recording one step's wall time into a BuildReport."""
+
+    def __init__(self, report: BuildReport, name: str):
+        self.report, self.name = report, name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.report.steps[self.name] = (time.perf_counter() - self.started) * 1000
+
+
+@dataclass
+class _Job:
+    """Build state of one source file for the current run."""
+
+    rel: str
+    path: Path
+    size: int
+    mtime_ns: int
+    digest: str
+    previous: Optional[dict]  # manifest entry from the last build
+    deps: Dict[str, str] = field(default_factory=dict)
+    built: Optional[BuiltFile] = None
+    rebuilt: bool = False
+
+    def entry(self) -> dict:
+        assert self.built is not None
+        return {
+            "stat": [self.size, self.mtime_ns],
+            "hash": self.digest,
+            "name": self.built.name,
+            "size": self.built.size,
+            "deps": self.deps,
+        }
+
+
+@dataclass
+class ProjectBuilder:
+    """
+    Turn a project into an optimized, publishable directory.
+
+    Output goes to `builds_dir/<project>/`:
+      - HTML is minified; small CSS/JS is inlined, small images become
+        data: URIs and every other local reference points at a
+        fingerprinted name (`style.<hash>.css`) that can be cached forever;
+      - CSS is minified and its url() references fingerprinted too;
+      - other files are copied under their fingerprinted name;
+      - every file also exists under its original name (a hardlink), so
+        references the build cannot see (scripts, external links) work;
+      - text outputs are precompressed to .gz (and .br with brotli) at
+        the highest levels, see compression.encode.
+
+    Builds are incremental: a manifest records, per source file, its stat
+    signature, content hash, output name and the output names of what it
+    referenced. Files whose source and dependencies are unchanged are
+    reused. Work within a step runs on a thread pool.
+    """
+
+    builds_dir: Path
+    max_workers: int = BUILD_WORKERS
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False)
+    _locks: Dict[str, threading.Lock] = field(default_factory=dict, init=False, repr=False)
+    # project -> (manifest mtime_ns, fingerprinted output names)
+    _fingerprinted: Dict[str, Tuple[int, Set[str]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def output_dir(self, project: str) -> Path:
+        return self.builds_dir / project
+
+    def is_fingerprinted(self, project: str, filename: str) -> bool:
+        """
+        True if the last build wrote `filename` under a content-hashed name
+        (safe to cache forever). Decided from the build manifest: a source
+        file merely named like one is not.
+        """
+        manifest_path = self.output_dir(project) / BUILD_MANIFEST_NAME
+        try:
+            mtime_ns = manifest_path.stat().st_mtime_ns
+        except OSError:
+            return False
+        with self._lock:
+            cached = self._fingerprinted.get(project)
+        if cached is None or cached[0] != mtime_ns:
+            files = self._load_manifest(manifest_path.parent).get("files", {})
+            names = {e["name"] for e in files.values() if e.get("name")}
+            # an output name that is also a source name is not content-hashed
+            cached = (mtime_ns, names.difference(files))
+            with self._lock:
+                self._fingerprinted[project] = cached
+        return filename in cached[1]
+
+    def resolve(self, project: str, filename: str) -> Optional[Path]:
+        """Path of a published file, or None if missing, internal or outside."""
+        root = self.output_dir(project).resolve()
+        candidate = (root / filename).resolve()
+        rel = os.path.relpath(candidate, root)
+        if rel.startswith("..") or any(p.startswith(".") for p in Path(rel).parts):
+            return None
+        return candidate if candidate.is_file() else None
+
+    def build(self, project: str, src: Path) -> BuildReport:
+        """Build `src` into `output_dir(project)`; builds of one project queue up."""
+        with self._lock:
+            lock = self._locks.setdefault(project, threading.Lock())
+        with lock:
+            return self._build(src, self.output_dir(project))
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="build"
+                )
+            return self._executor
+
+    def _map(self, fn: Callable[[_Job], None], jobs: Iterable[_Job]) -> None:
+        for f in [self._pool().submit(fn, job) for job in jobs]:
+            f.result()
+
+    # ---- pipeline ----
+    def _build(self, src: Path, out: Path) -> BuildReport:
+        started = time.perf_counter()
+        report = BuildReport()
+        out.mkdir(parents=True, exist_ok=True)
+        manifest = self._load_manifest(out)
+
+        with _Step(report, "scan"):
+            jobs = self._scan(src, manifest.get("files", {}))
+        by_rel = {job.rel: job for job in jobs}
+        html = [j for j in jobs if _ext(j.rel) in ("html", "htm")]
+        css = [j for j in jobs if _ext(j.rel) == "css"]
+        assets = [j for j in jobs if _ext(j.rel) not in ("html", "htm", "css")]
+
+        with _Step(report, "assets"):
+            self._map(lambda j: self._build_asset(j, out), assets)
+        with _Step(report, "css"):
+            self._map(lambda j: self._build_css(j, out, by_rel), css)
+        with _Step(report, "html"):
+            self._map(lambda j: self._build_html(j, out, by_rel), html)
+        with _Step(report, "compress"):
+            results: List[int] = []
+            self._map(lambda j: results.append(self._compress(j, out)), jobs)
+            report.compressed = sum(results)
+        with _Step(report, "prune"):
+            report.removed = self._prune(out, jobs)
+            atomic_write(
+                out / BUILD_MANIFEST_NAME,
+                json.dumps(
+                    {
+                        "version": BUILD_MANIFEST_VERSION,
+                        "files": {j.rel: j.entry() for j in jobs},
+                    },
+                    separators=(",", ":"),
+                ).encode("utf-8"),
+            )
+
+        for job in jobs:
+            report.bytes_in += job.size
+            report.bytes_out += job.built.size if job.built else 0
+            if job.rebuilt:
+                report.built += 1
+            else:
+                report.reused += 1
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        return report
+
+    def _load_manifest(self, out: Path) -> dict:
+        try:
+            manifest = json.loads((out / BUILD_MANIFEST_NAME).read_text("utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != BUILD_MANIFEST_VERSION:
+            return {}
+        return manifest
+
+    def _scan(self, src: Path, previous: Dict[str, dict]) -> List[_Job]:
+        """Stat every source file; hash only those whose stat signature changed."""
+        stats: List[Tuple[str, Path, os.stat_result]] = []
+        for root, dirs, files in os.walk(src):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for fname in sorted(files):
+                if fname.startswith("."):
+                    continue
+                full = Path(root) / fname
+                try:
+                    st = full.stat()
+                except OSError:
+                    continue
+                stats.append((full.relative_to(src).as_posix(), full, st))
+
+        def make(item: Tuple[str, Path, os.stat_result]) -> _Job:
+            rel, full, st = item
+            prev = previous.get(rel)
+            if prev is not None and prev.get("stat") == [st.st_size, st.st_mtime_ns]:
+                digest = prev["hash"]
+            else:
+                digest = _sha1_file(full)
+            return _Job(rel, full, st.st_size, st.st_mtime_ns, digest, prev)
+
+        return list(self._pool().map(make, stats))
+
+    def _reusable(self, job: _Job, out: Path, by_rel: Dict[str, _Job]) -> bool:
+        """True if the last build of `job` is still valid and still on disk."""
+        prev = job.previous
+        if prev is None or prev.get("hash") != job.digest:
+            return False
+        for dep, name in prev.get("deps", {}).items():
+            current = by_rel.get(dep)
+            # "" records a reference that did not resolve to a source file
+            current_name = current.built.name if current and current.built else ""
+            if current_name != name:
+                return False
+        return (out / job.rel).is_file() and (
+            not prev.get("name") or (out / prev["name"]).is_file()
+        )
+
+    def _build_asset(self, job: _Job, out: Path) -> None:
+        name = fingerprint_name(job.rel, job.digest)
+        if not self._reusable(job, out, {}):
+            (out / job.rel).parent.mkdir(parents=True, exist_ok=True)
+            tmp = out / posixpath.dirname(name) / f".{posixpath.basename(name)}.tmp"
+            shutil.copyfile(job.path, tmp)
+            os.replace(tmp, out / name)
+            _link_alias(out / name, out / job.rel)
+            job.rebuilt = True
+        inline = None
+        ext = _ext(job.rel)
+        if ext in _INLINE_IMAGE_EXT and job.size <= BUILD_INLINE_IMAGE_MAX_BYTES:
+            mime = mimetypes.guess_type(job.rel)[0] or "application/octet-stream"
+            data = base64.b64encode((out / name).read_bytes()).decode("ascii")
+            inline = f"data:{mime};base64,{data}"
+        elif ext in ("js", "mjs") and job.size <= BUILD_INLINE_MAX_BYTES:
+            inline = (out / name).read_text("utf-8", errors="replace")
+        job.built = BuiltFile(job.rel, name, job.size, inline)
+
+    def _build_css(self, job: _Job, out: Path, by_rel: Dict[str, _Job]) -> None:
+        if self._reusable(job, out, by_rel):
+            name = job.previous["name"]  # type: ignore[index]
+            size = job.previous["size"]  # type: ignore[index]
+            job.deps = dict(job.previous.get("deps", {}))  # type: ignore[union-attr]
+            inline = None
+            if size <= BUILD_INLINE_MAX_BYTES:
+                inline = (out / name).read_text("utf-8")
+            job.built = BuiltFile(job.rel, name, size, inline)
+            return
+        text = job.path.read_text("utf-8", errors="replace")
+        base = posixpath.dirname(job.rel)
+
+        def sub(m: re.Match) -> str:
+            url = next(g for g in m.groups() if g is not None)
+            new = _rewrite_ref(url, base, by_rel, job.deps, inline_images=True)
+            return f'url("{new}")'
+
+        data = minify_css(_CSS_URL.sub(sub, text)).encode("utf-8")
+        name = fingerprint_name(job.rel, hashlib.sha1(data).hexdigest())
+        _write_output(out, name, data, alias=job.rel)
+        inline = data.decode("utf-8") if len(data) <= BUILD_INLINE_MAX_BYTES else None
+        job.built = BuiltFile(job.rel, name, len(data), inline)
+        job.rebuilt = True
+
+    def _build_html(self, job: _Job, out: Path, by_rel: Dict[str, _Job]) -> None:
+        if self._reusable(job, out, by_rel):
+            job.deps = dict(job.previous.get("deps", {}))  # type: ignore[union-attr]
+            size = job.previous["size"]  # type: ignore[index]
+            job.built = BuiltFile(job.rel, "", size)
+            return
+        text = job.path.read_text("utf-8", errors="replace")
+        base = posixpath.dirname(job.rel)
+
+        def rewrite_tag(tag: str) -> str:
+            return _rewrite_html_tag(tag, base, by_rel, job.deps)
+
+        data = minify_html(text, rewrite_tag).encode("utf-8")
+        _write_output(out, job.rel, data)
+        job.built = BuiltFile(job.rel, "", len(data))
+        job.rebuilt = True
+
+    def _compress(self, job: _Job, out: Path) -> int:
+        """Write .gz/.br next to a rebuilt text output. Returns files written."""
+        built = job.built
+        if built is None or _ext(job.rel) not in BUILD_COMPRESS_EXT:
+            return 0
+        if built.size < BUILD_COMPRESS_MIN_BYTES:
+            return 0
+        target = out / (built.name or built.rel)
+        written = 0
+        data: Optional[bytes] = None
+        suffixes = dict(ENCODINGS)
+        for encoding in available_encodings():
+            suffix = suffixes[encoding]
+            sidecar = target.with_name(target.name + suffix)
+            if not job.rebuilt and sidecar.exists():
+                continue
+            if data is None:
+                data = target.read_bytes()
+            packed = encode(data, encoding, best=True)
+            if len(packed) >= len(data):
+                continue
+            atomic_write(sidecar, packed, fsync=False)
+            if built.name:
+                _link_alias(sidecar, out / (built.rel + suffix))
+            written += 1
+        return written
+
+    def _prune(self, out: Path, jobs: List[_Job]) -> int:
+        """Remove outputs (and their sidecars) that no source produces anymore."""
+        keep = {BUILD_MANIFEST_NAME}
+        for job in jobs:
+            names = [job.rel]
+            if job.built and job.built.name:
+                names.append(job.built.name)
+            for name in names:
+                keep.update((name, f"{name}.gz", f"{name}.br"))
+        removed = 0
+        for root, dirs, files in os.walk(out, topdown=False):
+            for fname in files:
+                full = Path(root) / fname
+                if full.relative_to(out).as_posix() not in keep:
+                    full.unlink(missing_ok=True)
+                    removed += 1
+            for d in dirs:
+                try:
+                    (Path(root) / d).rmdir()
+                except OSError:
+                    pass
+        return removed
+
+
+def _write_output(
+    out: Path, name: str, data: bytes, alias: Optional[str] = None
+) -> None:
+    target = out / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(target, data, fsync=False)
+    if alias is not None:
+        _link_alias(target, out / alias)
+
+
+def _link_alias(target: Path, alias: Path) -> None:
+    """Make `alias` another name for `target` (hardlink, copy as fallback)."""
+    if alias == target:
+        return
+    tmp = alias.with_name(f".{alias.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(target, tmp)
+    except OSError:
+        shutil.copyfile(target, tmp)
+    os.replace(tmp, alias)
+
+
+def _rewrite_ref(
+    url: str,
+    base: str,
+    by_rel: Dict[str, _Job],
+    deps: Dict[str, str],
+    *,
+    inline_images: bool = False,
+) -> str:
+    """
+    Point a local URL at its fingerprinted output (or a data: URI) and record
+    the dependency. External, absolute and unknown URLs are returned as is.
+    """
+    if not url or url.startswith(("#", "/")) or _SCHEME_RE.match(url):
+        return url
+    m = re.match(r"([^?#]*)(.*)", url, re.S)
+    path, suffix = m.group(1), m.group(2)  # type: ignore[union-attr]
+    rel = posixpath.normpath(posixpath.join(base, unquote(path)))
+    job = by_rel.get(rel)
+    if job is None:
+        # rebuild the referrer if the file shows up later
+        deps[rel] = ""
+        return url
+    built = job.built
+    if built is None or not built.name:
+        # HTML pages keep their names
+        return url
+    deps[rel] = built.name
+    inline = built.inline
+    if inline_images and not suffix and inline and inline.startswith("data:"):
+        return inline
+    return quote(posixpath.relpath(built.name, base or "."), safe="/") + suffix
+
+
+def _rewrite_html_tag(
+    tag: str, base: str, by_rel: Dict[str, _Job], deps: Dict[str, str]
+) -> str:
+    """Inline small stylesheets/scripts and fingerprint URLs in one HTML tag."""
+    lower = tag[:8].lower()
+    if lower.startswith("<link") and (_attr(tag, "rel") or "").lower() == "stylesheet":
+        inlined = _inline_css(tag, base, by_rel, deps)
+        if inlined is not None:
+            return inlined
+    if lower.startswith("<script"):
+        inlined = _inline_js(tag, base, by_rel, deps)
+        if inlined is not None:
+            return inlined
+        open_end = tag.index(">") + 1
+        return _rewrite_attrs(tag[:open_end], base, by_rel, deps) + tag[open_end:]
+    if lower.startswith(("<pre", "<textarea", "<style")):
+        return tag
+    return _rewrite_attrs(tag, base, by_rel, deps)
+
+
+def _rewrite_attrs(
+    tag: str, base: str, by_rel: Dict[str, _Job], deps: Dict[str, str]
+) -> str:
+    is_img = re.match(r"<img\b", tag, re.I) is not None
+
+    def sub(m: re.Match) -> str:
+        lead, name, eq = m.group(1), m.group(2), m.group(3)
+        quote_char = "'" if m.group(5) is not None else '"'
+        value = next(g for g in m.groups()[3:] if g is not None)
+        if name.lower() == "srcset":
+            parts = []
+            for item in value.split(","):
+                bits = item.strip().split(None, 1)
+                if bits:
+                    bits[0] = _rewrite_ref(bits[0], base, by_rel, deps)
+                    parts.append(" ".join(bits))
+            value = ", ".join(parts)
+        else:
+            inline = is_img and name.lower() == "src"
+            value = _rewrite_ref(value, base, by_rel, deps, inline_images=inline)
+        return f"{lead}{name}{eq}{quote_char}{value}{quote_char}"
+
+    return _HTML_URL_ATTR.sub(sub, tag)
+
+
+def _local_job(
+    url: Optional[str], base: str, by_rel: Dict[str, _Job]
+) -> Optional[_Job]:
+    if not url or url.startswith(("#", "/")) or _SCHEME_RE.match(url):
+        return None
+    if "?" in url or "#" in url:
+        return None
+    return by_rel.get(posixpath.normpath(posixpath.join(base, unquote(url))))
+
+
+def _inline_css(
+    tag: str, base: str, by_rel: Dict[str, _Job], deps: Dict[str, str]
+) -> Optional[str]:
+    job = _local_job(_attr(tag, "href"), base, by_rel)
+    # url()s in a stylesheet are relative to its folder: only inline same-folder ones
+    if job is None or job.built is None or job.built.inline is None:
+        return None
+    if posixpath.dirname(job.rel) != base:
+        return None
+    deps[job.rel] = job.built.name
+    media = _attr(tag, "media")
+    media_attr = f' media="{media}"' if media and media.lower() != "all" else ""
+    # "\/" reads as "/" in CSS strings and is inert anywhere else it can occur
+    body = re.sub(r"</(style)", r"<\\/\1", job.built.inline, flags=re.I)
+    return f"<style{media_attr}>{body}</style>"
+
+
+def _inline_js(
+    tag: str, base: str, by_rel: Dict[str, _Job], deps: Dict[str, str]
+) -> Optional[str]:
+    open_end = tag.index(">") + 1
+    attrs = tag[:open_end]
+    if not re.fullmatch(r"\s*</script\s*>", tag[open_end:], re.I):
+        return None
+    # deferred, async and module scripts behave differently when inline
+    if any(_attr(attrs, a) is not None for a in ("defer", "async", "integrity")):
+        return None
+    if (_attr(attrs, "type") or "text/javascript").lower() not in _JS_TYPES:
+        return None
+    job = _local_job(_attr(attrs, "src"), base, by_rel)
+    if job is None or job.built is None or job.built.inline is None:
+        return None
+    if _ext(job.rel) not in ("js", "mjs"):
+        return None
+    deps[job.rel] = job.built.name
+    body = re.sub(r"</(script)", r"<\\/\1", job.built.inline, flags=re.I)
+    return f"<script>{body}</script>"
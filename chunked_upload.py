@@ -0,0 +1,343 @@
+# chunked_upload.py — resumable, chunked uploads streamed straight to disk
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import secrets
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional
+
+from fsutil import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: sessions are only locked within a process
+    fcntl = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app import UploadManager
+
+LOG = logging.getLogger(__name__)
+
+UPLOAD_SESSIONS_DIR_NAME = ".uploads"
+UPLOAD_DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Largest file a session may declare (its part file is preallocated to that size)
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+# Sessions untouched for this long are discarded
+UPLOAD_SESSION_TTL = 24 * 3600
+# Bytes read from the request per iteration (bounds memory per upload)
+UPLOAD_STREAM_BUFFER = 64 * 1024
+
+
+@dataclass
+class UploadSession:
+    """Persistent state of one chunked upload."""
+
+    upload_id: str
+    project: str
+    filename: str
+    target: str
+    size: int
+    chunk_size: int
+    received: List[int] = field(default_factory=list)
+    sha256: Optional[str] = None
+    updated: float = field(default_factory=time.time)
+
+    @property
+    def chunk_count(self) -> int:
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+    def expected_length(self, index: int) -> int:
+        """Exact byte length chunk `index` must have."""
+        if index == self.chunk_count - 1:
+            return self.size - index * self.chunk_size
+        return self.chunk_size
+
+    def next_chunk(self) -> Optional[int]:
+        """First chunk index not yet received, or None when complete."""
+        have = set(self.received)
+        for i in range(self.chunk_count):
+            if i not in have:
+                return i
+        return None
+
+    def status(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "chunks": self.chunk_count,
+            "received": sorted(self.received),
+            "next_chunk": self.next_chunk(),
+        }
+
+
+class UploadError(Exception):
+    """A chunked-upload request cannot be satisfied; carries an HTTP status."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class ChunkedUploadManager:
+    """
+    Resumable chunked uploads: start, PUT numbered chunks, finish.
+
+    Each chunk is streamed from the request into its slot of a single part
+    file using a fixed-size buffer, hashed on the way (SHA-256) and only
+    marked as received when the checksum and length match. Session state is
+    kept next to the part file, so an interrupted upload can be resumed
+    after a restart. Finishing validates the file through UploadManager
+    (same ALLOWED_UPLOAD_EXT rules) and moves it into the project.
+
+    Chunks are streamed without a lock, so several of one upload can be
+    sent in parallel; the session state is only read and saved under a
+    flock on the session directory, so they may reach different worker
+    processes.
+    """
+
+    uploads: "UploadManager"
+    sessions_dir: Path
+    default_chunk_size: int = UPLOAD_DEFAULT_CHUNK_SIZE
+    ttl: float = UPLOAD_SESSION_TTL
+    max_size: int = UPLOAD_MAX_SIZE
+    # per-process locks, used where flock is not available
+    _thread_locks: Dict[str, threading.Lock] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def start(
+        self,
+        project: str,
+        project_path: Path,
+        filename: str,
+        target: str,
+        size: int,
+        *,
+        chunk_size: Optional[int] = None,
+        sha256: Optional[str] = None,
+    ) -> UploadSession:
+        """
+        Open a new upload session after validating name/category/extension.
+
+        :param size: Total file size in bytes.
+        :param chunk_size: Requested chunk size (bounded by UPLOAD_MAX_CHUNK_SIZE).
+        :param sha256: Optional hex digest of the whole file, checked on finish.
+        """
+        self.expire_stale()
+        ok, dest = self.uploads.resolve_destination(project_path, filename, target)
+        if not ok:
+            raise UploadError(str(dest))
+        if size < 0:
+            raise UploadError("invalid size")
+        if size > self.max_size:
+            raise UploadError(f"file larger than {self.max_size} bytes", 413)
+        if self.uploads.quotas is not None:
+            # refuse early what could not be installed; checked again on finish
+            try:
+                previous_size: Optional[int] = Path(dest).stat().st_size
+            except OSError:
+                previous_size = None
+            self.uploads.quotas.check(project_path.name, int(size), previous_size)
+        chunk_size = int(chunk_size or self.default_chunk_size)
+        if not 0 < chunk_size <= UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadError("invalid chunk_size")
+
+        session = UploadSession(
+            upload_id=secrets.token_hex(16),
+            project=project,
+            filename=filename,
+            target=target,
+            size=int(size),
+            chunk_size=chunk_size,
+            sha256=sha256.lower() if sha256 else None,
+        )
+        d = self._session_dir(session.upload_id)
+        d.mkdir(parents=True)
+        # preallocate the part file so chunks can land in any order
+        with (d / "data.part").open("wb") as fh:
+            fh.truncate(session.size)
+        self._save_state(session)
+        return session
+
+    def get(self, project: str, upload_id: str) -> UploadSession:
+        """Load a session, checking it belongs to `project`."""
+        try:
+            state = self._session_dir(upload_id) / "state.json"
+            raw = json.loads(state.read_text("utf-8"))
+            session = UploadSession(**raw)
+        except (OSError, ValueError, TypeError):
+            raise UploadError("upload not found", 404)
+        if session.project != project:
+            raise UploadError("upload not found", 404)
+        return session
+
+    def write_chunk(
+        self,
+        project: str,
+        upload_id: str,
+        index: int,
+        stream: BinaryIO,
+        checksum: Optional[str],
+    ) -> UploadSession:
+        """
+        Stream one chunk into place.
+
+        :param stream: Request body stream (read in UPLOAD_STREAM_BUFFER blocks).
+        :param checksum: Hex SHA-256 of the chunk; required.
+        """
+        if not checksum:
+            raise UploadError("missing chunk checksum")
+        session = self.get(project, upload_id)
+        if not 0 <= index < session.chunk_count:
+            raise UploadError("chunk index out of range")
+        expected = session.expected_length(index)
+        if index in session.received:
+            # a re-sent chunk overwrites its slot; it is only valid again once verified
+            with self._locked(upload_id):
+                session = self.get(project, upload_id)
+                if index in session.received:
+                    session.received.remove(index)
+                    self._save_state(session)
+        digest = hashlib.sha256()
+        written = 0
+        part = self._session_dir(upload_id) / "data.part"
+        try:
+            fh = part.open("r+b")
+        except FileNotFoundError:
+            raise UploadError("upload not found", 404)
+        with fh:
+            fh.seek(index * session.chunk_size)
+            while True:
+                block = stream.read(UPLOAD_STREAM_BUFFER)
+                if not block:
+                    break
+                written += len(block)
+                if written > expected:
+                    raise UploadError("chunk larger than expected")
+                digest.update(block)
+                fh.write(block)
+        if written != expected:
+            raise UploadError(f"chunk length {written} != expected {expected}")
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError("chunk checksum mismatch", 422)
+        with self._locked(upload_id):
+            # other chunks may have been saved meanwhile
+            session = self.get(project, upload_id)
+            if index not in session.received:
+                session.received.append(index)
+            session.updated = time.time()
+            self._save_state(session)
+            return session
+
+    def finish(self, project: str, project_path: Path, upload_id: str) -> str:
+        """Verify completeness (and whole-file hash) and install the file. Returns rel path."""
+        with self._locked(upload_id):
+            session = self.get(project, upload_id)
+            missing = session.next_chunk()
+            if missing is not None:
+                raise UploadError(f"missing chunk {missing}", 409)
+            d = self._session_dir(upload_id)
+            part = d / "data.part"
+            if session.sha256:
+                digest = hashlib.sha256()
+                with part.open("rb") as fh:
+                    for block in iter(lambda: fh.read(UPLOAD_STREAM_BUFFER), b""):
+                        digest.update(block)
+                if digest.hexdigest() != session.sha256:
+                    raise UploadError("file checksum mismatch", 422)
+            ok, dest = self.uploads.resolve_destination(
+                project_path, session.filename, session.target
+            )
+            if not ok:
+                raise UploadError(str(dest))
+            ok, result = self.uploads.install_file(project_path, part, Path(dest))
+            if not ok:
+                raise UploadError(result or "install failed", 500)
+            self._discard(upload_id)
+            return result or ""
+
+    def abort(self, project: str, upload_id: str) -> None:
+        """Cancel an upload and delete its data."""
+        with self._locked(upload_id):
+            self.get(project, upload_id)
+            self._discard(upload_id)
+
+    def expire_stale(self) -> int:
+        """Remove sessions idle for longer than `ttl`. Returns the number removed."""
+        if not self.sessions_dir.is_dir():
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for d in self.sessions_dir.iterdir():
+            try:
+                if (d / "state.json").stat().st_mtime >= cutoff:
+                    continue
+                if fcntl is None:
+                    shutil.rmtree(d, ignore_errors=True)
+                    removed += 1
+                    continue
+                fd = os.open(d, os.O_RDONLY | os.O_DIRECTORY)
+            except OSError:
+                continue
+            try:
+                # a session some request is working on is not stale
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            else:
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+            finally:
+                os.close(fd)
+        if removed:
+            LOG.info("Expired %d stale upload sessions", removed)
+        return removed
+
+    def _session_dir(self, upload_id: str) -> Path:
+        # ids are generated by us; reject anything else to keep paths safe
+        if not upload_id.isalnum():
+            raise UploadError("upload not found", 404)
+        return self.sessions_dir / upload_id
+
+    def _save_state(self, session: UploadSession) -> None:
+        data = json.dumps(asdict(session)).encode("utf-8")
+        atomic_write(self._session_dir(session.upload_id) / "state.json", data, fsync=False)
+
+    def _discard(self, upload_id: str) -> None:
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        self._thread_locks.pop(upload_id, None)
+
+    @contextmanager
+    def _locked(self, upload_id: str) -> Iterator[None]:
+        """
+        Hold the flock of the session directory (across threads and worker
+        processes). A session finished or aborted while we waited is gone:
+        get() then reports it as not found.
+        """
+        if fcntl is None:
+            with self._thread_locks.setdefault(upload_id, threading.Lock()):
+                yield
+            return
+        try:
+            fd = os.open(self._session_dir(upload_id), os.O_RDONLY | os.O_DIRECTORY)
+        except FileNotFoundError:
+            raise UploadError("upload not found", 404)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
@@ -0,0 +1,399 @@
+# compression.py — content negotiation, sidecars and a cache of compressed bodies
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional, Tuple
+
+LOG = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent as-is (headers would eat the saving)
+COMPRESS_MIN_BYTES = 1024
+# Limits of CompressedCache (bytes held, bodies held)
+COMPRESSED_CACHE_MAX_BYTES = 32 * 1024 * 1024
+COMPRESSED_CACHE_MAX_ENTRIES = 4096
+# Namespace of compressed bodies in the shared cache (never invalidated)
+COMPRESSED_NS = "compressed"
+# On-the-fly levels; offline builds pass best=True
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Files above the in-memory caches are compressed once into a
+# CompressedFileStore; larger ones than this are sent as they are
+COMPRESS_STORE_MAX_FILE_BYTES = 64 * 1024 * 1024
+# Bytes of compressed copies kept on disk before the oldest are pruned
+COMPRESS_STORE_MAX_BYTES = 256 * 1024 * 1024
+# Directory of the CompressedFileStore under projects/.state
+COMPRESS_STORE_DIR_NAME = "compressed"
+# Block size for streamed compression and sidecar checks
+_STREAM_BLOCK = 256 * 1024
+
+# Encodings in order of preference, with the sidecar suffix of each
+ENCODINGS: Tuple[Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+_COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+    "image/x-icon",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def brotli_module():
+    """The brotli module if installed, else None (br is then never offered)."""
+    try:
+        import brotli  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Encodings this process can produce, most preferred first."""
+    return tuple(name for name, _ in ENCODINGS if name != "br" or brotli_module())
+
+
+def is_compressible(mimetype: Optional[str], size: int) -> bool:
+    """True for text-like media types at least COMPRESS_MIN_BYTES long."""
+    if size < COMPRESS_MIN_BYTES or not mimetype:
+        return False
+    return mimetype.startswith("text/") or mimetype in _COMPRESSIBLE_TYPES
+
+
+def negotiate(accepted, offered: Iterable[str]) -> Optional[str]:
+    """
+    Pick the first of `offered` the client accepts.
+
+    :param accepted: request.accept_encodings (werkzeug Accept)
+    :param offered: encodings available for this body, most preferred first.
+    """
+    for name in offered:
+        if accepted[name] > 0:
+            return name
+    return None
+
+
+def encode(data: bytes, encoding: str, *, best: bool = False) -> bytes:
+    """Compress `data` with `encoding` ("gzip" or "br")."""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        brotli = brotli_module()
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    raise ValueError(f"unknown encoding: {encoding}")
+
+
+def find_sidecar(path: Path, accepted) -> Optional[Tuple[str, Path]]:
+    """
+    Return (encoding, path) of a precompressed `<file>.br` / `<file>.gz` the
+    client accepts. Sidecars older than the file itself, or recording another
+    source size (see _sidecar_matches), are ignored.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    for name, suffix in ENCODINGS:
+        if accepted[name] <= 0:
+            continue
+        sidecar = path.with_name(path.name + suffix)
+        if _sidecar_matches(sidecar, name, st):
+            return name, sidecar
+    return None
+
+
+def _read_sidecar(path: Path, encoding: str) -> Optional[bytes]:
+    """Content of the fresh `encoding` sidecar of `path`, or None."""
+    suffix = dict(ENCODINGS)[encoding]
+    sidecar = path.with_name(path.name + suffix)
+    try:
+        if not _sidecar_matches(sidecar, encoding, path.stat()):
+            return None
+        return sidecar.read_bytes()
+    except OSError:
+        return None
+
+
+# (sidecar, its size and mtime) -> decoded size, for formats without a trailer
+_decoded_sizes: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+_decoded_sizes_lock = threading.Lock()
+_DECODED_SIZES_MAX = 1024
+
+
+def _sidecar_matches(sidecar: Path, encoding: str, source: os.stat_result) -> bool:
+    """
+    True if `sidecar` is at least as new as the source and decodes to as many
+    bytes as the source has. gzip records that size in its trailer (ISIZE,
+    modulo 2**32); a brotli stream does not, so it is decoded once and the
+    length remembered per sidecar version.
+    """
+    try:
+        st = sidecar.stat()
+        if st.st_mtime_ns < source.st_mtime_ns:
+            return False
+        if encoding == "gzip":
+            with sidecar.open("rb") as fh:
+                fh.seek(-4, os.SEEK_END)
+                (isize,) = struct.unpack("<I", fh.read(4))
+            return isize == source.st_size & 0xFFFFFFFF
+        key = (str(sidecar), st.st_size, st.st_mtime_ns)
+        with _decoded_sizes_lock:
+            size = _decoded_sizes.get(key)
+        if size is None:
+            size = _decoded_size(sidecar, encoding)
+            with _decoded_sizes_lock:
+                _decoded_sizes[key] = size
+                while len(_decoded_sizes) > _DECODED_SIZES_MAX:
+                    _decoded_sizes.popitem(last=False)
+        return size == source.st_size
+    except (OSError, ValueError, struct.error):
+        return False
+
+
+def _decoded_size(path: Path, encoding: str) -> int:
+    """Length of `path` once decoded, -1 if it is not valid `encoding` data."""
+    brotli = brotli_module()
+    if encoding != "br" or brotli is None:
+        return -1
+    decompressor = brotli.Decompressor()
+    size = 0
+    try:
+        with path.open("rb") as fh:
+            for block in iter(lambda: fh.read(_STREAM_BLOCK), b""):
+                size += len(decompressor.process(block))
+        return size if decompressor.is_finished() else -1
+    except brotli.error:
+        return -1
+
+
+@dataclass
+class CompressedCache:
+    """
+    Bounded LRU of compressed bodies keyed by (content hash, encoding).
+
+    Keys are content hashes, so an entry never goes stale: an edited file
+    simply gets a new key and the old body ages out. The same content
+    served from several paths (or projects) is compressed once.
+
+    `shared` (a sharedcache.SharedCache) is a second level seen by all
+    workers, so each body is compressed once per deployment.
+    """
+
+    max_bytes: int = COMPRESSED_CACHE_MAX_BYTES
+    max_entries: int = COMPRESSED_CACHE_MAX_ENTRIES
+    shared: Optional[Any] = None
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _entries: "OrderedDict[Tuple[str, str], bytes]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _total_bytes: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def get(
+        self,
+        digest: str,
+        encoding: str,
+        data: bytes,
+        source: Optional[Path] = None,
+    ) -> Optional[bytes]:
+        """
+        Return `data` compressed with `encoding`, compressing at most once
+        per content hash. If `source` (the file `data` was read from) has a
+        fresh sidecar for `encoding`, that is used instead of compressing.
+        Returns None when compression does not make the body smaller.
+        """
+        key = (digest, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body or None
+            self.misses += 1
+        shared_key = f"{digest}:{encoding}"
+        body = None
+        if self.shared is not None:
+            body = self.shared.get(COMPRESSED_NS, shared_key)
+        if body is None:
+            body = _read_sidecar(source, encoding) if source is not None else None
+            if body is None:
+                body = encode(data, encoding)
+            # remember "not worth it" as an empty body so it is not retried
+            if len(body) >= len(data):
+                body = b""
+            if self.shared is not None:
+                self.shared.set(COMPRESSED_NS, shared_key, body)
+        self._store(key, body)
+        return body or None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _store(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._entries[key] = body
+            self._total_bytes += len(body)
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or self._total_bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+
+@dataclass
+class CompressedFileStore:
+    """
+    Compressed copies of files too large for the in-memory caches, on disk.
+
+    A file is compressed (streamed, in constant memory) on the first request
+    that wants it and the copy is served from then on. Entries are named by
+    the source path, size and mtime, so an edited file gets a new entry and
+    stale ones are pruned, oldest first, once the store exceeds `max_bytes`.
+    Copies carry the source's mtime so Last-Modified stays that of the file.
+    """
+
+    root: Path
+    max_bytes: int = COMPRESS_STORE_MAX_BYTES
+    max_file_bytes: int = COMPRESS_STORE_MAX_FILE_BYTES
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _total_bytes: Optional[int] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def get(self, path: Path, encoding: str) -> Optional[Path]:
+        """
+        Path of `path` compressed with `encoding`, compressing it now if there
+        is no copy for its current version. None when the file is too large,
+        changed while being compressed, or does not get smaller.
+        """
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        if st.st_size > self.max_file_bytes:
+            return None
+        key = f"{path}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8", "replace")
+        digest = hashlib.sha1(key).hexdigest()
+        target = self.root / digest[:2] / (digest[2:] + dict(ENCODINGS)[encoding])
+        try:
+            size = target.stat().st_size
+        except OSError:
+            size = None
+        if size is not None:
+            self.hits += 1
+            # an empty copy records "not worth compressing"
+            return target if size else None
+        self.misses += 1
+        try:
+            size = self._compress(path, st, encoding, target)
+        except (OSError, ValueError):
+            LOG.warning("Could not compress %s", path, exc_info=True)
+            return None
+        if size is None:
+            return None
+        self._account(size)
+        return target if size else None
+
+    def _compress(
+        self, path: Path, st: os.stat_result, encoding: str, target: Path
+    ) -> Optional[int]:
+        """Write the compressed copy of `path`; returns its size (0: not smaller)."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(
+            prefix=f".{target.name}.", suffix=".tmp", dir=str(target.parent)
+        )
+        try:
+            with os.fdopen(fd, "wb") as out, path.open("rb") as src:
+                _stream_encode(src, out, encoding)
+                size = out.tell()
+            after = path.stat()
+            if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                os.unlink(tmp)
+                return None
+            if size >= st.st_size:
+                os.truncate(tmp, 0)
+                size = 0
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return size
+
+    def _account(self, added: int) -> None:
+        """Track the store size; prune the oldest copies past max_bytes."""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += added
+            if self._total_bytes <= self.max_bytes:
+                return
+            # ctime is when the copy was written (mtime mirrors the source)
+            for path, size, _ in sorted(self._scan(), key=lambda item: item[2]):
+                if self._total_bytes <= self.max_bytes // 2:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                self._total_bytes -= size
+
+    def _scan(self):
+        for sub in self.root.iterdir() if self.root.is_dir() else ():
+            try:
+                entries = list(os.scandir(sub))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue  # a copy still being written
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield Path(entry.path), st.st_size, st.st_ctime_ns
+
+
+def _stream_encode(src, out, encoding: str) -> None:
+    """Compress file object `src` into `out` block by block."""
+    if encoding == "gzip":
+        gz = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+        with gz:
+            for block in iter(lambda: src.read(_STREAM_BLOCK), b""):
+                gz.write(block)
+        return
+    brotli = brotli_module()
+    if encoding != "br" or brotli is None:
+        raise ValueError(f"cannot encode {encoding}")
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for block in iter(lambda: src.read(_STREAM_BLOCK), b""):
+        out.write(compressor.process(block))
+    out.write(compressor.finish())
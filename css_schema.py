@@ -0,0 +1,212 @@
+# css_schema.py — indexed, queryable view of static/css-schema-full.json
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LOG = logging.getLogger(__name__)
+
+# Maximum number of completion results returned per query
+CSS_COMPLETE_DEFAULT_LIMIT = 20
+CSS_COMPLETE_MAX_LIMIT = 100
+# Number of distinct completion queries kept in the result cache
+CSS_COMPLETE_CACHE_SIZE = 2048
+
+# Only identifier-like examples are offered as value keywords
+_KEYWORD_RE = re.compile(r"^-?[a-z][a-z0-9-]*$")
+
+
+def prefix_range(sorted_keys: List[str], prefix: str) -> Tuple[int, int]:
+    """Return the [lo, hi) slice of `sorted_keys` whose items start with `prefix`."""
+    lo = bisect_left(sorted_keys, prefix)
+    # "\uffff" sorts after any character that can follow the prefix
+    hi = bisect_left(sorted_keys, prefix + "\uffff", lo)
+    return lo, hi
+
+
+def _prefix_slice(sorted_keys: List[str], prefix: str, limit: int) -> List[str]:
+    lo, hi = prefix_range(sorted_keys, prefix)
+    return sorted_keys[lo:min(hi, lo + limit)]
+
+
+def _contains(sorted_keys: List[str], text: str, limit: int) -> List[str]:
+    # a linear scan: a few hundred names, and results are cached
+    return [k for k in sorted_keys if text in k][:limit]
+
+
+@dataclass
+class CssSchemaIndex:
+    """
+    Load the CSS schema once and answer completion / lookup queries.
+
+    Property names and value keywords are kept in sorted arrays so a prefix
+    query is two binary searches plus a slice. Completion results and
+    per-property documents are cached until the schema file changes.
+    """
+
+    path: Path
+    cache_size: int = CSS_COMPLETE_CACHE_SIZE
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _mtime_ns: Optional[int] = field(default=None, init=False, repr=False)
+    _names: List[str] = field(default_factory=list, init=False, repr=False)
+    # sorted, de-duplicated value keywords across all properties
+    _keywords: List[str] = field(default_factory=list, init=False, repr=False)
+    # per property: sorted keywords
+    _values: Dict[str, List[str]] = field(default_factory=dict, init=False, repr=False)
+    _documents: Dict[str, dict] = field(default_factory=dict, init=False, repr=False)
+    _results: "OrderedDict[tuple, dict]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def available(self) -> bool:
+        """Return True if the schema could be loaded."""
+        with self._lock:
+            self._refresh()
+            return bool(self._names)
+
+    def complete(
+        self,
+        prefix: str,
+        *,
+        prop: Optional[str] = None,
+        limit: int = CSS_COMPLETE_DEFAULT_LIMIT,
+        contains: bool = False,
+        documents: bool = False,
+    ) -> dict:
+        """
+        Return completions for `prefix`.
+
+        Without `prop`, matches property names and value keywords of any
+        property; with `prop`, only that property's value keywords.
+
+        :param prefix: Text typed so far (case-insensitive).
+        :param prop: Optional property name to complete values for.
+        :param limit: Maximum number of items per result list.
+        :param contains: Match `prefix` anywhere in a name, not only at its start.
+        :param documents: Also return the schema entry of every matched property.
+        :return: dict with "prefix", "properties" and "values" lists, plus
+            "documents" (name -> entry) when asked for.
+        """
+        prefix = prefix.strip().lower()
+        prop = prop.strip().lower() if prop else None
+        limit = max(1, min(int(limit), CSS_COMPLETE_MAX_LIMIT))
+        key = (prefix, prop, limit, contains, documents)
+        with self._lock:
+            self._refresh()
+            hit = self._results.get(key)
+            if hit is not None:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return hit
+            self.misses += 1
+            result = self._complete_uncached(prefix, prop, limit, contains)
+            if documents:
+                result["documents"] = {
+                    name: self._documents[name] for name in result["properties"]
+                }
+            self._results[key] = result
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+            return result
+
+    def property(self, name: str) -> Optional[dict]:
+        """
+        Return the schema entry for `name` with its value type details and,
+        for shorthands, the longhand properties. Returns None if unknown.
+        """
+        with self._lock:
+            self._refresh()
+            return self._documents.get(name.strip().lower())
+
+    def properties(self, names: List[str]) -> Dict[str, dict]:
+        """Return name -> schema entry for each of `names` that is known."""
+        with self._lock:
+            self._refresh()
+            found = {}
+            for name in names:
+                doc = self._documents.get(name.strip().lower())
+                if doc is not None:
+                    found[doc["name"]] = doc
+            return found
+
+    def _complete_uncached(
+        self, prefix: str, prop: Optional[str], limit: int, contains: bool = False
+    ) -> dict:
+        match = _contains if contains else _prefix_slice
+        if prop is not None:
+            return {
+                "prefix": prefix,
+                "property": prop,
+                "properties": [],
+                "values": match(self._values.get(prop, []), prefix, limit),
+            }
+        return {
+            "prefix": prefix,
+            "properties": match(self._names, prefix, limit),
+            "values": match(self._keywords, prefix, limit),
+        }
+
+    def _refresh(self) -> None:
+        """(Re)build the index if the schema file is new or changed."""
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns:
+            return
+        self._mtime_ns = mtime_ns
+        self._names, self._keywords, self._values, self._documents = [], [], {}, {}
+        self._results.clear()
+        if mtime_ns is None:
+            LOG.debug("CSS schema not found at %s", self.path)
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                schema = json.load(fh)
+        except Exception as e:
+            LOG.exception("Failed to load CSS schema %s: %s", self.path, e)
+            return
+        self._build(schema)
+        LOG.info("Indexed CSS schema from %s (%d properties)", self.path, len(self._names))
+
+    def _build(self, schema: dict) -> None:
+        properties = {k.lower(): v for k, v in (schema.get("properties") or {}).items()}
+        shorthands = {k.lower(): v for k, v in (schema.get("shorthands") or {}).items()}
+        value_types = schema.get("valueTypes") or {}
+
+        keywords = set()
+        for name, spec in properties.items():
+            words = {str(v).lower() for v in spec.get("values") or []}
+            words.update(
+                str(v).lower()
+                for v in spec.get("examples") or []
+                if _KEYWORD_RE.match(str(v).lower())
+            )
+            self._values[name] = sorted(words)
+            keywords.update(words)
+
+            doc = {"name": name, **spec}
+            doc["valueTypes"] = {
+                t: value_types[t] for t in spec.get("type") or [] if t in value_types
+            }
+            if name in shorthands:
+                doc["longhands"] = shorthands[name]
+            self._documents[name] = doc
+
+        # shorthands that are not listed as properties are still completable
+        for name, longhands in shorthands.items():
+            if name not in self._documents:
+                self._documents[name] = {"name": name, "longhands": longhands}
+                self._values.setdefault(name, [])
+
+        self._names = sorted(self._documents)
+        self._keywords = sorted(keywords)
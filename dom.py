@@ -0,0 +1,666 @@
+# dom.py — element index of project pages with source ranges for subtree edits
+from __future__ import annotations
+
+import html
+import html.parser
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from patching import content_hash
+
+LOG = logging.getLogger(__name__)
+
+# Parsed pages kept in memory, by total source size
+DOM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DOM_QUERY_DEFAULT_LIMIT = 100
+DOM_QUERY_MAX_LIMIT = 1000
+
+# Elements that never have content or an end tag
+VOID_ELEMENTS = frozenset(
+    "area base br col embed hr img input link meta param source track wbr".split()
+)
+
+# Elements whose content is text, never child elements
+_RAW_TEXT_ELEMENTS = frozenset(html.parser.HTMLParser.CDATA_CONTENT_ELEMENTS)
+_ATTR_NAME_RE = re.compile(r"^[^\s\"'<>/=]+$")
+
+
+class DomError(ValueError):
+    """A node path does not resolve, or an edit does not apply to the node."""
+
+
+# Node path as stored in the indexes: element indices from the top level down
+# (tuples compare in document order)
+NodeKey = Tuple[int, ...]
+Attrs = List[Tuple[str, Optional[str]]]
+
+
+@dataclass
+class DomNode:
+    """
+    One element of a parsed page with its absolute source range.
+
+    `start`..`open_end` is the start tag, `open_end`..`close_start` the
+    content and `close_start`..`end` the end tag (empty for void elements,
+    self-closing tags and elements closed implicitly).
+    """
+
+    tag: str
+    attrs: Attrs
+    path: str
+    start: int
+    open_end: int
+    close_start: int
+    end: int
+    children: int
+    self_closing: bool = False
+    # tag name as written in the source (the parser lower-cases it)
+    raw_tag: str = ""
+
+    def attr(self, name: str) -> Optional[str]:
+        return _attr(self.attrs, name)
+
+    @property
+    def has_content(self) -> bool:
+        return self.tag not in VOID_ELEMENTS and not self.self_closing
+
+    def summary(self) -> dict:
+        return {
+            "path": self.path,
+            "tag": self.tag,
+            "id": self.attr("id"),
+            "class": self.attr("class"),
+            "start": self.start,
+            "end": self.end,
+            "children": self.children,
+        }
+
+
+@dataclass
+class _Element:
+    """
+    Element as stored in a document's tree. Offsets are relative (start
+    from the beginning of the parent's content, then lengths), so an edit
+    only copies the elements whose position changes: the edited one, its
+    ancestors and the siblings following them. Never mutated once built;
+    unchanged subtrees are shared between documents.
+    """
+
+    tag: str
+    attrs: Attrs
+    raw_tag: str
+    self_closing: bool
+    start: int
+    open_len: int
+    content_len: int = 0
+    # 0 when closed implicitly (or void)
+    close_len: int = 0
+    children: List["_Element"] = field(default_factory=list)
+
+    @property
+    def has_content(self) -> bool:
+        return self.tag not in VOID_ELEMENTS and not self.self_closing
+
+    def moved(self, delta: int) -> "_Element":
+        return _Element(
+            self.tag,
+            self.attrs,
+            self.raw_tag,
+            self.self_closing,
+            self.start + delta,
+            self.open_len,
+            self.content_len,
+            self.close_len,
+            self.children,
+        )
+
+    def resized(self, delta: int, children: List["_Element"]) -> "_Element":
+        return _Element(
+            self.tag,
+            self.attrs,
+            self.raw_tag,
+            self.self_closing,
+            self.start,
+            self.open_len,
+            self.content_len + delta,
+            self.close_len,
+            children,
+        )
+
+
+def _attr(attrs: Attrs, name: str) -> Optional[str]:
+    for key, value in attrs:
+        if key == name:
+            return value
+    return None
+
+
+def _index_keys(element: _Element) -> Iterator[Tuple[str, str]]:
+    yield "tag", element.tag
+    ident = _attr(element.attrs, "id")
+    if ident:
+        yield "id", ident
+    for cls in (_attr(element.attrs, "class") or "").split():
+        yield "class", cls
+
+
+def _walk(
+    elements: List[_Element], prefix: NodeKey = (), first: int = 0, base: int = 0
+) -> Iterator[Tuple[NodeKey, _Element, int]]:
+    """(path, element, absolute start) in document order."""
+    stack = [
+        (prefix + (i,), element, base + element.start)
+        for i, element in enumerate(elements, first)
+    ]
+    stack.reverse()
+    while stack:
+        path, element, start = stack.pop()
+        yield path, element, start
+        if element.children:
+            content = start + element.open_len
+            children = [
+                (path + (i,), child, content + child.start)
+                for i, child in enumerate(element.children)
+            ]
+            children.reverse()
+            stack.extend(children)
+
+
+def _element_at(roots: List[_Element], key: NodeKey) -> _Element:
+    siblings = roots
+    for i in key:
+        element = siblings[i]
+        siblings = element.children
+    return element
+
+
+def _parse_path(path: str) -> NodeKey:
+    try:
+        return tuple(int(part) for part in path.strip("/").split("/"))
+    except ValueError:
+        raise DomError(f"invalid node path: {path!r}")
+
+
+def _format_path(path: NodeKey) -> str:
+    return "/".join(map(str, path))
+
+
+class _TreeBuilder(html.parser.HTMLParser):
+    """
+    Tolerant tree builder recording source offsets of every element.
+
+    This is not an HTML5 tree construction: an end tag closes the nearest
+    open element of that name (and whatever is still open inside it), stray
+    end tags are ignored and elements left open end with the document. For
+    pages written by the editor that is the tree the user sees.
+    """
+
+    def __init__(self, text: str):
+        super().__init__(convert_charrefs=False)
+        self._text = text
+        # offset of the first character of each line, for getpos()
+        self._lines = [0]
+        i = text.find("\n")
+        while i != -1:
+            self._lines.append(i + 1)
+            i = text.find("\n", i + 1)
+        self.roots: List[_Element] = []
+        # open elements with the absolute offset of their content
+        self._stack: List[Tuple[_Element, int]] = []
+        # end tags without an open element, and elements closed by the end of
+        # the text: a fragment with either parses differently inside a page
+        self.stray = 0
+        self.unclosed = 0
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._lines[line - 1] + col
+
+    def _open(self, tag: str, attrs, self_closing: bool) -> Tuple[_Element, int]:
+        start = self._offset()
+        raw = self.get_starttag_text() or f"<{tag}>"
+        if self._stack:
+            parent, base = self._stack[-1]
+            siblings = parent.children
+        else:
+            base, siblings = 0, self.roots
+        raw_tag = raw[1 : 1 + len(tag)]
+        element = _Element(
+            tag, list(attrs), raw_tag, self_closing, start - base, len(raw)
+        )
+        siblings.append(element)
+        return element, start + len(raw)
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        element, content = self._open(tag, attrs, self_closing=False)
+        if element.has_content:
+            self._stack.append((element, content))
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self._open(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag: str) -> None:
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0].tag == tag:
+                break
+        else:
+            if tag not in VOID_ELEMENTS:
+                self.stray += 1
+            return
+        pos = self._offset()
+        close = self._text.find(">", pos)
+        for element, content in self._stack[depth:]:
+            element.content_len = pos - content
+        end = close + 1 if close != -1 else len(self._text)
+        self._stack[depth][0].close_len = end - pos
+        del self._stack[depth:]
+
+    def finish(self) -> List[_Element]:
+        self.close()
+        self.unclosed = len(self._stack)
+        for element, content in self._stack:
+            element.content_len = len(self._text) - content
+        self._stack.clear()
+        return self.roots
+
+
+def _parse(text: str) -> Tuple[List[_Element], bool]:
+    """Top-level elements of `text` and whether it is self-contained."""
+    builder = _TreeBuilder(text)
+    builder.feed(text)
+    roots = builder.finish()
+    # a stray end tag, an element left open or an unterminated tag at the
+    # end would close or swallow the neighbours of a fragment inside a page
+    whole = not builder.stray and not builder.unclosed
+    return roots, whole and text.rfind("<") <= text.rfind(">")
+
+
+# kind ("tag" / "id" / "class") -> key -> sorted paths
+_Index = Dict[str, Dict[str, List[NodeKey]]]
+
+
+def _build_index(roots: List[_Element]) -> _Index:
+    index: _Index = {"tag": {}, "id": {}, "class": {}}
+    for path, element, _ in _walk(roots):
+        for kind, key in _index_keys(element):
+            index[kind].setdefault(key, []).append(path)
+    return index
+
+
+class DomDocument:
+    """
+    Parsed page: element tree with source ranges, indexed by id, class and
+    tag. Documents are immutable and shared between requests for the same
+    content hash; `apply` derives the next one.
+
+    Nodes are addressed by path: the indices of the element among its
+    parent's element children, from the top level down ("0/1/3" is the
+    fourth element of the second element of the first top-level element).
+    A path stays valid as long as no element is inserted or removed before
+    it or above it.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        digest: Optional[str] = None,
+        *,
+        _roots: Optional[List[_Element]] = None,
+        _index: Optional[_Index] = None,
+    ):
+        data = text.encode("utf-8")
+        self.text = text
+        self.size = len(data)
+        self.hash = digest or content_hash(data)
+        self._roots = _roots if _roots is not None else _parse(text)[0]
+        self._index = _index if _index is not None else _build_index(self._roots)
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self._index["tag"].values())
+
+    def _chain(self, path: NodeKey) -> List[Tuple[_Element, int]]:
+        """(element, absolute start) from the top level down to `path`."""
+        chain = []
+        siblings, base = self._roots, 0
+        for i in path:
+            if not 0 <= i < len(siblings):
+                raise DomError(f"no element at {_format_path(path)!r}")
+            element = siblings[i]
+            start = base + element.start
+            chain.append((element, start))
+            siblings, base = element.children, start + element.open_len
+        if not chain:
+            raise DomError("empty node path")
+        return chain
+
+    @staticmethod
+    def _view(path: NodeKey, element: _Element, start: int) -> DomNode:
+        open_end = start + element.open_len
+        close_start = open_end + element.content_len
+        return DomNode(
+            tag=element.tag,
+            attrs=element.attrs,
+            path=_format_path(path),
+            start=start,
+            open_end=open_end,
+            close_start=close_start,
+            end=close_start + element.close_len,
+            children=len(element.children),
+            self_closing=element.self_closing,
+            raw_tag=element.raw_tag,
+        )
+
+    def node(self, path: str) -> DomNode:
+        """:raises DomError: if no element has this path."""
+        key = _parse_path(path)
+        element, start = self._chain(key)[-1]
+        return self._view(key, element, start)
+
+    def find(
+        self,
+        *,
+        id: Optional[str] = None,
+        cls: Optional[str] = None,
+        tag: Optional[str] = None,
+    ) -> Iterator[DomNode]:
+        """Elements matching all given criteria, in document order."""
+        if tag is not None:
+            tag = tag.lower()
+        if id is None and cls is None and tag is None:
+            for item in _walk(self._roots):
+                yield self._view(*item)
+            return
+        if id is not None:
+            paths = self._index["id"].get(id, [])[:1]
+        elif cls is not None:
+            paths = self._index["class"].get(cls, [])
+        else:
+            paths = self._index["tag"].get(tag or "", [])
+        for path in paths:
+            element, start = self._chain(path)[-1]
+            if tag is not None and element.tag != tag:
+                continue
+            classes = (_attr(element.attrs, "class") or "").split()
+            if cls is not None and cls not in classes:
+                continue
+            yield self._view(path, element, start)
+
+    def outer_html(self, node: DomNode) -> str:
+        return self.text[node.start : node.end]
+
+    def inner_html(self, node: DomNode) -> str:
+        return self.text[node.open_end : node.close_start]
+
+    def stats(self) -> dict:
+        tags = self._index["tag"]
+        return {
+            "hash": self.hash,
+            "chars": len(self.text),
+            "elements": len(self),
+            "ids": len(self._index["id"]),
+            "classes": len(self._index["class"]),
+            "tags": {tag: len(paths) for tag, paths in sorted(tags.items())},
+        }
+
+    # ---- edits ----
+    def apply(self, path: str, change: dict) -> Tuple[dict, "DomDocument"]:
+        """
+        Change one element. Only the changed region is re-serialized: the
+        start tag for attribute changes, the content or the element itself
+        otherwise.
+
+        :param path: Node path of the element.
+        :param change: exactly one of
+            {"attrs": {name: value, true (no value) or null (remove)}},
+            {"html": str} — replaces the whole element ("" removes it),
+            {"inner_html": str} — replaces its content,
+            {"text": str} — replaces its content with (escaped) text.
+        :return: Tuple (range edit for patching.apply_edits, updated document).
+            The updated document is derived from this one: only the new
+            fragment is parsed and unchanged subtrees are shared.
+        :raises DomError: if the path or the change is invalid.
+        """
+        key = _parse_path(path)
+        chain = self._chain(key)
+        target, target_start = chain[-1]
+        node = self._view(key, target, target_start)
+        kinds = [k for k in ("attrs", "html", "inner_html", "text") if k in change]
+        if len(kinds) != 1:
+            raise DomError("provide exactly one of attrs, html, inner_html or text")
+        kind = kinds[0]
+        value = change[kind]
+        if kind == "attrs":
+            if not isinstance(value, dict) or not value:
+                raise DomError("attrs must be a non-empty object")
+            attrs = changed_attrs(node, value)
+            start, end, text = node.start, node.open_end, start_tag(node, attrs)
+        elif not isinstance(value, str):
+            raise DomError(f"{kind} must be a string")
+        elif kind == "html":
+            start, end, text = node.start, node.end, value
+        elif not node.has_content:
+            raise DomError(f"<{node.tag}> has no content")
+        else:
+            start, end, text = node.open_end, node.close_start, value
+            if node.tag in _RAW_TEXT_ELEMENTS:
+                if f"</{node.tag}" in value.lower():
+                    raise DomError(f"<{node.tag}> content cannot contain its end tag")
+            elif kind == "text":
+                text = html.escape(value, quote=False)
+        edit = {"start": start, "end": end, "text": text}
+        new_text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - (end - start)
+
+        # the elements taking the target's place
+        if kind == "attrs":
+            replacement = [
+                _Element(
+                    target.tag,
+                    attrs,
+                    target.raw_tag,
+                    target.self_closing,
+                    target.start,
+                    len(text),
+                    target.content_len,
+                    target.close_len,
+                    target.children,
+                )
+            ]
+        elif kind != "html" and (kind == "text" or node.tag in _RAW_TEXT_ELEMENTS):
+            replacement = [target.resized(delta, [])]
+        else:
+            fragment, whole = _parse(text)
+            if not whole:
+                return edit, DomDocument(new_text)
+            if kind == "html":
+                replacement = [el.moved(target.start) for el in fragment]
+            else:
+                replacement = [target.resized(delta, fragment)]
+
+        count = len(replacement)
+        # copy the path from the target up: later siblings move by delta,
+        # ancestors grow by it
+        roots: List[_Element] = []
+        for level in range(len(key) - 1, -1, -1):
+            siblings = chain[level - 1][0].children if level else self._roots
+            i = key[level]
+            children = siblings[:i] + replacement
+            children.extend(sibling.moved(delta) for sibling in siblings[i + 1 :])
+            if not level:
+                roots = children
+                break
+            replacement = [chain[level - 1][0].resized(delta, children)]
+
+        if count != 1:
+            # later siblings changed paths: index from scratch
+            index = _build_index(roots)
+        else:
+            index = self._reindexed(key, kind, target, roots)
+        return edit, DomDocument(new_text, _roots=roots, _index=index)
+
+    def _reindexed(
+        self, key: NodeKey, kind: str, old: _Element, roots: List[_Element]
+    ) -> _Index:
+        """
+        Index of the edited document: the entries of the replaced subtree
+        (just the element for attribute changes, its descendants for content
+        changes, both for replacements) are swapped for the new ones.
+        """
+        new = _element_at(roots, key)
+        after = key[:-1] + (key[-1] + 1,)
+        if kind == "attrs":
+            old_items = [(key, old)]
+            new_items = [(key, new)]
+        elif kind == "html":
+            old_items = [(p, e) for p, e, _ in _walk([old], key[:-1], key[-1])]
+            new_items = [(p, e) for p, e, _ in _walk([new], key[:-1], key[-1])]
+        else:
+            old_items = [(p, e) for p, e, _ in _walk(old.children, key)]
+            new_items = [(p, e) for p, e, _ in _walk(new.children, key)]
+        added: Dict[Tuple[str, str], List[NodeKey]] = {}
+        for path, element in new_items:
+            for entry in _index_keys(element):
+                added.setdefault(entry, []).append(path)
+        touched = set(added)
+        for _, element in old_items:
+            touched.update(_index_keys(element))
+        index = {kind_: dict(keys) for kind_, keys in self._index.items()}
+        for kind_, name in touched:
+            paths = index[kind_].get(name, [])
+            if kind == "attrs":
+                lo, hi = bisect_left(paths, key), bisect_right(paths, key)
+            elif kind == "html":
+                lo, hi = bisect_left(paths, key), bisect_left(paths, after)
+            else:
+                lo, hi = bisect_right(paths, key), bisect_left(paths, after)
+            merged = paths[:lo] + added.get((kind_, name), []) + paths[hi:]
+            if merged:
+                index[kind_][name] = merged
+            else:
+                index[kind_].pop(name, None)
+        return index
+
+
+def changed_attrs(node: DomNode, changes: Dict[str, Union[str, bool, None]]) -> Attrs:
+    """
+    Attributes of `node` with `changes` applied: existing ones keep their
+    order, new ones are appended, null (or false) removes one and true
+    makes a boolean attribute.
+
+    :raises DomError: on invalid names or values.
+    """
+    for name, value in changes.items():
+        if not _ATTR_NAME_RE.match(name):
+            raise DomError(f"invalid attribute name: {name!r}")
+        if value is not None and not isinstance(value, (str, bool)):
+            raise DomError(f"attribute {name!r} must be a string, true or null")
+    pending = {name.lower(): value for name, value in changes.items()}
+    attrs: Attrs = []
+    for name, value in node.attrs:
+        if name in pending:
+            new = pending.pop(name)
+            if new is None or new is False:
+                continue
+            value = None if new is True else new
+        attrs.append((name, value))
+    for name, new in pending.items():
+        if new is not None and new is not False:
+            attrs.append((name, None if new is True else new))
+    return attrs
+
+
+def start_tag(node: DomNode, attrs: Attrs) -> str:
+    """Serialize the start tag of `node` with the given attributes."""
+    parts = [f"<{node.raw_tag or node.tag}"]
+    for name, value in attrs:
+        if value is None:
+            parts.append(f" {name}")
+        else:
+            parts.append(f' {name}="{html.escape(value, quote=True)}"')
+    parts.append(" />" if node.self_closing else ">")
+    return "".join(parts)
+
+
+@dataclass
+class DomIndex:
+    """
+    Cache of parsed pages keyed by content hash.
+
+    A lookup stats the file; while mtime and size are unchanged the hash
+    remembered for the path is reused, so a hit costs no read. Changed
+    files are read and hashed, and only parsed when no page with the same
+    content is cached (an undo, a duplicated project).
+    """
+
+    max_bytes: int = DOM_CACHE_MAX_BYTES
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _documents: "OrderedDict[str, DomDocument]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    # path -> (mtime_ns, size, content hash)
+    _hashes: Dict[str, Tuple[int, int, str]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _total_bytes: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def document(self, path: Path) -> DomDocument:
+        """
+        Return the parsed page at `path`.
+
+        :raises FileNotFoundError: if the file does not exist.
+        :raises DomError: if it is not valid UTF-8.
+        """
+        key = str(path)
+        st = os.stat(key)
+        with self._lock:
+            known = self._hashes.get(key)
+            if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+                doc = self._documents.get(known[2])
+                if doc is not None:
+                    self.hits += 1
+                    self._documents.move_to_end(doc.hash)
+                    return doc
+        data = Path(key).read_bytes()
+        digest = content_hash(data)
+        with self._lock:
+            self._hashes[key] = (st.st_mtime_ns, st.st_size, digest)
+            doc = self._documents.get(digest)
+            if doc is not None:
+                self.hits += 1
+                self._documents.move_to_end(digest)
+                return doc
+            self.misses += 1
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise DomError("file is not valid UTF-8")
+        doc = DomDocument(text, digest)
+        self.put(doc)
+        return doc
+
+    def file_written(self, project_path: Path, file_path: Path) -> None:
+        """Write listener: forget the remembered hash of a rewritten file."""
+        with self._lock:
+            self._hashes.pop(str(file_path), None)
+
+    def put(self, doc: DomDocument) -> None:
+        """Cache a document built elsewhere (the result of an edit)."""
+        if doc.size > self.max_bytes:
+            return
+        with self._lock:
+            if doc.hash in self._documents:
+                return
+            self._documents[doc.hash] = doc
+            self._total_bytes += doc.size
+            while self._total_bytes > self.max_bytes and len(self._documents) > 1:
+                _, old = self._documents.popitem(last=False)
+                self._total_bytes -= old.size
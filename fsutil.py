@@ -0,0 +1,143 @@
+# fsutil.py — durable file writes with coalesced fsync
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Set
+
+LOG = logging.getLogger(__name__)
+
+# At most one fsync per file per this many seconds
+FSYNC_INTERVAL = 1.0
+
+
+def _new_file_mode() -> int:
+    # os.umask can only be read by setting it: done once, at import
+    mask = os.umask(0)
+    os.umask(mask)
+    return 0o666 & ~mask
+
+
+# Mode of files atomic_write creates, as open() would give them
+NEW_FILE_MODE = _new_file_mode()
+
+# Directory under projects/ for indexes the app rewrites often. Replacing a
+# file directly in projects/ would change its mtime, which tells workers
+# that projects were created or deleted (see ProjectRegistry.sync).
+STATE_DIR_NAME = ".state"
+
+
+def fsync_dir(path: Path) -> None:
+    """fsync a directory so a rename inside it is durable (no-op where unsupported)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, data: bytes, *, fsync: bool = True) -> None:
+    """
+    Replace `path` with `data` atomically: write a temp file in the same
+    directory and rename it over the target. Readers see either the old or
+    the new content, never a partial file. The file keeps its mode (a new
+    one gets NEW_FILE_MODE), not the 0600 of the temp file.
+    """
+    try:
+        mode = path.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            os.fchmod(fh.fileno(), mode)
+            fh.write(data)
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        fsync_dir(path.parent)
+
+
+@dataclass
+class CoalescingWriter:
+    """
+    Atomic writer that rate-limits fsync per file.
+
+    Every write is an immediate atomic replace, so readers always see the
+    latest content. Durability is batched: the first write to a file in an
+    interval is fsynced at once, later ones within FSYNC_INTERVAL only mark
+    the file dirty and a timer fsyncs it when the interval ends. A burst of
+    autosaves therefore costs one fsync per interval instead of one each.
+    """
+
+    interval: float = FSYNC_INTERVAL
+    _last_sync: Dict[str, float] = field(default_factory=dict, init=False, repr=False)
+    _dirty: Set[str] = field(default_factory=set, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def write(self, path: Path, data: bytes) -> None:
+        """Atomically replace `path` with `data`, fsyncing at most once per interval."""
+        key = str(path)
+        now = time.monotonic()
+        with self._lock:
+            due = now - self._last_sync.get(key, 0.0) >= self.interval
+            if due:
+                self._last_sync[key] = now
+                self._dirty.discard(key)
+        if due:
+            atomic_write(path, data, fsync=True)
+            return
+        atomic_write(path, data, fsync=False)
+        with self._lock:
+            if key in self._dirty:
+                return
+            self._dirty.add(key)
+            delay = max(0.0, self._last_sync[key] + self.interval - now)
+        timer = threading.Timer(delay, self._sync, args=(path,))
+        timer.daemon = True
+        timer.start()
+
+    def flush(self) -> None:
+        """fsync every file with writes that are not yet durable."""
+        with self._lock:
+            pending = list(self._dirty)
+        for key in pending:
+            self._sync(Path(key))
+
+    def _sync(self, path: Path) -> None:
+        key = str(path)
+        with self._lock:
+            if key not in self._dirty:
+                return
+            self._dirty.discard(key)
+            self._last_sync[key] = time.monotonic()
+        try:
+            fd = os.open(key, os.O_RDONLY)
+        except OSError:
+            # replaced or removed since; nothing left to make durable
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            LOG.exception("fsync failed for %s", key)
+        finally:
+            os.close(fd)
+        fsync_dir(path.parent)
@@ -0,0 +1,50 @@
+# gunicorn.conf.py — multi-worker deployment with a shared cache and pre-fork warm-up
+"""
+Run with:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Workers share one cache (CACHE_URL, default: a shared-memory file) whose
+generation counters let each worker see the writes of the others. The
+master pre-warms read-only data before forking so workers share it.
+
+The app itself is also created in the master (preload_app), so forking a
+worker costs no imports; background threads start in each worker once it
+has booted. GUNICORN_PRELOAD=0 creates the app in each worker instead.
+
+A live-reload (SSE) stream holds one of a worker's threads for as long as
+its page is open, so each worker serves at most LIVE_MAX_STREAMS of them
+(default 2, keep it below GUNICORN_THREADS) and answers 503 past that.
+Live reload is therefore best-effort here: a refused editor retries with
+backoff and gives up after a few attempts, and its preview then has to be
+refreshed by hand. Deployments with many open editors should run the ASGI
+entry point, which serves the streams without threads:
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "asgi:create_asgi_app()"
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+# inherited by the workers (the default, made explicit); "local" restores
+# per-process caches
+os.environ.setdefault("CACHE_URL", "mmap")
+
+
+def on_starting(server):
+    from app import prewarm
+
+    prewarm()
+
+
+def post_worker_init(worker):
+    # the Flask app, or the ASGI wrapper holding it as `wsgi_app`
+    for app in (worker.wsgi, getattr(worker.wsgi, "wsgi_app", None)):
+        start = getattr(app, "start_background", None)
+        if start is not None:
+            start()
+            return
@@ -0,0 +1,511 @@
+# history.py — per-file version history: periodic full copies plus compressed deltas
+from __future__ import annotations
+
+import bisect
+import difflib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOG = logging.getLogger(__name__)
+
+HISTORY_DIR_NAME = ".history"
+# Versions per keyframe at most: reading a version applies fewer deltas than this
+HISTORY_KEYFRAME_INTERVAL = 32
+# Deltas at least this fraction of the compressed full copy are stored full instead
+HISTORY_KEYFRAME_RATIO = 0.25
+# New versions of a file between automatic compactions
+HISTORY_COMPACT_EVERY = 256
+# Age-based retention as (max age, spacing) in seconds: within each tier one
+# version per `spacing` is kept (0 keeps all); older versions are dropped.
+HISTORY_RETENTION: Tuple[Tuple[float, float], ...] = (
+    (24 * 3600, 0),
+    (7 * 24 * 3600, 3600),
+    (180 * 24 * 3600, 24 * 3600),
+)
+
+_INDEX_NAME = "index.jsonl"
+_PACK_NAME = "data.pack"
+_OP_COPY = struct.Struct(">BII")  # 0, first line, end line (of the base)
+_OP_INSERT = struct.Struct(">BI")  # 1, byte length; followed by the bytes
+
+
+def make_delta(base: bytes, new: bytes) -> bytes:
+    """
+    Encode `new` as line copies from `base` plus inserted bytes.
+    The common prefix and suffix are matched first, so the usual local edit
+    costs one SequenceMatcher run over the changed lines only.
+    """
+    a = base.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while (
+        tail < len(a) - head
+        and tail < len(b) - head
+        and a[len(a) - 1 - tail] == b[len(b) - 1 - tail]
+    ):
+        tail += 1
+
+    out: List[bytes] = []
+    if head:
+        out.append(_OP_COPY.pack(0, 0, head))
+    matcher = difflib.SequenceMatcher(
+        None, a[head:len(a) - tail], b[head:len(b) - tail], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            out.append(_OP_COPY.pack(0, head + i1, head + i2))
+        elif j2 > j1:
+            text = b"".join(b[head + j1:head + j2])
+            out.append(_OP_INSERT.pack(1, len(text)) + text)
+    if tail:
+        out.append(_OP_COPY.pack(0, len(a) - tail, len(a)))
+    return b"".join(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild the content `make_delta(base, new)` was computed for."""
+    lines = base.splitlines(keepends=True)
+    out: List[bytes] = []
+    pos = 0
+    while pos < len(delta):
+        if delta[pos] == 0:
+            _, start, end = _OP_COPY.unpack_from(delta, pos)
+            out.extend(lines[start:end])
+            pos += _OP_COPY.size
+        else:
+            _, length = _OP_INSERT.unpack_from(delta, pos)
+            pos += _OP_INSERT.size
+            out.append(delta[pos:pos + length])
+            pos += length
+    return b"".join(out)
+
+
+def retained(versions: List["VersionInfo"], now: float) -> List["VersionInfo"]:
+    """
+    Apply HISTORY_RETENTION: keep the newest version of each time bucket of
+    its age tier. The newest version overall is always kept.
+    """
+    keep: List[VersionInfo] = []
+    seen_buckets = set()
+    for info in reversed(versions):
+        age = now - info.time
+        tier = next(
+            (i for i, (limit, _) in enumerate(HISTORY_RETENTION) if age <= limit), None
+        )
+        if tier is None:
+            if not keep:
+                keep.append(info)
+            continue
+        spacing = HISTORY_RETENTION[tier][1]
+        if spacing:
+            bucket = (tier, int(info.time // spacing))
+            if bucket in seen_buckets:
+                continue
+            seen_buckets.add(bucket)
+        keep.append(info)
+    keep.reverse()
+    return keep
+
+
+@dataclass
+class VersionInfo:
+    """Index entry of one stored version."""
+
+    version: int
+    time: float
+    size: int
+    hash: str  # SHA-1 of the content (same digest as the served ETag)
+    full: bool
+    offset: int
+    length: int
+
+    def to_row(self) -> list:
+        return [
+            self.version,
+            round(self.time, 3),
+            self.size,
+            self.hash,
+            int(self.full),
+            self.offset,
+            self.length,
+        ]
+
+    @classmethod
+    def from_row(cls, row: list) -> "VersionInfo":
+        v, t, size, digest, full, offset, length = row
+        return cls(int(v), float(t), int(size), str(digest), bool(full), offset, length)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "time": self.time,
+            "size": self.size,
+            "hash": self.hash,
+            "kind": "full" if self.full else "delta",
+        }
+
+
+@dataclass
+class _FileHistory:
+    """Loaded index and write state of one tracked file."""
+
+    path: Path
+    versions: List[VersionInfo] = field(default_factory=list)
+    pack_size: int = 0
+    # bytes of the index read so far, and the directory they were read from
+    # (compaction replaces it), to pick up what other processes appended
+    index_size: int = 0
+    dir_ino: Optional[int] = None
+    latest: Optional[bytes] = None  # content of versions[-1], once known
+    since_keyframe: int = 0
+    since_compact: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class HistoryStore:
+    """
+    Version history of project files under `root/<project>/<file>/`.
+
+    Every version is appended to a pack file, either as a zlib-compressed
+    full copy (a keyframe) or as a compressed line delta against the
+    previous version, with one JSON line per version in an index. A
+    keyframe is written at least every HISTORY_KEYFRAME_INTERVAL versions,
+    so reading any version applies a bounded number of deltas. Storage
+    grows with the size of edits, not of the file.
+
+    Compaction thins old versions per HISTORY_RETENTION and rewrites the
+    pack; it runs in the background every HISTORY_COMPACT_EVERY versions.
+    Version numbers never change.
+
+    Several processes (gunicorn workers) may share `root`: appends and
+    compactions hold an exclusive flock on the file's history directory,
+    reads a shared one, and each first rereads what the others wrote.
+    """
+
+    root: Path
+    _files: Dict[Tuple[str, str], _FileHistory] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def project_dir(self, project: str) -> Path:
+        return self.root / project
+
+    def record(
+        self,
+        project: str,
+        name: str,
+        data: bytes,
+        *,
+        previous: Optional[bytes] = None,
+        now: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Store `data` as the newest version of `project/name`.
+
+        :param previous: The content being replaced. If the history does not
+            end with it (first save, or an edit made outside the app), it is
+            stored first so nothing is lost.
+        :return: The new version number, or None if `data` equals the newest version.
+        """
+        now = time.time() if now is None else now
+        digest = _sha1(data)
+        fh = self._load(project, name)
+        with fh.lock, self._locked(fh, exclusive=True):
+            last_hash = fh.versions[-1].hash if fh.versions else None
+            if previous is not None and _sha1(previous) not in (last_hash, digest):
+                self._append(fh, previous, now)
+            if fh.versions and fh.versions[-1].hash == digest:
+                return None
+            info = self._append(fh, data, now)
+            fh.since_compact += 1
+            compact = fh.since_compact >= HISTORY_COMPACT_EVERY
+            if compact:
+                fh.since_compact = 0
+        if compact:
+            self._background(lambda: self.compact(project, name))
+        return info.version
+
+    def versions(self, project: str, name: str) -> List[VersionInfo]:
+        """All stored versions of `project/name`, oldest first."""
+        fh = self._load(project, name)
+        with fh.lock, self._locked(fh):
+            return list(fh.versions)
+
+    def get(self, project: str, name: str, version: int) -> bytes:
+        """
+        Content of one version: its keyframe plus at most
+        HISTORY_KEYFRAME_INTERVAL - 1 deltas.
+
+        :raises KeyError: if the version does not exist (or was compacted away).
+        """
+        fh = self._load(project, name)
+        with fh.lock, self._locked(fh):
+            newest = fh.versions[-1].version if fh.versions else None
+            if version == newest and fh.latest is not None:
+                return fh.latest
+            return self._materialize(fh, version)
+
+    def diff(
+        self, project: str, name: str, a: int, b: Optional[int], current: bytes
+    ) -> str:
+        """Unified diff from version `a` to version `b` (None: `current`)."""
+        old = self.get(project, name, a)
+        new = current if b is None else self.get(project, name, b)
+        return "".join(
+            difflib.unified_diff(
+                old.decode("utf-8", "replace").splitlines(keepends=True),
+                new.decode("utf-8", "replace").splitlines(keepends=True),
+                fromfile=f"{name}@{a}",
+                tofile=f"{name}@{b if b is not None else 'current'}",
+            )
+        )
+
+    def compact(
+        self, project: str, name: str, now: Optional[float] = None
+    ) -> Tuple[int, int]:
+        """
+        Drop versions HISTORY_RETENTION no longer keeps and rewrite the pack
+        with fresh keyframes. Returns (versions before, versions after).
+        """
+        now = time.time() if now is None else now
+        fh = self._load(project, name)
+        with fh.lock, self._locked(fh, exclusive=True):
+            before = len(fh.versions)
+            keep = {v.version for v in retained(fh.versions, now)}
+            if len(keep) == before:
+                return before, before
+            staging = fh.path.with_name(f".{fh.path.name}.compact")
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            fresh = _FileHistory(staging)
+            # walk forward once, so each version is rebuilt from its predecessor
+            content = b""
+            with (fh.path / _PACK_NAME).open("rb") as pack:
+                for info in fh.versions:
+                    blob = _read_at(pack, info)
+                    content = blob if info.full else apply_delta(content, blob)
+                    if info.version in keep:
+                        self._append(fresh, content, info.time, version=info.version)
+            old = fh.path.with_name(f".{fh.path.name}.old")
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(fh.path, old)
+            os.rename(staging, fh.path)
+            shutil.rmtree(old, ignore_errors=True)
+            fh.versions = fresh.versions
+            fh.pack_size = fresh.pack_size
+            fh.index_size = fresh.index_size
+            fh.dir_ino = os.stat(fh.path).st_ino
+            fh.since_keyframe = fresh.since_keyframe
+        LOG.info(
+            "Compacted history of %s/%s: %d -> %d versions",
+            project,
+            name,
+            before,
+            len(keep),
+        )
+        return before, len(keep)
+
+    def forget_project(self, project: str) -> None:
+        """Drop in-memory state of a project; the caller removes its directory."""
+        with self._lock:
+            for key in [k for k in self._files if k[0] == project]:
+                del self._files[key]
+
+    # ---- storage ----
+    def _load(self, project: str, name: str) -> _FileHistory:
+        key = (project, name)
+        with self._lock:
+            fh = self._files.get(key)
+            if fh is not None:
+                return fh
+            fh = _FileHistory(self.project_dir(project) / name)
+            self._files[key] = fh
+            # loaded under the store lock: first use of a file is rare and fast
+            self._read_index(fh)
+            return fh
+
+    @contextmanager
+    def _locked(self, fh: _FileHistory, exclusive: bool = False) -> Iterator[None]:
+        """
+        Hold the flock of fh's directory (shared for reads) and bring fh up
+        to date with what other processes wrote. A history that does not
+        exist yet is only created, and locked, for writes.
+        """
+        while True:
+            if exclusive:
+                fh.path.mkdir(parents=True, exist_ok=True)
+            try:
+                fd = os.open(fh.path, os.O_RDONLY | os.O_DIRECTORY)
+            except FileNotFoundError:
+                self._read_index(fh)
+                yield
+                return
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    current = os.stat(fh.path).st_ino == os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    current = False
+                # else compacted while we waited: lock the new directory
+                if current:
+                    self._refresh(fh)
+                    yield
+                    return
+            finally:
+                os.close(fd)  # releases the lock
+
+    def _refresh(self, fh: _FileHistory) -> None:
+        try:
+            ino: Optional[int] = os.stat(fh.path).st_ino
+        except OSError:
+            ino = None
+        if ino != fh.dir_ino:
+            self._read_index(fh)
+        else:
+            self._read_new(fh)
+
+    def _read_index(self, fh: _FileHistory) -> None:
+        """(Re)load the whole index of fh."""
+        fh.versions = []
+        fh.pack_size = fh.index_size = fh.since_keyframe = 0
+        fh.latest = None
+        try:
+            fh.dir_ino = os.stat(fh.path).st_ino
+        except OSError:
+            fh.dir_ino = None
+            return
+        self._read_new(fh)
+
+    def _read_new(self, fh: _FileHistory) -> None:
+        """Read the index lines appended since fh was last read."""
+        try:
+            pack_size = (fh.path / _PACK_NAME).stat().st_size
+            with (fh.path / _INDEX_NAME).open("rb") as index:
+                index.seek(fh.index_size)
+                chunk = index.read()
+        except OSError:
+            return
+        # a line still being written is read next time
+        chunk = chunk[: chunk.rfind(b"\n") + 1]
+        fh.index_size += len(chunk)
+        fh.pack_size = pack_size
+        added = False
+        for line in chunk.splitlines():
+            try:
+                info = VersionInfo.from_row(json.loads(line))
+            except (ValueError, TypeError):
+                continue
+            # an index line written after a torn pack append is ignored
+            if info.offset + info.length > pack_size:
+                continue
+            if fh.versions and info.version <= fh.versions[-1].version:
+                continue
+            fh.versions.append(info)
+            added = True
+        if not added:
+            return
+        # written by another process: the newest content is not known here
+        fh.latest = None
+        # versions since (and including) the newest keyframe
+        fh.since_keyframe = 0
+        for info in reversed(fh.versions):
+            fh.since_keyframe += 1
+            if info.full:
+                break
+
+    def _append(
+        self, fh: _FileHistory, data: bytes, now: float, version: Optional[int] = None
+    ) -> VersionInfo:
+        """Append one version; the caller holds fh's directory lock (or owns fh)."""
+        full = zlib.compress(data, 9)
+        blob, is_full = full, True
+        if fh.versions and fh.since_keyframe < HISTORY_KEYFRAME_INTERVAL:
+            base = fh.latest if fh.latest is not None else self._materialize(
+                fh, fh.versions[-1].version
+            )
+            delta = zlib.compress(make_delta(base, data), 9)
+            if len(delta) < HISTORY_KEYFRAME_RATIO * len(full) or len(delta) < 64:
+                blob, is_full = delta, False
+        if version is None:
+            version = fh.versions[-1].version + 1 if fh.versions else 1
+        fh.path.mkdir(parents=True, exist_ok=True)
+        with (fh.path / _PACK_NAME).open("ab") as pack:
+            # the real end of the pack (past any torn append), not a cached size
+            offset = pack.seek(0, os.SEEK_END)
+            pack.write(blob)
+        info = VersionInfo(
+            version, now, len(data), _sha1(data), is_full, offset, len(blob)
+        )
+        line = (json.dumps(info.to_row(), separators=(",", ":")) + "\n").encode()
+        with (fh.path / _INDEX_NAME).open("ab") as index:
+            end = index.seek(0, os.SEEK_END)
+            if end > fh.index_size:
+                # end a line torn by a crash so it does not swallow this one
+                line = b"\n" + line
+            index.write(line)
+        fh.pack_size = offset + len(blob)
+        fh.index_size = end + len(line)
+        fh.versions.append(info)
+        fh.latest = data
+        fh.since_keyframe = 1 if is_full else fh.since_keyframe + 1
+        return info
+
+    def _materialize(self, fh: _FileHistory, version: int) -> bytes:
+        # version numbers are increasing, so the index can be bisected
+        numbers = [v.version for v in fh.versions]
+        pos = bisect.bisect_left(numbers, version)
+        if pos == len(numbers) or numbers[pos] != version:
+            raise KeyError(version)
+        start = pos
+        while not fh.versions[start].full:
+            start -= 1
+        content = b""
+        with (fh.path / _PACK_NAME).open("rb") as pack:
+            for info in fh.versions[start:pos + 1]:
+                blob = _read_at(pack, info)
+                content = blob if info.full else apply_delta(content, blob)
+        return content
+
+    def _background(self, fn) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="history"
+                )
+            executor = self._executor
+
+        def run() -> None:
+            try:
+                fn()
+            except Exception:
+                LOG.exception("History compaction failed")
+
+        executor.submit(run)
+
+
+def _read_at(pack, info: VersionInfo) -> bytes:
+    pack.seek(info.offset)
+    return zlib.decompress(pack.read(info.length))
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
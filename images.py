@@ -0,0 +1,279 @@
+# images.py — responsive image variants rendered on a process pool
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LOG = logging.getLogger(__name__)
+
+VARIANTS_DIR_NAME = ".variants"
+IMAGE_VARIANT_WIDTHS: Tuple[int, ...] = (320, 640, 1024, 1600)
+IMAGE_VARIANT_FORMATS: Tuple[str, ...] = ("avif", "webp")
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANT_QUALITY = 80
+# Seconds a render may take; gc() leaves younger unlinked files alone
+IMAGE_VARIANT_RENDER_TIMEOUT = 600.0
+# Start method of the render processes: not "fork", which would copy the
+# locks held by the server's threads (import, logging) into the children
+IMAGE_VARIANT_START_METHOD = "forkserver"
+
+# Source formats worth resizing (vector and animated formats are left alone)
+_RESIZABLE_EXT = {"png", "jpg", "jpeg", "webp"}
+_MIME = {"webp": "image/webp", "avif": "image/avif"}
+
+
+def pillow_formats(requested: Sequence[str]) -> List[str]:
+    """Return the requested output formats Pillow can write here ([] without Pillow)."""
+    try:
+        from PIL import features
+    except ImportError:
+        return []
+    return [f for f in requested if features.check(f)]
+
+
+def render_variants(
+    src: str, out_dir: str, widths: Sequence[int], formats: Sequence[str], quality: int
+) -> List[str]:
+    """
+    Process-pool worker: write `<width>.<format>` files for `src` into `out_dir`.
+    Files are written under temp names and renamed, so readers never see
+    partial output. Returns the file names written.
+    """
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+        for width in widths:
+            height = max(1, round(im.height * width / im.width))
+            resized = im.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                name = f"{width}.{fmt}"
+                tmp = os.path.join(out_dir, f".{name}.{os.getpid()}.tmp")
+                resized.save(tmp, format=fmt.upper(), quality=quality)
+                os.replace(tmp, os.path.join(out_dir, name))
+                written.append(name)
+    return written
+
+
+@dataclass
+class Variant:
+    """One planned output image."""
+
+    path: str  # project-relative
+    width: int
+    format: str
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "width": self.width, "type": _MIME[self.format]}
+
+
+@dataclass
+class ImageVariantPipeline:
+    """
+    Generate resized WebP/AVIF variants of uploaded images off the request thread.
+
+    `process` reads only the image header, returns the variant paths at
+    once, and renders them on a ProcessPoolExecutor. Output is cached
+    under `cache_dir/<sha256>/` so re-uploading the same content only
+    links the existing files into the project.
+
+    Renders read an immutable source: the content-addressed blob
+    (`source_path`) when the upload went through the blob store, else a
+    snapshot of the upload, so overwriting it meanwhile cannot put other
+    content under the old hash.
+    """
+
+    cache_dir: Path
+    widths: Sequence[int] = IMAGE_VARIANT_WIDTHS
+    formats: Sequence[str] = IMAGE_VARIANT_FORMATS
+    max_workers: int = IMAGE_VARIANT_WORKERS
+    quality: int = IMAGE_VARIANT_QUALITY
+    # callable(project_path, file_path, previous_size) run when a variant lands
+    on_linked: Optional[Callable[[Path, Path, Optional[int]], None]] = None
+    # callable(sha256) -> path of the blob with that content (BlobStore.blob_path)
+    source_path: Optional[Callable[[str], Path]] = None
+    # uploads whose variants were already rendered (by content hash) / not
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _executor: Optional[ProcessPoolExecutor] = field(default=None, init=False, repr=False)
+    _formats: Optional[List[str]] = field(default=None, init=False, repr=False)
+    _pending: Dict[str, Future] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def available(self) -> bool:
+        """True if Pillow is installed and can write at least one format."""
+        if self._formats is None:
+            self._formats = pillow_formats(self.formats)
+            if not self._formats:
+                LOG.info("Image variants disabled (Pillow or encoders unavailable)")
+        return bool(self._formats)
+
+    def process(
+        self, project_path: Path, rel: str, digest: Optional[str] = None
+    ) -> List[Variant]:
+        """
+        Plan variants for `project_path/rel` and render them in the background.
+
+        :param digest: SHA-256 of the source if already known (blob store).
+        :return: Variants that will appear at their paths once rendered.
+        """
+        ext = rel.rsplit(".", 1)[-1].lower() if "." in rel else ""
+        if ext not in _RESIZABLE_EXT or not self.available():
+            return []
+        src = project_path / rel
+        snapshot: Optional[bytes] = None
+        if digest is not None and self.source_path is not None:
+            src = self.source_path(digest)
+        else:
+            try:
+                snapshot = src.read_bytes()
+            except OSError:
+                return []
+            digest = hashlib.sha256(snapshot).hexdigest()
+        try:
+            from PIL import Image
+
+            header = io.BytesIO(snapshot) if snapshot is not None else src
+            with Image.open(header) as im:
+                width = im.width
+        except Exception:
+            LOG.debug("Not a readable image, skipping variants: %s", src)
+            return []
+        widths = [w for w in self.widths if w < width]
+        if not widths:
+            return []
+        stem = PurePosixPath(rel)
+        variants = [
+            Variant(str(stem.with_name(f"{stem.stem}-{w}w.{fmt}")), w, fmt)
+            for w in widths
+            for fmt in self._formats or []
+        ]
+
+        out_dir = self.cache_dir / digest
+        missing = [
+            v for v in variants if not (out_dir / f"{v.width}.{v.format}").exists()
+        ]
+        if not missing:
+            self.hits += 1
+            self._link_all(project_path, out_dir, variants)
+            return variants
+        self.misses += 1
+
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is None:
+                out_dir.mkdir(parents=True, exist_ok=True)
+                if snapshot is not None:
+                    src = out_dir / f".source.{secrets.token_hex(4)}"
+                    src.write_bytes(snapshot)
+                future = self._pool().submit(
+                    render_variants,
+                    str(src),
+                    str(out_dir),
+                    sorted({v.width for v in missing}),
+                    sorted({v.format for v in missing}),
+                    self.quality,
+                )
+                self._pending[digest] = future
+                future.add_done_callback(lambda f, d=digest: self._forget(d, f))
+                if snapshot is not None:
+                    future.add_done_callback(lambda f, p=src: p.unlink(missing_ok=True))
+
+        def link_when_done(f: Future) -> None:
+            if f.exception() is None:
+                self._link_all(project_path, out_dir, variants)
+
+        future.add_done_callback(link_when_done)
+        return variants
+
+    def gc(self) -> int:
+        """
+        Remove cached variants no project links to anymore. Files younger
+        than IMAGE_VARIANT_RENDER_TIMEOUT may be a render not linked yet and
+        are kept. Returns files removed.
+        """
+        removed = 0
+        if not self.cache_dir.is_dir():
+            return 0
+        cutoff = time.time() - IMAGE_VARIANT_RENDER_TIMEOUT
+        for d in self.cache_dir.iterdir():
+            for f in d.iterdir():
+                try:
+                    st = f.stat()
+                    if st.st_nlink <= 1 and st.st_mtime < cutoff:
+                        f.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+        return removed
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(IMAGE_VARIANT_START_METHOD),
+            )
+        return self._executor
+
+    def _forget(self, digest: str, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(digest) is future:
+                del self._pending[digest]
+        if future.exception() is not None:
+            LOG.warning(
+                "Rendering image variants %s failed: %s", digest, future.exception()
+            )
+
+    def _link_all(self, project_path: Path, out_dir: Path, variants: List[Variant]) -> None:
+        for v in variants:
+            src = out_dir / f"{v.width}.{v.format}"
+            dest = project_path / v.path
+            tmp = dest.with_name(f".{dest.name}.{secrets.token_hex(4)}.tmp")
+            try:
+                previous_size: Optional[int] = dest.stat().st_size
+            except OSError:
+                previous_size = None
+            try:
+                try:
+                    os.link(src, tmp)
+                except OSError:
+                    shutil.copyfile(src, tmp)
+                os.replace(tmp, dest)
+            except OSError:
+                # the project may have been deleted meanwhile
+                LOG.debug("Could not link variant %s", dest, exc_info=True)
+                tmp.unlink(missing_ok=True)
+                continue
+            if self.on_linked is not None:
+                self.on_linked(project_path, dest, previous_size)
+
+
+def srcset(variants: List[Variant]) -> Dict[str, str]:
+    """Group variants into one srcset string per MIME type."""
+    out: Dict[str, List[str]] = {}
+    for v in variants:
+        out.setdefault(_MIME[v.format], []).append(f"{v.path} {v.width}w")
+    return {mime: ", ".join(items) for mime, items in out.items()}
@@ -0,0 +1,349 @@
+# live.py — live-reload change notifications (SSE hub + inotify watcher)
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+LOG = logging.getLogger(__name__)
+
+# Seconds between SSE keep-alive comments
+SSE_HEARTBEAT = 15.0
+# Events buffered per subscriber before it is considered too slow
+SSE_QUEUE_SIZE = 256
+# Sent instead of a backlog the subscriber fell too far behind on
+_RELOAD_EVENT = {"file": None, "hash": None, "kind": "reload", "deleted": False}
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def file_kind(rel: str) -> str:
+    """Classify a changed file so clients know how to apply it."""
+    ext = rel.rsplit(".", 1)[-1].lower() if "." in rel else ""
+    if ext == "css":
+        return "css"
+    if ext in ("html", "htm"):
+        return "html"
+    if ext == "js":
+        return "js"
+    return "asset"
+
+
+def hash_file(path: Path) -> Optional[str]:
+    """SHA-1 of a file (same digest as the served ETag), or None if unreadable."""
+    digest = hashlib.sha1()
+    try:
+        with path.open("rb") as fh:
+            for block in iter(lambda: fh.read(64 * 1024), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watches on project trees, serviced by one thread.
+
+    `callback(project, rel_path, deleted)` is called for every file that
+    was written, moved in, or removed. Dot-prefixed names (temp files of
+    atomic writes) are ignored. Only available on Linux.
+    """
+
+    def __init__(self, callback: Callable[[str, str, bool], None]):
+        self.callback = callback
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # wd -> (project, directory relative to the project root, absolute dir)
+        self._watches: Dict[int, Tuple[str, str, Path]] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="inotify", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    def watch(self, project: str, root: Path) -> None:
+        """Watch `root` and all its subdirectories on behalf of `project`."""
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            rel = os.path.relpath(dirpath, root)
+            self._add(project, "" if rel == "." else rel.replace(os.sep, "/"), Path(dirpath))
+
+    def unwatch(self, project: str) -> None:
+        """Drop every watch held for `project`."""
+        with self._lock:
+            wds = [wd for wd, (p, _, _) in self._watches.items() if p == project]
+            for wd in wds:
+                self._watches.pop(wd, None)
+                self._rm_watch(self._fd, wd)
+
+    def _add(self, project: str, rel_dir: str, path: Path) -> None:
+        wd = self._add_watch(self._fd, os.fsencode(str(path)), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            LOG.debug("inotify_add_watch failed for %s: %s", path, os.strerror(err))
+            return
+        with self._lock:
+            self._watches[wd] = (project, rel_dir, path)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                select.select([self._fd], [], [])
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                LOG.exception("inotify read failed; watcher stopped")
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            start = offset + _EVENT_HEADER.size
+            raw = data[start:start + length]
+            offset = start + length
+            name = raw.rstrip(b"\0").decode("utf-8", "surrogateescape")
+            with self._lock:
+                info = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+            if info is None or not name or name.startswith("."):
+                continue
+            project, rel_dir, dir_path = info
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.watch_subdir(project, rel, dir_path / name)
+                continue
+            deleted = bool(mask & (IN_DELETE | IN_MOVED_FROM))
+            if deleted or mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                try:
+                    self.callback(project, rel, deleted)
+                except Exception:
+                    LOG.exception("live-reload callback failed for %s/%s", project, rel)
+
+    def watch_subdir(self, project: str, rel: str, path: Path) -> None:
+        """Start watching a directory created inside a watched project."""
+        for dirpath, dirnames, _ in os.walk(path):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            sub = os.path.relpath(dirpath, path)
+            sub_rel = rel if sub == "." else f"{rel}/{sub.replace(os.sep, '/')}"
+            self._add(project, sub_rel, Path(dirpath))
+
+
+class AsyncSubscription:
+    """
+    Event queue of a subscriber served by an asyncio event loop (the ASGI
+    SSE stream). `put_nowait` may be called from any thread; it never
+    raises, an overflowing backlog is replaced by one "reload" event.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+    def put_nowait(self, event: dict) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:
+            # loop already closed: the stream is gone, unsubscribe will follow
+            pass
+
+    async def get(self) -> dict:
+        return await self._queue.get()
+
+    def _deliver(self, event: dict) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            LOG.debug("live-reload queue full for async subscriber")
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(_RELOAD_EVENT)
+
+Subscriber = Union["queue.Queue[dict]", AsyncSubscription]
+
+
+@dataclass
+class LiveReloadHub:
+    """
+    Fan out file-change events to SSE subscribers, per project.
+
+    Events come from the app's own writes (`notify`, wired to
+    ProjectManager.file_written) and from one shared inotify watcher for
+    changes made outside the app. A project is only watched while it has
+    at least one subscriber, and consecutive events with the same content
+    hash for a file are collapsed, so an app save seen again by inotify is
+    announced once.
+    """
+
+    projects_dir: Path
+    _subscribers: Dict[str, Set[Subscriber]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _last_hash: Dict[Tuple[str, str], Optional[str]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _watcher: Optional[InotifyWatcher] = field(default=None, init=False, repr=False)
+    _watcher_failed: bool = field(default=False, init=False, repr=False)
+    _watched: Set[str] = field(default_factory=set, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    # serializes watch/unwatch, which run outside _lock (inotify calls back
+    # into `notify`, which takes it)
+    _watch_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def subscribe(self, project: str) -> "queue.Queue[dict]":
+        """Register a subscriber for `project` and return its event queue."""
+        q: "queue.Queue[dict]" = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._add(project, q)
+        return q
+
+    def subscribe_async(
+        self, project: str, loop: asyncio.AbstractEventLoop
+    ) -> AsyncSubscription:
+        """Like `subscribe`, for a subscriber awaiting events on `loop`."""
+        sub = AsyncSubscription(loop)
+        self._add(project, sub)
+        return sub
+
+    def _add(self, project: str, q: Subscriber) -> None:
+        with self._lock:
+            subs = self._subscribers.setdefault(project, set())
+            first = not subs
+            subs.add(q)
+        if first:
+            self._sync_watch(project)
+
+    def unsubscribe(self, project: str, q: Subscriber) -> None:
+        """Remove a subscriber; the last one for a project stops its watch."""
+        with self._lock:
+            subs = self._subscribers.get(project)
+            if subs is None:
+                return
+            subs.discard(q)
+            last = not subs
+            if last:
+                del self._subscribers[project]
+                for key in [k for k in self._last_hash if k[0] == project]:
+                    del self._last_hash[key]
+        if last:
+            self._sync_watch(project)
+
+    def _sync_watch(self, project: str) -> None:
+        """
+        Watch `project` if it has subscribers, else drop its watch. The count
+        is read under _watch_lock, so a subscribe racing the last unsubscribe
+        is never left without a watch, whichever of the two syncs runs last.
+        """
+        with self._watch_lock:
+            watcher = self._get_watcher()
+            if watcher is None:
+                return
+            with self._lock:
+                wanted = bool(self._subscribers.get(project))
+            if wanted and project not in self._watched:
+                watcher.watch(project, self.projects_dir / project)
+                self._watched.add(project)
+            elif not wanted and project in self._watched:
+                watcher.unwatch(project)
+                self._watched.discard(project)
+
+    def subscriber_count(self, project: Optional[str] = None) -> int:
+        with self._lock:
+            if project is not None:
+                return len(self._subscribers.get(project, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def file_written(self, project_path: Path, file_path: Path) -> None:
+        """Write hook for ProjectManager: announce an in-app save or upload."""
+        rel = os.path.relpath(file_path, project_path).replace(os.sep, "/")
+        self.notify(project_path.name, rel)
+
+    def notify(self, project: str, rel: str, deleted: bool = False) -> None:
+        """Publish a change of `project/rel` to the project's subscribers."""
+        with self._lock:
+            if not self._subscribers.get(project):
+                return
+        digest = None if deleted else hash_file(self.projects_dir / project / rel)
+        key = (project, rel)
+        with self._lock:
+            if key in self._last_hash and self._last_hash[key] == digest:
+                return
+            self._last_hash[key] = digest
+            subs = list(self._subscribers.get(project, ()))
+        event = {
+            "file": rel,
+            "hash": digest,
+            "kind": file_kind(rel),
+            "deleted": deleted or digest is None,
+        }
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # slow client: replace its backlog with a single full-reload event
+                LOG.debug("live-reload queue full for %s", project)
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait(_RELOAD_EVENT)
+
+    def _get_watcher(self) -> Optional[InotifyWatcher]:
+        with self._lock:
+            if self._watcher is not None or self._watcher_failed:
+                return self._watcher
+            if not InotifyWatcher.available():
+                self._watcher_failed = True
+                return None
+            try:
+                self._watcher = InotifyWatcher(self.notify)
+            except (OSError, AttributeError) as e:
+                LOG.warning("inotify unavailable (%s); only in-app changes are pushed", e)
+                self._watcher_failed = True
+            return self._watcher
+
+
+def sse_format(event: str, data: str) -> str:
+    """Format one Server-Sent Event."""
+    lines: List[str] = [f"event: {event}"]
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,312 @@
+# metrics.py — in-process counters, gauges and histograms in Prometheus text format
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LOG = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_PREFIX = "htmlcreator_"
+
+# Latency buckets (seconds) for requests and filesystem operations
+REQUEST_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0
+)
+FS_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 2.5)
+
+# (labels, value) pairs of one metric, as returned by collectors
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base of all metric families: a name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for one combination of label values (cached)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._items():
+            lines.extend(self._render_child(dict(zip(self.labelnames, key)), child))
+        return lines
+
+    def _render_child(self, labels: Dict[str, str], child) -> List[str]:
+        return [f"{self.name}{_label_text(labels)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests served or bytes sent."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        slot = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("_target", "_start")
+
+    def __init__(self, target: _HistogramValue):
+        self._target = target
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._target.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets (plus sum and count)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = REQUEST_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, labels: Dict[str, str], child) -> List[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            le = dict(labels, le=_number(bound))
+            lines.append(f"{self.name}_bucket{_label_text(le)} {running}")
+        lines.append(f"{self.name}_sum{_label_text(labels)} {_number(total)}")
+        lines.append(f"{self.name}_count{_label_text(labels)} {running}")
+        return lines
+
+
+class Collected(_Metric):
+    """
+    A metric read from elsewhere at scrape time (cache counters, queue
+    sizes, ...): `collect()` returns its current (labels, value) pairs, so
+    the hot path pays nothing for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        collect: Callable[[], Samples],
+    ):
+        super().__init__(name, help)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            samples = list(self.collect())
+        except Exception:
+            LOG.exception("metrics collector %s failed", self.name)
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in samples:
+            lines.append(f"{self.name}{_label_text(labels)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics rendered by /metrics."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add `metric`, replacing one of the same name (e.g. from an earlier app)."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_add(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = REQUEST_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_add(Histogram, name, help, labelnames, buckets=buckets)
+
+    def collected(
+        self, name: str, help: str, collect: Callable[[], Samples], kind: str = "gauge"
+    ) -> Collected:
+        metric = Collected(name, help, kind, collect)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        """The whole registry in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _get_or_add(self, cls, name: str, help: str, labelnames, **kwargs):
+        full = METRICS_PREFIX + name
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{full} is already registered as a {metric.kind}")
+        return metric
+
+
+# Process-wide registry; metrics are per process (scrape each worker)
+REGISTRY = MetricsRegistry()
+
+FS_OPERATIONS = REGISTRY.histogram(
+    "fs_operation_seconds",
+    "Time spent in filesystem operations of the managers.",
+    ("manager", "op"),
+    buckets=FS_BUCKETS,
+)
+
+
+def fs_timed(manager: str, op: str):
+    """Decorator recording calls of a manager method in FS_OPERATIONS."""
+    child = FS_OPERATIONS.labels(manager, op)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def cache_samples(caches: Dict[str, object], attr: str) -> Samples:
+    """
+    (labels, value) of `attr` ("hits"/"misses") for each named cache. A
+    cache built on first use is given as a callable returning it or None.
+    """
+    samples: Samples = []
+    for name, cache in caches.items():
+        if callable(cache):
+            cache = cache()
+        samples.append(({"cache": name}, getattr(cache, attr, 0)))
+    return samples
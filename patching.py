@@ -0,0 +1,130 @@
+# patching.py — apply range edits or unified diffs to text documents
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import List, Sequence
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """The patch is malformed or does not apply to the base document."""
+
+
+class PatchConflict(PatchError):
+    """The base hash sent by the client does not match the current document."""
+
+    def __init__(self, current_hash: str):
+        super().__init__("base hash mismatch")
+        self.current_hash = current_hash
+
+
+def content_hash(data: bytes) -> str:
+    """Hash used for base-version checks (same as the served file's ETag)."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def apply_edits(text: str, edits: Sequence[dict]) -> str:
+    """
+    Apply range edits to `text`.
+
+    Each edit is {"start": int, "end": int, "text": str}, with offsets in
+    characters (code points) of the *base* document. Edits must not overlap.
+    """
+    if not isinstance(edits, (list, tuple)):
+        raise PatchError("edits must be a list")
+    parsed = []
+    for e in edits:
+        if not isinstance(e, dict):
+            raise PatchError("edit must be an object")
+        repl = e.get("text", "")
+        if not isinstance(repl, str):
+            raise PatchError("edit text must be a string")
+        try:
+            start, end = int(e["start"]), int(e["end"])
+        except (KeyError, TypeError, ValueError):
+            raise PatchError("edit needs integer start/end and text")
+        if not 0 <= start <= end <= len(text):
+            raise PatchError(f"edit range out of bounds: {start}-{end}")
+        parsed.append((start, end, repl))
+    parsed.sort(key=lambda p: (p[0], p[1]))
+    for (_, prev_end, _), (start, _, _) in zip(parsed, parsed[1:]):
+        if start < prev_end:
+            raise PatchError("edits overlap")
+
+    out: List[str] = []
+    pos = 0
+    for start, end, repl in parsed:
+        out.append(text[pos:start])
+        out.append(repl)
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    Apply a unified diff (as produced by `diff -u` / difflib) to `text`.
+    Context and removed lines must match the base exactly.
+    """
+    if not isinstance(diff, str):
+        raise PatchError("diff must be a string")
+    src = text.splitlines(keepends=True)
+    lines = diff.splitlines(keepends=True)
+    out: List[str] = []
+    pos = 0  # index into src of the next line not yet copied
+    i = 0
+    seen_hunk = False
+    while i < len(lines):
+        m = _HUNK_RE.match(lines[i])
+        if not m:
+            if seen_hunk and lines[i].strip():
+                raise PatchError(f"unexpected line in diff: {lines[i]!r}")
+            i += 1  # file headers (---/+++) and blank lines between hunks
+            continue
+        seen_hunk = True
+        old_start = int(m.group(1))
+        old_len = int(m.group(2)) if m.group(2) is not None else 1
+        new_len = int(m.group(4)) if m.group(4) is not None else 1
+        # "-0,0" means insertion before the first line
+        start = old_start - 1 if old_len else old_start
+        if start < pos or start > len(src):
+            raise PatchError("hunks out of order or out of range")
+        out.extend(src[pos:start])
+        pos = start
+        i += 1
+        old_seen = new_seen = 0
+        last_tag = ""
+        while i < len(lines):
+            line = lines[i]
+            tag, body = line[:1], line[1:]
+            if tag == "\\":
+                # "\ No newline at end of file" refers to the previous line
+                if last_tag in (" ", "+") and out:
+                    out[-1] = out[-1].rstrip("\r\n")
+                i += 1
+                continue
+            if old_seen >= old_len and new_seen >= new_len:
+                break
+            if tag in (" ", "-"):
+                if pos >= len(src) or src[pos].rstrip("\r\n") != body.rstrip("\r\n"):
+                    raise PatchError(f"context mismatch at line {pos + 1}")
+                if tag == " ":
+                    out.append(src[pos])
+                    new_seen += 1
+                old_seen += 1
+                pos += 1
+            elif tag == "+":
+                out.append(body)
+                new_seen += 1
+            else:
+                raise PatchError(f"malformed hunk line: {line!r}")
+            last_tag = tag
+            i += 1
+        if old_seen != old_len or new_seen != new_len:
+            raise PatchError("hunk length does not match its header")
+    if not seen_hunk:
+        raise PatchError("diff contains no hunks")
+    out.extend(src[pos:])
+    return "".join(out)
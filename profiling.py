@@ -0,0 +1,133 @@
+# profiling.py — opt-in sampling profiler writing folded stacks of slow requests
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+LOG = logging.getLogger(__name__)
+
+PROFILE_DIR_NAME = "profiles"
+# Seconds between two stack samples of every in-flight request
+PROFILE_INTERVAL = 0.005
+# Folded-stack files kept (oldest are deleted first)
+PROFILE_MAX_FILES = 200
+PROFILE_SUFFIX = ".folded"
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def frame_label(code) -> str:
+    """One stack entry: `function (file.py:line)`, free of the ';' separator."""
+    name = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({name}:{code.co_firstlineno})".replace(";", ":")
+
+
+def fold(frame) -> str:
+    """Root-first `a;b;c` string of a frame's stack."""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SlowRequestProfiler:
+    """
+    Sample the stacks of in-flight requests and keep those of slow ones.
+
+    While at least one request is registered (`begin`), a daemon thread
+    walks `sys._current_frames()` every `interval` seconds and counts each
+    request thread's stack. When a request ends (`end`) after more than
+    `threshold_ms`, its counts are written to `out_dir` as folded stacks
+    (`frame;frame;frame count` per line), the input format of flamegraph.pl,
+    inferno and speedscope. Fast requests just drop their samples.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        threshold_ms: float,
+        interval: float = PROFILE_INTERVAL,
+        max_files: int = PROFILE_MAX_FILES,
+    ):
+        self.out_dir = Path(out_dir)
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.max_files = max_files
+        self.written = 0
+        self._active: Dict[int, Counter] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> int:
+        """Start sampling the calling thread; returns the token for `end`."""
+        ident = threading.get_ident()
+        with self._cond:
+            self._active[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return ident
+
+    def end(self, token: int, elapsed_ms: float, label: str) -> Optional[Path]:
+        """
+        Stop sampling a request. Returns the written file when the request
+        was slower than the threshold and produced samples.
+        """
+        with self._cond:
+            samples = self._active.pop(token, None)
+        if not samples or elapsed_ms < self.threshold_ms:
+            return None
+        try:
+            return self._write(samples, elapsed_ms, label)
+        except OSError:
+            LOG.exception("Failed to write profile for %s", label)
+            return None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                idents = list(self._active)
+            frames = sys._current_frames()
+            stacks = {i: fold(frames[i]) for i in idents if i in frames and i != own}
+            del frames
+            with self._cond:
+                for ident, stack in stacks.items():
+                    samples = self._active.get(ident)
+                    if samples is not None:
+                        samples[stack] += 1
+            time.sleep(self.interval)
+
+    def _write(self, samples: Counter, elapsed_ms: float, label: str) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        stamp += f".{int(now * 1000) % 1000:03d}"
+        safe = _UNSAFE_RE.sub("_", label)[:60] or "request"
+        path = self.out_dir / f"{stamp}-{safe}-{int(elapsed_ms)}ms{PROFILE_SUFFIX}"
+        lines = [f"{stack} {count}" for stack, count in samples.most_common()]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        self.written += 1
+        self._prune()
+        LOG.info("Slow request %s (%.0f ms) profiled to %s", label, elapsed_ms, path)
+        return path
+
+    def _prune(self) -> None:
+        files = sorted(
+            self.out_dir.glob("*" + PROFILE_SUFFIX), key=lambda p: p.stat().st_mtime
+        )
+        for old in files[: max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
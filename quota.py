@@ -0,0 +1,269 @@
+# quota.py — per-project disk quotas enforced against the registry's usage counters
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, Optional, Tuple
+
+from chunked_upload import UploadError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from registry import ProjectRegistry
+
+LOG = logging.getLogger(__name__)
+
+# Seconds between two background audits of the usage counters
+QUOTA_AUDIT_INTERVAL = 3600.0
+# Pause between two projects of an audit (spreads its I/O)
+QUOTA_AUDIT_PAUSE = 0.05
+
+
+class QuotaExceeded(UploadError):
+    """An upload would take a project over its quota (HTTP 413)."""
+
+    def __init__(self, message: str):
+        super().__init__(message, 413)
+
+
+@dataclass(frozen=True)
+class Quota:
+    """Limits of one project; None means unlimited."""
+
+    max_bytes: Optional[int] = None
+    max_files: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"max_bytes": self.max_bytes, "max_files": self.max_files}
+
+
+class LimitedReader:
+    """
+    Read-only stream wrapper that counts the bytes read and raises
+    QuotaExceeded as soon as they exceed `limit`, so an upload of unknown
+    length is stopped while it is copied rather than after.
+    """
+
+    def __init__(self, stream: BinaryIO, limit: int, project: str):
+        self._stream = stream
+        self.limit = limit
+        self.project = project
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        block = self._stream.read(size)
+        self.count += len(block)
+        if self.count > self.limit:
+            raise QuotaExceeded(f"upload exceeds the quota of project {self.project}")
+        return block
+
+
+class Reservation:
+    """Room held by `QuotaManager.reserve` for one upload."""
+
+    def __init__(
+        self,
+        manager: "QuotaManager",
+        project: str,
+        limit: Optional[int],
+        credit: int,
+        held: Tuple[int, int],
+    ):
+        self._manager = manager
+        self.project = project
+        # most bytes the upload may write (None: unlimited)
+        self.limit = limit
+        self.credit = credit
+        self.held_bytes, self.held_files = held
+
+    def settle(self, written: int) -> None:
+        """Shrink the hold to the `written` bytes the upload turned out to take."""
+        keep = max(0, written - self.credit)
+        if keep < self.held_bytes:
+            self._manager._hold(self.project, keep - self.held_bytes, 0)
+            self.held_bytes = keep
+
+    def release(self) -> None:
+        self._manager._hold(self.project, -self.held_bytes, -self.held_files)
+        self.held_bytes = self.held_files = 0
+
+
+@dataclass
+class QuotaManager:
+    """
+    Check uploads, imports and copies against per-project quotas.
+
+    Usage comes from the `ProjectRegistry` counters, which writes keep up
+    to date incrementally (and the registry persists with its index), so
+    `usage` and `check` never walk a directory. Uploads in progress hold a
+    reservation (`reserve`) so that concurrent ones cannot overshoot
+    together. Reservations live in this process only: uploads running in
+    other workers at the same moment are not counted until they are
+    written, so with several workers a project can end up over its quota
+    by at most what those concurrent uploads add. A daemon thread (`start`) rescans every project each
+    `audit_interval` seconds and corrects counters that drifted (files
+    changed outside the app, missed events).
+    """
+
+    registry: "ProjectRegistry"
+    default: Quota = field(default_factory=Quota)
+    # per-project quotas replacing `default`
+    overrides: Dict[str, Quota] = field(default_factory=dict)
+    audit_interval: float = QUOTA_AUDIT_INTERVAL
+    corrections: int = field(default=0, init=False)
+    _reserved: Dict[str, Tuple[int, int]] = field(default_factory=dict, init=False, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def quota(self, name: str) -> Quota:
+        return self.overrides.get(name, self.default)
+
+    def usage(self, name: str) -> Optional[dict]:
+        """Bytes and files used by a project, its quota and what is left; None if unknown."""
+        info = self.registry.get(name)
+        if info is None:
+            return None
+        quota = self.quota(name)
+        with self._lock:
+            reserved_bytes, reserved_files = self._reserved.get(name, (0, 0))
+        left_bytes, left_files = self._left(
+            quota, info.bytes + reserved_bytes, info.files + reserved_files
+        )
+        return {
+            "project": name,
+            "bytes": info.bytes,
+            "files": info.files,
+            "reserved_bytes": reserved_bytes,
+            "reserved_files": reserved_files,
+            "quota": quota.to_dict(),
+            "available_bytes": None if left_bytes is None else max(0, left_bytes),
+            "available_files": None if left_files is None else max(0, left_files),
+        }
+
+    def check(self, name: str, size: int, previous_size: Optional[int] = None) -> None:
+        """
+        Refuse a write of `size` bytes (replacing a file of `previous_size`,
+        None for a new file) that would not fit.
+
+        :raises QuotaExceeded: if it would take the project over its quota.
+        """
+        with self._lock:
+            self._check_locked(name, size, previous_size)
+
+    def _check_locked(
+        self, name: str, size: int, previous_size: Optional[int], files: int = 1
+    ) -> None:
+        left_bytes, left_files = self._remaining_locked(name)
+        if left_bytes is not None and size - (previous_size or 0) > left_bytes:
+            raise QuotaExceeded(
+                f"project {name} has {max(0, left_bytes)} bytes of quota left"
+            )
+        if previous_size is None and left_files is not None and left_files < files:
+            if files == 1:
+                raise QuotaExceeded(f"project {name} has reached its file quota")
+            raise QuotaExceeded(
+                f"project {name} has {max(0, left_files)} files of quota left"
+            )
+
+    @contextmanager
+    def reserve(
+        self,
+        name: str,
+        size: Optional[int],
+        previous_size: Optional[int] = None,
+        *,
+        files: int = 1,
+    ) -> Iterator[Reservation]:
+        """
+        Hold room for one upload while it is written. `size` may be None
+        when it is not known in advance: the whole limit handed out is
+        then held, and the caller reads the data through a `LimitedReader`
+        bounded by `Reservation.limit` and `settle`s the hold to what it
+        read. Released on exit, once the write is counted by the registry.
+        `files` is how many new files the write adds (several for a project
+        import or copy; ignored when replacing a file).
+
+        :raises QuotaExceeded: if the upload cannot fit.
+        """
+        credit = previous_size or 0
+        with self._lock:
+            self._check_locked(name, size or 0, previous_size, files)
+            left_bytes, _ = self._remaining_locked(name)
+            limit = None if left_bytes is None else left_bytes + credit
+            wanted = size if size is not None else (limit or 0)
+            held = (max(0, wanted - credit), files if previous_size is None else 0)
+            self._hold_locked(name, *held)
+        reservation = Reservation(self, name, limit, credit, held)
+        try:
+            yield reservation
+        finally:
+            reservation.release()
+
+    def start(self) -> None:
+        """Start the audit thread if it is not running (e.g. after a fork)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="quota-audit", daemon=True
+            )
+            self._thread.start()
+
+    def audit(self) -> int:
+        """Rescan every project and correct drifted counters; returns how many were."""
+        corrected = 0
+        for name in self.registry.names():
+            drift = self.registry.verify(name)
+            if drift is not None:
+                stored, scanned = drift
+                LOG.warning(
+                    "Usage of project %s drifted: counted %d files/%d bytes, found %d/%d",
+                    name,
+                    stored.files,
+                    stored.bytes,
+                    scanned.files,
+                    scanned.bytes,
+                )
+                corrected += 1
+            time.sleep(QUOTA_AUDIT_PAUSE)
+        self.corrections += corrected
+        return corrected
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.audit_interval)
+            try:
+                self.audit()
+            except Exception:
+                LOG.exception("Quota audit failed")
+
+    def _hold(self, name: str, nbytes: int, files: int) -> None:
+        with self._lock:
+            self._hold_locked(name, nbytes, files)
+
+    def _hold_locked(self, name: str, nbytes: int, files: int) -> None:
+        current = self._reserved.get(name, (0, 0))
+        rest = (current[0] + nbytes, current[1] + files)
+        if rest == (0, 0):
+            self._reserved.pop(name, None)
+        else:
+            self._reserved[name] = rest
+
+    def _remaining_locked(self, name: str) -> Tuple[Optional[int], Optional[int]]:
+        """Bytes and files left once reservations are counted."""
+        info = self.registry.get(name)
+        used_bytes, used_files = (info.bytes, info.files) if info is not None else (0, 0)
+        reserved_bytes, reserved_files = self._reserved.get(name, (0, 0))
+        return self._left(
+            self.quota(name), used_bytes + reserved_bytes, used_files + reserved_files
+        )
+
+    @staticmethod
+    def _left(
+        quota: Quota, used_bytes: int, used_files: int
+    ) -> Tuple[Optional[int], Optional[int]]:
+        left_bytes = None if quota.max_bytes is None else quota.max_bytes - used_bytes
+        left_files = None if quota.max_files is None else quota.max_files - used_files
+        return left_bytes, left_files
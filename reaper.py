@@ -0,0 +1,193 @@
+# reaper.py — rename-to-trash deletion with rate-limited background reclamation
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover
+    from blobstore import BlobStore
+
+LOG = logging.getLogger(__name__)
+
+TRASH_DIR_NAME = ".trash"
+# Maximum filesystem entries removed per second by the reaper
+REAPER_ENTRIES_PER_SECOND = 2000
+# Entries removed between rate-limit checks
+REAPER_BATCH = 200
+# A held entry (see `discard`) is reaped anyway once its hold is this old,
+# in case whoever held it is gone
+REAPER_HOLD_TTL = 3600
+_HOLD_MARKER = "held"
+
+
+@dataclass
+class TrashReaper:
+    """
+    Delete directories without blocking the caller.
+
+    `discard` renames the directory into `trash_dir` (a single atomic
+    rename on the same filesystem) and wakes a daemon thread that removes
+    it at no more than `rate` entries per second. Blob hashes released by
+    the deleted project are stored next to it and freed once the files are
+    gone. Anything still in the trash at startup is picked up again.
+
+    An entry discarded with `hold=True` is left alone until it is
+    `release`d, so it can still be `restore`d to where it came from.
+    """
+
+    trash_dir: Path
+    blobs: Optional["BlobStore"] = None
+    rate: int = REAPER_ENTRIES_PER_SECOND
+    # callables run after a pass that reclaimed at least one entry (cache gc, ...)
+    on_reaped: List[Callable[[], object]] = field(default_factory=list)
+    _wake: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def discard(
+        self, path: Path, blob_hashes: Iterable[str] = (), *, hold: bool = False
+    ) -> Path:
+        """
+        Move `path` into the trash and schedule it for removal. Returns the
+        trash entry. With `hold`, it is only removed once released.
+        """
+        entry = self.trash_dir / uuid.uuid4().hex
+        entry.mkdir(parents=True)
+        if hold:
+            (entry / _HOLD_MARKER).touch()
+        (entry / "blobs.json").write_text(json.dumps(sorted(set(blob_hashes))), "utf-8")
+        try:
+            os.rename(path, entry / "data")
+        except BaseException:
+            self._remove_entry(entry)
+            raise
+        self.start()
+        self._wake.set()
+        return entry
+
+    def restore(self, entry: Path, path: Path) -> None:
+        """Move a held entry back to `path` (where it was discarded from)."""
+        os.rename(entry / "data", path)
+        self._remove_entry(entry)
+
+    def release(self, entry: Path) -> None:
+        """Let the reaper remove a held entry."""
+        (entry / _HOLD_MARKER).unlink(missing_ok=True)
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the reaper thread if it is not running (e.g. after a fork)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="trash-reaper", daemon=True
+            )
+            self._thread.start()
+        self._wake.set()
+
+    def pending(self) -> int:
+        """Number of trash entries not yet reclaimed."""
+        try:
+            return sum(1 for _ in self.trash_dir.iterdir())
+        except OSError:
+            return 0
+
+    def reap_all(self) -> None:
+        """Reclaim every trash entry now, in the calling thread."""
+        try:
+            entries = sorted(self.trash_dir.iterdir())
+        except OSError:
+            return
+        for entry in entries:
+            self._reap_entry(entry)
+        if entries:
+            for hook in self.on_reaped:
+                try:
+                    hook()
+                except Exception:
+                    LOG.exception("Trash reaper hook failed")
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.reap_all()
+            except Exception:
+                LOG.exception("Trash reaper pass failed")
+
+    def _reap_entry(self, entry: Path) -> None:
+        try:
+            held = (entry / _HOLD_MARKER).stat().st_mtime
+        except OSError:
+            held = None
+        if held is not None and held > time.time() - REAPER_HOLD_TTL:
+            return
+        started = time.monotonic()
+        removed = self._remove_tree(entry / "data")
+        try:
+            hashes = json.loads((entry / "blobs.json").read_text("utf-8"))
+        except (OSError, ValueError):
+            hashes = []
+        if self.blobs is not None and hashes:
+            self.blobs.release(hashes)
+        if not self._remove_entry(entry):
+            # another worker is reaping the same entry, or it is already gone
+            return
+        LOG.info(
+            "Reclaimed trash entry %s (%d entries, %.1fs)",
+            entry.name,
+            removed,
+            time.monotonic() - started,
+        )
+
+    @staticmethod
+    def _remove_entry(entry: Path) -> bool:
+        (entry / "blobs.json").unlink(missing_ok=True)
+        (entry / _HOLD_MARKER).unlink(missing_ok=True)
+        try:
+            entry.rmdir()
+        except OSError:
+            return False
+        return True
+
+    def _remove_tree(self, root: Path) -> int:
+        """Bottom-up removal of `root`, throttled to `rate` entries per second."""
+        removed = 0
+        window_start = time.monotonic()
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            for name in filenames:
+                try:
+                    os.unlink(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                if removed % REAPER_BATCH == 0:
+                    window_start = self._throttle(window_start)
+            for name in dirnames:
+                try:
+                    os.rmdir(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+        try:
+            os.rmdir(root)
+        except FileNotFoundError:
+            pass
+        return removed
+
+    def _throttle(self, window_start: float) -> float:
+        """Sleep if the last REAPER_BATCH removals went faster than `rate`."""
+        budget = REAPER_BATCH / max(self.rate, 1)
+        elapsed = time.monotonic() - window_start
+        if elapsed < budget:
+            time.sleep(budget - elapsed)
+        return time.monotonic()
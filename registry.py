@@ -0,0 +1,427 @@
+# registry.py — in-process project registry backed by a compact on-disk index
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left, insort
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fsutil import STATE_DIR_NAME
+
+LOG = logging.getLogger(__name__)
+
+REGISTRY_INDEX_NAME = "registry.json"
+REGISTRY_INDEX_VERSION = 1
+# Coalesce index writes: persist at most once per this many seconds
+REGISTRY_FLUSH_DELAY = 2.0
+
+REGISTRY_SORT_KEYS = ("name", "mtime", "bytes", "files")
+
+
+@dataclass
+class ProjectInfo:
+    """Metadata kept for one project directory."""
+
+    name: str
+    files: int = 0
+    bytes: int = 0
+    mtime: float = 0.0
+    has_css: bool = False
+    has_js: bool = False
+    # mtime of the project directory itself when the entry was computed
+    dir_mtime_ns: int = 0
+
+    def to_row(self) -> list:
+        """Compact list form used in the on-disk index."""
+        flags = (1 if self.has_css else 0) | (2 if self.has_js else 0)
+        return [self.files, self.bytes, self.mtime, flags, self.dir_mtime_ns]
+
+    @classmethod
+    def from_row(cls, name: str, row: list) -> "ProjectInfo":
+        files, size, mtime, flags, dir_mtime_ns = row
+        return cls(
+            name=name,
+            files=files,
+            bytes=size,
+            mtime=mtime,
+            has_css=bool(flags & 1),
+            has_js=bool(flags & 2),
+            dir_mtime_ns=dir_mtime_ns,
+        )
+
+    def to_dict(self) -> dict:
+        """Public JSON form (without internal validators)."""
+        data = asdict(self)
+        data.pop("dir_mtime_ns")
+        return data
+
+
+def scan_project(path: Path) -> ProjectInfo:
+    """Walk a project directory and compute its metadata."""
+    info = ProjectInfo(name=path.name)
+    for root, _dirs, files in os.walk(path):
+        for fname in files:
+            try:
+                st = os.stat(os.path.join(root, fname))
+            except OSError:
+                continue
+            info.files += 1
+            info.bytes += st.st_size
+            info.mtime = max(info.mtime, st.st_mtime)
+    info.has_css = (path / "style.css").is_file()
+    info.has_js = (path / "script.js").is_file()
+    try:
+        st = path.stat()
+        info.dir_mtime_ns = st.st_mtime_ns
+        info.mtime = max(info.mtime, st.st_mtime)
+    except OSError:
+        pass
+    return info
+
+
+@dataclass
+class ProjectRegistry:
+    """
+    Keep project metadata in memory so listing never touches the filesystem.
+
+    The registry is built once (`load`) from the on-disk index, rescanning
+    only projects whose directory mtime no longer matches. Afterwards it is
+    kept current by `ProjectManager` through `refresh` / `remove`, and the
+    index is rewritten in the background at most every REGISTRY_FLUSH_DELAY.
+
+    When several workers serve the same projects, `generations` (a
+    sharedcache.ProjectGenerations) tells which projects the others wrote;
+    reads `sync` those first. Without it, reads stat the projects directory
+    and reconcile the listing when its mtime changed, so projects created
+    or deleted by another process still show up; what another process
+    writes inside an existing project does not. The app's own indexes live
+    in STATE_DIR_NAME, so rewriting them does not set off a reconcile.
+    """
+
+    projects_dir: Path
+    flush_delay: float = REGISTRY_FLUSH_DELAY
+    generations: Optional[Any] = None
+    # callables(project name) run after `sync` picked up another worker's change
+    remote_listeners: List[Callable[[str], None]] = field(default_factory=list, repr=False)
+    _entries: Dict[str, ProjectInfo] = field(default_factory=dict, init=False, repr=False)
+    _names: List[str] = field(default_factory=list, init=False, repr=False)
+    # per-project count of updates, to detect writes racing with `verify`
+    _versions: Dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    _loaded: bool = field(default=False, init=False, repr=False)
+    # mtime of projects_dir when the listing was last reconciled with it
+    _dir_mtime_ns: Optional[int] = field(default=None, init=False, repr=False)
+    _timer: Optional[threading.Timer] = field(default=None, init=False, repr=False)
+    _lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False)
+
+    @property
+    def index_path(self) -> Path:
+        return self.projects_dir / STATE_DIR_NAME / REGISTRY_INDEX_NAME
+
+    def load(self) -> None:
+        """Build the registry from the on-disk index and the project directories."""
+        with self._lock:
+            stored = self._read_index()
+            entries: Dict[str, ProjectInfo] = {}
+            rescanned = 0
+            # read before scanning, like the generations below
+            self._dir_mtime_ns = self._listing_mtime()
+            children = self._project_dirs()
+            if self.generations is not None:
+                # read before scanning: later writes elsewhere show as changes
+                snapshot = self.generations.snapshot(c.name for c in children)
+            for child in children:
+                info = stored.get(child.name)
+                try:
+                    dir_mtime_ns = child.stat().st_mtime_ns
+                except OSError:
+                    continue
+                if info is None or info.dir_mtime_ns != dir_mtime_ns:
+                    info = scan_project(Path(child.path))
+                    rescanned += 1
+                entries[child.name] = info
+            self._entries = entries
+            self._names = sorted(entries)
+            self._loaded = True
+            if self.generations is not None:
+                self.generations.commit(snapshot)
+            if rescanned or set(stored) != set(entries):
+                self._schedule_flush()
+            LOG.info(
+                "Project registry loaded: %d projects (%d rescanned)",
+                len(entries),
+                rescanned,
+            )
+
+    def ensure_loaded(self) -> None:
+        """Load the registry on first use."""
+        if not self._loaded:
+            self.load()
+
+    def sync(self) -> None:
+        """
+        Catch up with the writes of other workers: rescan the projects whose
+        generation changed and, when projects were created or deleted
+        elsewhere, reconcile the names with the projects directory. Costs
+        one counter read when nothing changed (one stat without generations).
+        """
+        if not self._loaded:
+            return
+        generations = self.generations
+        if generations is None:
+            changed = self._sync_listing()
+        else:
+            if not generations.stale():
+                return
+            with self._lock:
+                names: Set[str] = set(self._names)
+                snapshot = generations.snapshot(names)
+                if generations.listing_changed(snapshot):
+                    on_disk = {c.name for c in self._project_dirs()}
+                    snapshot = generations.snapshot(names | on_disk)
+                changed = generations.changed(snapshot)
+                for name in changed:
+                    self.refresh(name)
+                generations.commit(snapshot)
+        for name in changed:
+            for listener in self.remote_listeners:
+                try:
+                    listener(name)
+                except Exception:
+                    LOG.exception("remote change listener failed for %s", name)
+
+    def names(self) -> List[str]:
+        """Return all project names, sorted."""
+        with self._lock:
+            self.ensure_loaded()
+            self.sync()
+            return list(self._names)
+
+    def get(self, name: str) -> Optional[ProjectInfo]:
+        """Return metadata for one project, or None."""
+        with self._lock:
+            self.ensure_loaded()
+            self.sync()
+            return self._entries.get(name)
+
+    def refresh(self, name: str) -> Optional[ProjectInfo]:
+        """Rescan a single project after it was created or written to."""
+        path = self.projects_dir / name
+        with self._lock:
+            self.ensure_loaded()
+            if not path.is_dir():
+                self.remove(name)
+                return None
+            info = scan_project(path)
+            if name not in self._entries:
+                insort(self._names, name)
+            self._entries[name] = info
+            self._touch(name)
+            return info
+
+    def record_write(self, name: str, file_path: Path, previous_size: Optional[int]) -> None:
+        """
+        Update a project's counters after one file was written or deleted,
+        without a rescan.
+
+        :param name: Project directory name.
+        :param file_path: The file that was written (or deleted).
+        :param previous_size: Its size before the write, or None if it is new.
+        """
+        with self._lock:
+            self.ensure_loaded()
+            info = self._entries.get(name)
+            if info is None:
+                self.refresh(name)
+                return
+            try:
+                dir_st = (self.projects_dir / name).stat()
+                st = file_path.stat()
+            except FileNotFoundError:
+                if previous_size is None or not (self.projects_dir / name).is_dir():
+                    self.refresh(name)
+                    return
+                st = None
+            except OSError:
+                self.refresh(name)
+                return
+            top_level = file_path.parent == self.projects_dir / name
+            if st is None:
+                # deleted
+                info.files -= 1
+                info.bytes -= previous_size or 0
+            else:
+                if previous_size is None:
+                    info.files += 1
+                info.bytes += st.st_size - (previous_size or 0)
+                info.mtime = max(info.mtime, st.st_mtime)
+            if top_level and file_path.name in ("style.css", "script.js"):
+                flag = "has_css" if file_path.name == "style.css" else "has_js"
+                setattr(info, flag, st is not None)
+            info.dir_mtime_ns = dir_st.st_mtime_ns
+            self._touch(name)
+
+    def verify(self, name: str) -> Optional[Tuple[ProjectInfo, ProjectInfo]]:
+        """
+        Rescan a project (without holding the lock) and replace its entry if
+        the file or byte count drifted. A scan raced by a write is dropped
+        rather than applied; the next verify catches up.
+
+        :return: (stored, scanned) when the entry was corrected, else None.
+        """
+        path = self.projects_dir / name
+        with self._lock:
+            self.ensure_loaded()
+            version = self._versions.get(name, 0)
+            if name not in self._entries:
+                return None
+        if not path.is_dir():
+            return None
+        scanned = scan_project(path)
+        with self._lock:
+            stored = self._entries.get(name)
+            if stored is None or self._versions.get(name, 0) != version:
+                return None
+            if (stored.files, stored.bytes) == (scanned.files, scanned.bytes):
+                return None
+            stored = replace(stored)
+            self._entries[name] = scanned
+            self._touch(name)
+            return stored, scanned
+
+    def remove(self, name: str) -> None:
+        """Forget a project (after it was deleted)."""
+        with self._lock:
+            self.ensure_loaded()
+            if self._entries.pop(name, None) is None:
+                return
+            i = bisect_left(self._names, name)
+            if i < len(self._names) and self._names[i] == name:
+                del self._names[i]
+            self._touch(name)
+
+    def query(
+        self,
+        *,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        sort: str = "name",
+        descending: bool = False,
+        contains: Optional[str] = None,
+        has_css: Optional[bool] = None,
+        has_js: Optional[bool] = None,
+    ) -> Tuple[int, List[ProjectInfo]]:
+        """
+        Filter, sort and paginate the registry.
+
+        :return: Tuple (total matches before pagination, page of ProjectInfo).
+        """
+        if sort not in REGISTRY_SORT_KEYS:
+            raise ValueError(f"invalid sort key: {sort}")
+        with self._lock:
+            self.ensure_loaded()
+            self.sync()
+            items = [self._entries[n] for n in self._names]
+        if contains:
+            needle = contains.lower()
+            items = [i for i in items if needle in i.name.lower()]
+        if has_css is not None:
+            items = [i for i in items if i.has_css == has_css]
+        if has_js is not None:
+            items = [i for i in items if i.has_js == has_js]
+        if sort != "name" or descending:
+            items.sort(key=lambda i: (getattr(i, sort), i.name), reverse=descending)
+        total = len(items)
+        end = None if limit is None else offset + limit
+        return total, items[offset:end]
+
+    def flush(self) -> None:
+        """Write the index to disk now (atomically)."""
+        with self._lock:
+            if not self._loaded:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            doc = {
+                "version": REGISTRY_INDEX_VERSION,
+                "projects": {n: e.to_row() for n, e in self._entries.items()},
+            }
+        # per process: gunicorn workers flush the same index
+        tmp = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.parent.mkdir(exist_ok=True)
+            tmp.write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+        except OSError:
+            LOG.exception("Failed to write project registry index %s", self.index_path)
+
+    def _touch(self, name: str) -> None:
+        self._versions[name] = self._versions.get(name, 0) + 1
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        # a timer started before a fork (preload_app) is not running in the child
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _sync_listing(self) -> List[str]:
+        """
+        Reconcile the names with the projects directory if its mtime changed
+        since the last look: drop projects that are gone and scan new ones.
+        Only the directory is read, no project is stat'ed. Returns the names
+        that changed.
+        """
+        mtime = self._listing_mtime()
+        if mtime == self._dir_mtime_ns:
+            return []
+        with self._lock:
+            if mtime == self._dir_mtime_ns:
+                return []
+            self._dir_mtime_ns = mtime
+            on_disk = {c.name for c in self._project_dirs()}
+            gone = [n for n in self._names if n not in on_disk]
+            for name in gone:
+                self.remove(name)
+            added = sorted(on_disk.difference(self._names))
+            for name in added:
+                self.refresh(name)
+            return gone + added
+
+    def _listing_mtime(self) -> Optional[int]:
+        try:
+            return self.projects_dir.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _project_dirs(self) -> List[os.DirEntry]:
+        try:
+            children = list(os.scandir(self.projects_dir))
+        except OSError:
+            return []
+        # dot-prefixed names are internal (index, trash, caches)
+        return [c for c in children if not c.name.startswith(".") and c.is_dir()]
+
+    def _read_index(self) -> Dict[str, ProjectInfo]:
+        try:
+            doc = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except Exception:
+            LOG.warning("Ignoring unreadable project registry index %s", self.index_path)
+            return {}
+        if doc.get("version") != REGISTRY_INDEX_VERSION:
+            return {}
+        out = {}
+        for name, row in (doc.get("projects") or {}).items():
+            try:
+                out[name] = ProjectInfo.from_row(name, row)
+            except (TypeError, ValueError):
+                continue
+        return out
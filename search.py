@@ -0,0 +1,647 @@
+# search.py — inverted index over project pages, stylesheets and assets
+from __future__ import annotations
+
+import html.parser
+import logging
+import marshal
+import math
+import os
+import posixpath
+import queue
+import re
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from fsutil import STATE_DIR_NAME, atomic_write
+
+LOG = logging.getLogger(__name__)
+
+SEARCH_INDEX_NAME = "search.idx"
+SEARCH_INDEX_VERSION = 1
+# Coalesce index writes: persist at most once per this many seconds
+SEARCH_FLUSH_DELAY = 5.0
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_SNIPPET_CHARS = 80
+# Documents per project: its page, its stylesheet and an inventory of its assets
+SEARCH_FILES = ("index.html", "style.css")
+ASSETS_DOC = "assets"
+
+# Query field prefixes -> index term prefixes
+SEARCH_FIELDS = {"word": "w", "tag": "t", "class": "c", "id": "i", "asset": "a"}
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+_MAGIC = b"HCSI"
+_WORD_RE = re.compile(r"\w{2,40}", re.UNICODE)
+_URL_ATTRS = {"src", "href", "poster", "data", "action"}
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_BLOCK_RE = re.compile(r"([^{}]*)\{([^{}]*)\}")
+_CSS_URL_RE = re.compile(r"""url\(\s*["']?([^"')]+)["']?\s*\)""", re.I)
+_CSS_CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][-\w]*)")
+_CSS_ID_RE = re.compile(r"#(-?[_a-zA-Z][-\w]*)")
+_CSS_TAG_RE = re.compile(r"(?:^|[\s>+~,(])([a-zA-Z][a-zA-Z0-9-]*)")
+_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+# -----------------------------------------------------------------------------
+# Term extraction
+# -----------------------------------------------------------------------------
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _asset_terms(url: str) -> List[str]:
+    """Terms for a referenced path: the full local path and its file name."""
+    url = url.strip()
+    if not url or url.startswith(("#", "data:")):
+        return []
+    path = re.split(r"[?#]", url, maxsplit=1)[0].lower()
+    if not path:
+        return []
+    if not _SCHEME_RE.match(path) and not path.startswith("//"):
+        path = posixpath.normpath(path.lstrip("./") or path)
+    base = posixpath.basename(path.rstrip("/"))
+    return [f"a:{path}"] + ([f"a:{base}"] if base and base != path else [])
+
+
+class _HtmlTerms(html.parser.HTMLParser):
+    """Collect index terms from an HTML page."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.terms: List[str] = []
+        self._skip = 0  # inside <script>
+        self._style: List[str] = []
+        self._in_style = False
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        self.terms.append(f"t:{tag}")
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "class":
+                self.terms.extend(f"c:{c.lower()}" for c in value.split())
+            elif name == "id":
+                self.terms.append(f"i:{value.strip().lower()}")
+            elif name in _URL_ATTRS:
+                self.terms.extend(_asset_terms(value))
+            elif name == "srcset":
+                for item in value.split(","):
+                    bits = item.split()
+                    if bits:
+                        self.terms.extend(_asset_terms(bits[0]))
+            elif name in ("alt", "title", "placeholder"):
+                self.terms.extend(f"w:{w}" for w in _words(value))
+        if tag == "script":
+            self._skip += 1
+        elif tag == "style":
+            self._in_style = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script" and self._skip:
+            self._skip -= 1
+        elif tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_style:
+            self._style.append(data)
+        elif not self._skip:
+            self.terms.extend(f"w:{w}" for w in _words(data))
+
+
+def html_terms(text: str) -> List[str]:
+    """Index terms of an HTML page (embedded <style> blocks included)."""
+    parser = _HtmlTerms()
+    try:
+        parser.feed(text)
+        parser.close()
+    except Exception:
+        LOG.debug("HTML parse error while indexing", exc_info=True)
+    return parser.terms + css_terms("".join(parser._style))
+
+
+def css_terms(text: str) -> List[str]:
+    """Index terms of a stylesheet: selectors, referenced assets and value words."""
+    terms: List[str] = []
+    text = _CSS_COMMENT_RE.sub(" ", text)
+    for selector, body in _CSS_BLOCK_RE.findall(text):
+        selector = selector.rsplit(";", 1)[-1]
+        if not selector.strip().startswith("@"):
+            selector = re.sub(r"\[[^\]]*\]|::?[-\w]+(\([^)]*\))?", " ", selector)
+            terms.extend(f"c:{c.lower()}" for c in _CSS_CLASS_RE.findall(selector))
+            terms.extend(f"i:{i.lower()}" for i in _CSS_ID_RE.findall(selector))
+            terms.extend(f"t:{t.lower()}" for t in _CSS_TAG_RE.findall(selector))
+        for url in _CSS_URL_RE.findall(body):
+            terms.extend(_asset_terms(url))
+        terms.extend(f"w:{w}" for w in _words(_CSS_URL_RE.sub(" ", body)))
+    return terms
+
+
+def parse_query(q: str) -> List[Tuple[str, str]]:
+    """
+    Split a query into (term, needle) pairs. `needle` is the text to look
+    for when building snippets.
+
+    Supported forms: plain words, `tag:div`, `class:btn` or `.btn`,
+    `id:main` or `#main`, `asset:images/logo.png`.
+    """
+    out: List[Tuple[str, str]] = []
+    for token in q.split():
+        field_name, sep, value = token.partition(":")
+        if sep and field_name.lower() in SEARCH_FIELDS and value:
+            prefix = SEARCH_FIELDS[field_name.lower()]
+            if prefix == "w":
+                out.extend((f"w:{w}", w) for w in _words(value))
+            elif prefix == "a":
+                terms = _asset_terms(value)
+                if terms:
+                    out.append((terms[0], value))
+            else:
+                out.append((f"{prefix}:{value.lower()}", value))
+        elif token.startswith(".") and len(token) > 1:
+            out.append((f"c:{token[1:].lower()}", token[1:]))
+        elif token.startswith("#") and len(token) > 1:
+            out.append((f"i:{token[1:].lower()}", token[1:]))
+        else:
+            out.extend((f"w:{w}", w) for w in _words(token))
+    return out
+
+
+def make_snippet(text: str, needles: Iterable[str]) -> Tuple[str, List[List[int]]]:
+    """
+    A short excerpt around the first needle found in `text`, whitespace
+    collapsed, plus [start, end] ranges of needles inside the excerpt.
+    """
+    lower = text.lower()
+    hits = [(lower.find(n.lower()), n) for n in needles if n]
+    hits = [(pos, n) for pos, n in hits if pos >= 0]
+    if not hits:
+        excerpt = re.sub(r"\s+", " ", text[:SEARCH_SNIPPET_CHARS]).strip()
+        return excerpt, []
+    pos, needle = min(hits)
+    start = max(0, pos - SEARCH_SNIPPET_CHARS // 2)
+    end = min(len(text), pos + len(needle) + SEARCH_SNIPPET_CHARS // 2)
+    excerpt = re.sub(r"\s+", " ", text[start:end]).strip()
+    ranges = []
+    low_excerpt = excerpt.lower()
+    for n in {n.lower() for n in needles if n}:
+        at = low_excerpt.find(n)
+        while at >= 0:
+            ranges.append([at, at + len(n)])
+            at = low_excerpt.find(n, at + len(n))
+    ranges.sort()
+    prefix = "\u2026" if start > 0 else ""
+    suffix = "\u2026" if end < len(text) else ""
+    shift = len(prefix)
+    return prefix + excerpt + suffix, [[a + shift, b + shift] for a, b in ranges]
+
+
+# -----------------------------------------------------------------------------
+# Index
+# -----------------------------------------------------------------------------
+@dataclass
+class SearchDoc:
+    """One indexed file (or a project's asset inventory)."""
+
+    project: str
+    file: str
+    # validator of the indexed content: (size, mtime_ns) or the inventory signature
+    signature: Tuple
+    length: int  # number of terms, for BM25 length normalization
+
+
+@dataclass
+class SearchHit:
+    doc: SearchDoc
+    score: float
+    snippet: str = ""
+    highlights: List[List[int]] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "project": self.doc.project,
+            "file": self.doc.file,
+            "score": round(self.score, 4),
+            "snippet": self.snippet,
+            "highlights": self.highlights,
+        }
+
+
+# postings: doc id -> term frequency; packed = (doc ids uint32, tfs uint16) bytes
+_Postings = Union[bytes, Dict[int, int]]
+
+
+@dataclass
+class SearchIndex:
+    """
+    Inverted index over every project's index.html, style.css and assets.
+
+    Terms are typed: `w:` words, `t:` tag names, `c:` classes, `i:` ids
+    and `a:` asset paths/file names. Queries are conjunctive and ranked
+    with BM25. A background thread consumes change notifications (saves,
+    uploads, created/deleted projects) and reindexes only documents whose
+    validator changed.
+
+    On disk the index is one zlib-compressed marshal blob: the term list,
+    each posting list packed as two arrays and each document's term ids.
+    Loading only unpacks that blob; posting lists are decoded on first use.
+    """
+
+    projects_dir: Path
+    # project -> validator of its asset inventory (None: walk to compare)
+    asset_signature: Optional[Callable[[str], Optional[Tuple]]] = None
+    flush_delay: float = SEARCH_FLUSH_DELAY
+    _docs: List[Optional[SearchDoc]] = field(default_factory=list, init=False, repr=False)
+    _doc_ids: Dict[Tuple[str, str], int] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _postings: Dict[str, _Postings] = field(default_factory=dict, init=False, repr=False)
+    # doc id -> its term counts (after a load: packed ids into `_saved_terms`)
+    _doc_terms: Dict[int, Union[bytes, Dict[str, int]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _saved_terms: List[str] = field(default_factory=list, init=False, repr=False)
+    _total_length: int = field(default=0, init=False, repr=False)
+    _queue: "queue.Queue[Tuple[str, Optional[str]]]" = field(
+        default_factory=queue.Queue, init=False, repr=False
+    )
+    _queued: Set[Tuple[str, Optional[str]]] = field(
+        default_factory=set, init=False, repr=False
+    )
+    _active: int = field(default=0, init=False, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+    _timer: Optional[threading.Timer] = field(default=None, init=False, repr=False)
+    _dirty: bool = field(default=False, init=False, repr=False)
+    _lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False)
+
+    @property
+    def index_path(self) -> Path:
+        return self.projects_dir / STATE_DIR_NAME / SEARCH_INDEX_NAME
+
+    # ---- change notifications ----
+    def start(self, projects: Iterable[str] = ()) -> None:
+        """Load the saved index, start the indexer and queue `projects` for a check."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not self._docs:
+                self.load()
+            self._thread = threading.Thread(
+                target=self._run, name="search-indexer", daemon=True
+            )
+            self._thread.start()
+        known = {d.project for d in self._docs if d is not None}
+        for name in projects:
+            known.discard(name)
+            self.project_changed(name)
+        # projects indexed earlier but gone now
+        for name in known:
+            self.project_changed(name)
+
+    def file_written(self, project_path: Path, file_path: Path) -> None:
+        """Write hook for ProjectManager: reindex a saved page, stylesheet or assets."""
+        name = file_path.name if file_path.parent == project_path else None
+        self._enqueue(project_path.name, name if name in SEARCH_FILES else ASSETS_DOC)
+
+    def project_changed(self, project: str) -> None:
+        """Reindex (or drop) a project that was created, copied or deleted."""
+        for name in SEARCH_FILES + (ASSETS_DOC,):
+            self._enqueue(project, name)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until queued changes are indexed (tests, benchmarks, preload)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._queued and not self._active:
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+
+    def _enqueue(self, project: str, name: Optional[str]) -> None:
+        key = (project, name)
+        with self._lock:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        self._queue.put(key)
+
+    def _run(self) -> None:
+        while True:
+            key = self._queue.get()
+            # un-mark first: a change arriving during the reindex queues it again
+            with self._lock:
+                self._queued.discard(key)
+                self._active += 1
+            try:
+                self._reindex(*key)
+            except Exception:
+                LOG.exception("Search indexing failed for %s/%s", *key)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    # ---- indexing ----
+    def _reindex(self, project: str, name: Optional[str]) -> None:
+        root = self.projects_dir / project
+        with self._lock:
+            doc_id = self._doc_ids.get((project, name or ""))
+            current = self._docs[doc_id] if doc_id is not None else None
+        if name == ASSETS_DOC:
+            signature = self._inventory_signature(project, root)
+            if signature is None:
+                self._remove((project, ASSETS_DOC))
+                return
+            if current is not None and current.signature == signature:
+                return
+            self._replace(project, ASSETS_DOC, signature, self._inventory_terms(root))
+            return
+        path = root / (name or "")
+        try:
+            st = path.stat()
+        except OSError:
+            self._remove((project, name or ""))
+            return
+        signature = (st.st_size, st.st_mtime_ns)
+        if current is not None and current.signature == signature:
+            return
+        try:
+            text = path.read_text("utf-8", errors="replace")
+        except OSError:
+            return
+        terms = html_terms(text) if name == "index.html" else css_terms(text)
+        self._replace(project, name or "", signature, terms)
+
+    def _inventory_signature(self, project: str, root: Path) -> Optional[Tuple]:
+        if not root.is_dir():
+            return None
+        if self.asset_signature is not None:
+            signature = self.asset_signature(project)
+            if signature is not None:
+                return tuple(signature)
+        return tuple(sorted(self._inventory(root)))
+
+    def _inventory(self, root: Path) -> List[str]:
+        """Relative paths of a project's assets (all but its top-level sources)."""
+        out = []
+        for dirpath, dirnames, files in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for fname in files:
+                if fname.startswith("."):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, fname), root)
+                rel = rel.replace(os.sep, "/")
+                if rel not in SEARCH_FILES and rel != "script.js":
+                    out.append(rel)
+        return out
+
+    def _inventory_terms(self, root: Path) -> List[str]:
+        terms: List[str] = []
+        for rel in self._inventory(root):
+            terms.extend(_asset_terms(rel))
+        return terms
+
+    def _replace(
+        self, project: str, name: str, signature: Tuple, terms: List[str]
+    ) -> None:
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        with self._lock:
+            self._remove_locked((project, name))
+            doc_id = len(self._docs)
+            self._docs.append(SearchDoc(project, name, tuple(signature), len(terms)))
+            self._doc_ids[(project, name)] = doc_id
+            self._doc_terms[doc_id] = counts
+            self._total_length += len(terms)
+            for term, tf in counts.items():
+                postings = self._decoded(term)
+                postings[doc_id] = min(tf, 0xFFFF)
+            self._mark_dirty()
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            if self._remove_locked(key):
+                self._mark_dirty()
+
+    def _remove_locked(self, key: Tuple[str, str]) -> bool:
+        doc_id = self._doc_ids.pop(key, None)
+        if doc_id is None:
+            return False
+        doc = self._docs[doc_id]
+        self._docs[doc_id] = None
+        if doc is not None:
+            self._total_length -= doc.length
+        for term in self._terms_of(doc_id):
+            postings = self._decoded(term)
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._doc_terms.pop(doc_id, None)
+        return True
+
+    def _terms_of(self, doc_id: int) -> List[str]:
+        terms = self._doc_terms.get(doc_id)
+        if terms is None:
+            return []
+        if isinstance(terms, bytes):
+            ids = array("I")
+            ids.frombytes(terms)
+            return [self._saved_terms[i] for i in ids]
+        return list(terms)
+
+    def _decoded(self, term: str) -> Dict[int, int]:
+        """The posting dict of `term`, unpacking it on first use."""
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = {}
+        elif isinstance(postings, bytes):
+            postings = self._postings[term] = _unpack_postings(postings)
+        return postings
+
+    # ---- queries ----
+    def search(
+        self,
+        q: str,
+        *,
+        limit: int = SEARCH_DEFAULT_LIMIT,
+        offset: int = 0,
+        project: Optional[str] = None,
+    ) -> Tuple[int, List[SearchHit]]:
+        """
+        Documents containing every query term, best first (BM25).
+
+        :return: Tuple (total matches, requested page of hits with snippets).
+        """
+        parsed = parse_query(q)
+        if not parsed:
+            return 0, []
+        with self._lock:
+            n_docs = len(self._doc_ids)
+            if not n_docs:
+                return 0, []
+            avgdl = max(self._total_length / n_docs, 1.0)
+            lists = []
+            for term, _ in parsed:
+                if term not in self._postings:
+                    return 0, []
+                lists.append((term, dict(self._decoded(term))))
+            docs = list(self._docs)
+        lists.sort(key=lambda item: len(item[1]))
+        candidates = set(lists[0][1])
+        for _, postings in lists[1:]:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return 0, []
+        scored = []
+        for doc_id in candidates:
+            doc = docs[doc_id]
+            if doc is None or (project is not None and doc.project != project):
+                continue
+            norm = _K1 * (1 - _B + _B * doc.length / avgdl)
+            score = 0.0
+            for _, postings in lists:
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                tf = postings[doc_id]
+                score += idf * tf * (_K1 + 1) / (tf + norm)
+            scored.append(SearchHit(doc, score))
+        scored.sort(key=lambda h: (-h.score, h.doc.project, h.doc.file))
+        page = scored[offset:offset + limit]
+        needles = [needle for _, needle in parsed]
+        for hit in page:
+            self._add_snippet(hit, needles)
+        return len(scored), page
+
+    def _add_snippet(self, hit: SearchHit, needles: List[str]) -> None:
+        root = self.projects_dir / hit.doc.project
+        if hit.doc.file == ASSETS_DOC:
+            lowered = [n.lower() for n in needles]
+            matches = [
+                rel
+                for rel in self._inventory(root)
+                if any(n in rel.lower() for n in lowered)
+            ]
+            hit.snippet = ", ".join(sorted(matches)[:5])
+            return
+        try:
+            text = (root / hit.doc.file).read_text("utf-8", errors="replace")
+        except OSError:
+            return
+        hit.snippet, hit.highlights = make_snippet(text, needles)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._doc_ids),
+                "terms": len(self._postings),
+                "pending": len(self._queued),
+            }
+
+    # ---- persistence ----
+    def load(self) -> None:
+        """Read the saved index (if any); unreadable or outdated files are ignored."""
+        try:
+            raw = self.index_path.read_bytes()
+            if raw[:4] != _MAGIC:
+                raise ValueError("bad magic")
+            data = marshal.loads(zlib.decompress(raw[4:]))
+            if data.get("version") != SEARCH_INDEX_VERSION:
+                raise ValueError("old version")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            LOG.warning("Ignoring unreadable search index %s (%s)", self.index_path, e)
+            return
+        with self._lock:
+            self._saved_terms = data["terms"]
+            self._docs = [
+                SearchDoc(p, f, tuple(sig), n) for p, f, sig, n in data["docs"]
+            ]
+            self._doc_ids = {(d.project, d.file): i for i, d in enumerate(self._docs)}
+            self._doc_terms = dict(enumerate(data["doc_terms"]))
+            self._postings = dict(zip(self._saved_terms, data["postings"]))
+            self._total_length = sum(d.length for d in self._docs if d is not None)
+        LOG.info("Search index loaded: %d documents", len(self._docs))
+
+    def flush(self) -> None:
+        """Write the index to disk now (atomically), renumbering documents densely."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            live = [i for i, d in enumerate(self._docs) if d is not None]
+            renumber = {old: new for new, old in enumerate(live)}
+            terms = sorted(self._postings)
+            term_ids = {t: i for i, t in enumerate(terms)}
+            postings = []
+            for term in terms:
+                decoded = self._decoded(term)
+                postings.append(
+                    _pack_postings({renumber[d]: tf for d, tf in decoded.items()})
+                )
+            doc_terms = []
+            for old in live:
+                ids = array("I", sorted(term_ids[t] for t in self._terms_of(old)))
+                doc_terms.append(ids.tobytes())
+            docs = [
+                (d.project, d.file, list(d.signature), d.length)
+                for d in (self._docs[i] for i in live)
+                if d is not None
+            ]
+            # adopt the compact numbering in memory too
+            self._docs = [self._docs[i] for i in live]
+            self._doc_ids = {
+                (d.project, d.file): i for i, d in enumerate(self._docs) if d
+            }
+            self._doc_terms = dict(enumerate(doc_terms))
+            self._saved_terms = terms
+            self._postings = dict(zip(terms, postings))
+        blob = marshal.dumps(
+            {
+                "version": SEARCH_INDEX_VERSION,
+                "terms": terms,
+                "docs": docs,
+                "doc_terms": doc_terms,
+                "postings": postings,
+            }
+        )
+        try:
+            self.index_path.parent.mkdir(exist_ok=True)
+            atomic_write(self.index_path, _MAGIC + zlib.compress(blob, 6))
+        except OSError:
+            LOG.exception("Failed to write search index %s", self.index_path)
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+def _pack_postings(postings: Dict[int, int]) -> bytes:
+    ids = array("I", sorted(postings))
+    tfs = array("H", (postings[i] for i in ids))
+    return ids.tobytes() + tfs.tobytes()
+
+
+def _unpack_postings(packed: bytes) -> Dict[int, int]:
+    n = len(packed) // 6
+    ids = array("I")
+    ids.frombytes(packed[: 4 * n])
+    tfs = array("H")
+    tfs.frombytes(packed[4 * n:])
+    return dict(zip(ids, tfs))
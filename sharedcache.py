@@ -0,0 +1,523 @@
+# sharedcache.py — cache backends shared by gunicorn workers, with generation counters
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the mmap backend falls back to "local"
+    fcntl = None  # type: ignore[assignment]
+
+LOG = logging.getLogger(__name__)
+
+# Backend used when CACHE_URL is not set: shared, so that workers started
+# without gunicorn.conf.py still see each other's project changes
+CACHE_DEFAULT_URL = "mmap"
+CACHE_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+# Shared-memory file: total size and slot size (a value must fit one slot)
+CACHE_MMAP_SIZE = 64 * 1024 * 1024
+CACHE_MMAP_SLOT_SIZE = 64 * 1024
+CACHE_MMAP_FILE_NAME = ".shared-cache"
+# A key lives in one of this many consecutive slots
+CACHE_MMAP_WAYS = 4
+# Generation counters in the shared file; namespaces are hashed onto them
+CACHE_COUNTERS = 4096
+CACHE_REDIS_PREFIX = "htmlcreator:"
+
+# Generation namespaces bumped by ProjectManager writes
+PROJECTS_NS = "projects"  # any write, create or delete
+PROJECT_NAMES_NS = "projects:names"  # a project appeared or went away
+
+_MAGIC = b"HCSC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIII")  # magic, version, counters, slots, slot size
+_HEADER_SIZE = 64
+_U64 = struct.Struct("<Q")
+_SLOT_HEAD = struct.Struct("<Q16sI")  # seq, key digest, value length
+_SLOT_HEAD_SIZE = 32
+_EMPTY_KEY = bytes(16)
+_SIZE_RE = re.compile(r"^(\d+)([kmg]?)b?$", re.I)
+
+
+def project_namespace(name: str) -> str:
+    """Generation namespace of one project's files."""
+    return f"project:{name}"
+
+
+def parse_size(text: str) -> int:
+    """'64M' -> bytes."""
+    m = _SIZE_RE.match(text.strip())
+    if not m:
+        raise ValueError(f"invalid size: {text!r}")
+    return int(m.group(1)) * 1024 ** " kmg".index(m.group(2).lower() or " ")
+
+
+class CacheBackend:
+    """
+    Store of byte values by key, plus named generation counters.
+
+    `shared` says whether other processes see the same entries and
+    counters. Backends never raise on cache errors: a failed read is a miss.
+    """
+
+    shared = False
+    name = "backend"
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> bool:
+        """Store a value; returns False when it was not cached (e.g. too large)."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def generations(self, namespaces: List[str]) -> List[int]:
+        """Current counter of each namespace (0 if never bumped)."""
+        raise NotImplementedError
+
+    def bump(self, namespace: str) -> int:
+        """Increment a namespace's counter; returns the new value."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses}
+
+
+class LocalCache(CacheBackend):
+    """In-process LRU: fast, but every worker has its own copy."""
+
+    name = "local"
+
+    def __init__(self, max_bytes: int = CACHE_LOCAL_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> bool:
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._entries[key] = value
+            self._total_bytes += len(value)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+
+    def generations(self, namespaces: List[str]) -> List[int]:
+        with self._lock:
+            return [self._generations.get(ns, 0) for ns in namespaces]
+
+    def bump(self, namespace: str) -> int:
+        with self._lock:
+            value = self._generations.get(namespace, 0) + 1
+            self._generations[namespace] = value
+            return value
+
+
+class MmapCache(CacheBackend):
+    """
+    Cache in a shared memory-mapped file, seen by every process mapping it.
+
+    The file holds a header, CACHE_COUNTERS generation counters and
+    fixed-size slots. A key hashes to CACHE_MMAP_WAYS consecutive slots;
+    a full set evicts round-robin. Writers serialize through fcntl record
+    locks on the slot (or counter) they change, plus a thread lock since
+    record locks are per process. Readers take no lock: every slot starts
+    with a sequence number that is odd while a write is in progress, and a
+    read that saw it change is a miss.
+    """
+
+    shared = True
+    name = "mmap"
+
+    def __init__(
+        self,
+        path: Path,
+        size: int = CACHE_MMAP_SIZE,
+        slot_size: int = CACHE_MMAP_SLOT_SIZE,
+    ):
+        super().__init__()
+        if fcntl is None:
+            raise RuntimeError("the mmap cache needs fcntl (POSIX)")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        self._victim = 0
+        with self._locked(0, _HEADER_SIZE):
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and header[:4] == _MAGIC:
+                _, version, counters, slots, slot_size_ = _HEADER.unpack(header)
+            else:
+                version = 0
+            if version != _VERSION:
+                counters = CACHE_COUNTERS
+                slot_size_ = max(slot_size, _SLOT_HEAD_SIZE * 2)
+                slots = max(CACHE_MMAP_WAYS, (size - self._data_offset(counters)) // slot_size_)
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._data_offset(counters) + slots * slot_size_)
+                os.pwrite(
+                    self._fd,
+                    _HEADER.pack(_MAGIC, _VERSION, counters, slots, slot_size_),
+                    0,
+                )
+        self.counters, self.slots, self.slot_size = counters, slots, slot_size_
+        self.capacity = slot_size_ - _SLOT_HEAD_SIZE
+        self._data = self._data_offset(counters)
+        self._mm = mmap.mmap(self._fd, self._data + slots * slot_size_)
+
+    @staticmethod
+    def _data_offset(counters: int) -> int:
+        # slots start on a page boundary
+        end = _HEADER_SIZE + counters * _U64.size
+        return -(-end // mmap.PAGESIZE) * mmap.PAGESIZE
+
+    @contextmanager
+    def _locked(self, start: int, length: int) -> Iterator[None]:
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _probe(self, digest: bytes) -> List[int]:
+        first = int.from_bytes(digest[:8], "little") % self.slots
+        return [(first + i) % self.slots for i in range(CACHE_MMAP_WAYS)]
+
+    def _slot(self, index: int) -> int:
+        return self._data + index * self.slot_size
+
+    def _counter(self, namespace: str) -> int:
+        digest = hashlib.blake2b(namespace.encode("utf-8"), digest_size=8).digest()
+        return _HEADER_SIZE + int.from_bytes(digest, "little") % self.counters * 8
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest = _key_digest(key)
+        mm = self._mm
+        for index in self._probe(digest):
+            offset = self._slot(index)
+            seq, stored, length = _SLOT_HEAD.unpack_from(mm, offset)
+            if stored != digest or seq & 1 or length > self.capacity:
+                continue
+            start = offset + _SLOT_HEAD_SIZE
+            value = mm[start : start + length]
+            if _U64.unpack_from(mm, offset)[0] != seq:
+                continue  # overwritten while we read it
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> bool:
+        if len(value) > self.capacity:
+            return False
+        digest = _key_digest(key)
+        probe = self._probe(digest)
+        heads = [_SLOT_HEAD.unpack_from(self._mm, self._slot(i)) for i in probe]
+        index = next((i for i, h in zip(probe, heads) if h[1] == digest), None)
+        if index is None:
+            index = next((i for i, h in zip(probe, heads) if h[1] == _EMPTY_KEY), None)
+        if index is None:
+            self._victim = (self._victim + 1) % CACHE_MMAP_WAYS
+            index = probe[self._victim]
+        self._write_slot(index, digest, value)
+        return True
+
+    def delete(self, key: str) -> None:
+        digest = _key_digest(key)
+        for index in self._probe(digest):
+            if _SLOT_HEAD.unpack_from(self._mm, self._slot(index))[1] == digest:
+                self._write_slot(index, _EMPTY_KEY, b"")
+
+    def _write_slot(self, index: int, digest: bytes, value: bytes) -> None:
+        offset = self._slot(index)
+        mm = self._mm
+        with self._locked(offset, self.slot_size):
+            seq = _U64.unpack_from(mm, offset)[0] | 1
+            _U64.pack_into(mm, offset, seq)  # odd: readers skip the slot
+            start = offset + _SLOT_HEAD_SIZE
+            mm[start : start + len(value)] = value
+            _SLOT_HEAD.pack_into(mm, offset, seq, digest, len(value))
+            _U64.pack_into(mm, offset, seq + 1)
+
+    def generations(self, namespaces: List[str]) -> List[int]:
+        mm = self._mm
+        return [_U64.unpack_from(mm, self._counter(ns))[0] for ns in namespaces]
+
+    def bump(self, namespace: str) -> int:
+        offset = self._counter(namespace)
+        with self._locked(offset, _U64.size):
+            value = _U64.unpack_from(self._mm, offset)[0] + 1
+            _U64.pack_into(self._mm, offset, value)
+        return value
+
+    def stats(self) -> dict:
+        out = super().stats()
+        out.update(path=str(self.path), slots=self.slots, slot_size=self.slot_size)
+        return out
+
+
+class RedisCache(CacheBackend):
+    """
+    Redis (or a compatible server such as Valkey or KeyDB) on the local
+    machine. Needs the optional `redis` package. Errors count as misses;
+    unreadable generations read as -1 so that consumers resynchronize.
+    """
+
+    shared = True
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = CACHE_REDIS_PREFIX):
+        super().__init__()
+        import redis  # optional dependency, only needed for this backend
+
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self._client.get(self.prefix + key)
+        except self._errors:
+            LOG.warning("Redis cache read failed", exc_info=True)
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> bool:
+        try:
+            self._client.set(self.prefix + key, value)
+            return True
+        except self._errors:
+            LOG.warning("Redis cache write failed", exc_info=True)
+            return False
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(self.prefix + key)
+        except self._errors:
+            LOG.warning("Redis cache delete failed", exc_info=True)
+
+    def generations(self, namespaces: List[str]) -> List[int]:
+        if not namespaces:
+            return []
+        keys = [f"{self.prefix}gen:{ns}" for ns in namespaces]
+        try:
+            return [int(v or 0) for v in self._client.mget(keys)]
+        except self._errors:
+            LOG.warning("Redis generation read failed", exc_info=True)
+            return [-1] * len(namespaces)
+
+    def bump(self, namespace: str) -> int:
+        try:
+            return int(self._client.incr(f"{self.prefix}gen:{namespace}"))
+        except self._errors:
+            LOG.warning("Redis generation bump failed", exc_info=True)
+            return -1
+
+
+def _key_digest(key: str) -> bytes:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    # the all-zero digest marks an empty slot
+    return digest if digest != _EMPTY_KEY else b"\x01" + digest[1:]
+
+
+def default_mmap_path(projects_dir: Path) -> Path:
+    """/dev/shm when available (RAM only), else a file in the projects folder."""
+    if os.path.isdir("/dev/shm"):
+        tag = hashlib.sha1(str(projects_dir).encode("utf-8")).hexdigest()[:12]
+        return Path("/dev/shm") / f"htmlcreator-{tag}.cache"
+    return projects_dir / CACHE_MMAP_FILE_NAME
+
+
+def open_backend(url: Optional[str], projects_dir: Path) -> CacheBackend:
+    """
+    Build the backend named by a CACHE_URL:
+
+        local                                 in-process LRU
+        mmap  |  mmap:///path?size=64M&slot=64K   shared-memory file (default)
+        redis://localhost:6379/0  |  unix:///run/redis.sock
+
+    :raises ValueError: if the URL names no known backend.
+    """
+    url = (url or CACHE_DEFAULT_URL).strip()
+    parsed = urlparse(url if "://" in url else f"{url}://")
+    scheme = parsed.scheme.lower()
+    if scheme == "local":
+        return LocalCache()
+    if scheme == "mmap":
+        if fcntl is None:
+            LOG.warning("mmap cache needs fcntl; using the in-process cache")
+            return LocalCache()
+        query = parse_qs(parsed.query)
+        size = parse_size(query["size"][0]) if "size" in query else CACHE_MMAP_SIZE
+        slot = parse_size(query["slot"][0]) if "slot" in query else CACHE_MMAP_SLOT_SIZE
+        path = Path(parsed.path) if parsed.path else default_mmap_path(projects_dir)
+        return MmapCache(path, size=size, slot_size=slot)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisCache(url)
+    raise ValueError(f"unknown cache backend: {url}")
+
+
+@dataclass
+class SharedCache:
+    """
+    Values cached under a namespace, tagged with the namespace's generation.
+
+    `invalidate` bumps the generation, so every worker's next lookup misses
+    without anything being deleted. Values are tagged with the generation
+    read *before* they were computed (see `get_or_compute`), so a value
+    computed from data that changed meanwhile is never served.
+    """
+
+    backend: CacheBackend
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def generations(self, namespaces: List[str]) -> List[int]:
+        return self.backend.generations(namespaces)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        raw = self.backend.get(f"{namespace}/{key}")
+        if raw is None or len(raw) < _U64.size:
+            return None
+        (stored,) = _U64.unpack_from(raw)
+        if stored != self.backend.generations([namespace])[0]:
+            return None
+        return raw[_U64.size :]
+
+    def set(
+        self, namespace: str, key: str, value: bytes, generation: Optional[int] = None
+    ) -> bool:
+        if generation is None:
+            generation = self.backend.generations([namespace])[0]
+        if generation < 0:
+            return False
+        return self.backend.set(f"{namespace}/{key}", _U64.pack(generation) + value)
+
+    def get_or_compute(
+        self, namespace: str, key: str, compute: Callable[[], bytes]
+    ) -> bytes:
+        generation = self.backend.generations([namespace])[0]
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            self.set(namespace, key, value, generation)
+        return value
+
+    def invalidate(self, namespace: str) -> int:
+        return self.backend.bump(namespace)
+
+
+class GenerationSnapshot(NamedTuple):
+    any: int
+    names: int
+    projects: Dict[str, int]
+
+
+@dataclass
+class ProjectGenerations:
+    """
+    This process's view of the project generations bumped by every worker.
+
+    Writers call `bump` after a project's files changed on disk. A reader
+    (the project registry) takes a `snapshot` of the counters *before*
+    looking at the disk and `commit`s it afterwards; `stale` says whether
+    anything was bumped since (one counter read), `changed` which projects.
+    """
+
+    cache: SharedCache
+    _any: int = field(default=-1, init=False)
+    _names: int = field(default=-1, init=False)
+    _seen: Dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def stale(self) -> bool:
+        return self.cache.generations([PROJECTS_NS])[0] != self._any
+
+    def snapshot(self, names: Iterable[str]) -> GenerationSnapshot:
+        names = list(names)
+        counters = self.cache.generations(
+            [PROJECTS_NS, PROJECT_NAMES_NS] + [project_namespace(n) for n in names]
+        )
+        return GenerationSnapshot(counters[0], counters[1], dict(zip(names, counters[2:])))
+
+    def listing_changed(self, snapshot: GenerationSnapshot) -> bool:
+        return snapshot.names != self._names
+
+    def changed(self, snapshot: GenerationSnapshot) -> List[str]:
+        with self._lock:
+            return [
+                name
+                for name, gen in snapshot.projects.items()
+                if gen < 0 or self._seen.get(name) != gen
+            ]
+
+    def commit(self, snapshot: GenerationSnapshot) -> None:
+        with self._lock:
+            self._any, self._names = snapshot.any, snapshot.names
+            self._seen = dict(snapshot.projects)
+
+    def bump(self, name: str, *, listing: bool = False) -> None:
+        """
+        Publish a change of project `name` (and of the project list). When
+        nothing else was bumped since our last look, our own change is
+        marked as seen: this process already applied it.
+        """
+        generation = self.cache.invalidate(project_namespace(name))
+        names = self.cache.invalidate(PROJECT_NAMES_NS) if listing else None
+        any_ = self.cache.invalidate(PROJECTS_NS)
+        with self._lock:
+            if self._seen.get(name) == generation - 1:
+                self._seen[name] = generation
+            if names is not None and names == self._names + 1:
+                self._names = names
+            if any_ == self._any + 1:
+                self._any = any_
@@ -0,0 +1,127 @@
+# startup.py — startup phase timings and components built on first use
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+LOG = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class StartupReport:
+    """
+    Wall time of each phase of create_app, each measured from the previous
+    `mark`. Components built later, on first use (`Lazy`), are listed
+    separately: their cost lands on a request, not on startup.
+    """
+
+    started: float = field(default_factory=time.perf_counter)
+    phases: List[Tuple[str, float]] = field(default_factory=list)
+    lazy: List[Tuple[str, float]] = field(default_factory=list)
+    _last: float = field(default=0.0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._last = self.started
+
+    def mark(self, phase: str) -> float:
+        """Close `phase` (it ran since the previous mark); returns its seconds."""
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        self.phases.append((phase, seconds))
+        return seconds
+
+    def record_lazy(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.lazy.append((name, seconds))
+
+    @property
+    def total(self) -> float:
+        """Seconds from creation to the last mark."""
+        return self._last - self.started
+
+    def timings(self) -> List[Tuple[str, float]]:
+        """Phases, then lazy builds as "lazy:<name>", in seconds."""
+        with self._lock:
+            lazy = list(self.lazy)
+        return list(self.phases) + [(f"lazy:{name}", s) for name, s in lazy]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            lazy = list(self.lazy)
+        return {
+            "total_ms": round(self.total * 1000, 2),
+            "phases": {name: round(s * 1000, 2) for name, s in self.phases},
+            "lazy": {name: round(s * 1000, 2) for name, s in lazy},
+        }
+
+    def summary(self) -> str:
+        """One log line: total, then every phase in order."""
+        parts = ", ".join(f"{name} {s * 1000:.1f}" for name, s in self.phases)
+        return f"{self.total * 1000:.1f} ms ({parts})"
+
+
+class Lazy(Generic[T]):
+    """
+    A component built on first `get()` (once, thread-safe) instead of at
+    startup. `peek()` returns it only if it was built, and `forward(method)`
+    makes a listener that reaches it only then, so change notifications do
+    not force a build.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], T],
+        report: Optional[StartupReport] = None,
+    ):
+        self.name = name
+        self._factory = factory
+        self._report = report
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    seconds = time.perf_counter() - started
+                    if self._report is not None:
+                        self._report.record_lazy(self.name, seconds)
+                value = self._value
+        return value
+
+    def peek(self) -> Optional[T]:
+        return self._value
+
+    def prefetch(self) -> None:
+        """Build it in a daemon thread: warm, without blocking the caller."""
+        if self._value is None:
+            threading.Thread(
+                target=self._prefetch, name=f"build-{self.name}", daemon=True
+            ).start()
+
+    def forward(self, method: str) -> Callable[..., None]:
+        """Callable running `method` of the component if it is built (else nothing)."""
+
+        def call(*args, **kwargs) -> None:
+            value = self._value
+            if value is not None:
+                getattr(value, method)(*args, **kwargs)
+
+        return call
+
+    def _prefetch(self) -> None:
+        try:
+            self.get()
+        except Exception:
+            LOG.exception("Failed to build %s", self.name)
@@ -47,7 +47,8 @@
     let currentProject = null;
     let selectedElement = null;  // element inside iframe
     let doc = null;              // iframe document when accessible
-    let tagsAttrs = null;        // json from /api/tags_attributes
+    let tagsAttrs = null;        // {tags, global} from /api/tags
+    const tagAttrCache = new Map(); // tag -> attributes from /api/tags_attributes/<tag>
     let clickHandlerAttached = false;
     // ---------- additional state: history & helpers ----------
     let history = [];
@@ -311,8 +312,7 @@
         ? (tagsDatalist ? Array.from(tagsDatalist.options).map(o => o.value) : [])
         : Array.from(newTagSelect.options).map(o => o.value);
 
-      Object.keys(tagsAttrs).sort().forEach(tag => {
-        if(tag === "global") return;
+      (tagsAttrs.tags || []).forEach(tag => {
         if(existingValues.includes(tag)) return;
         if(isInput){
           if(tagsDatalist){
@@ -329,8 +329,9 @@
       });
     }
 
-    // fetch tags/attributes JSON once (optional)
-    fetch("/api/tags_attributes")
+    // fetch the tag names once (optional); each tag's attributes are fetched
+    // when an element of that tag is first selected
+    fetch("/api/tags")
       .then(r => {
         if(!r.ok) throw new Error("tags_attributes not found");
         return r.json();
@@ -343,6 +344,28 @@
         console.warn("tags_attributes JSON not available:", err);
       });
 
+    // attributes of `tag` (global + its own), or null while being fetched;
+    // `onLoaded` runs once a fetch started here completes
+    function attributesForTag(tag, onLoaded){
+      if(tagAttrCache.has(tag)) return tagAttrCache.get(tag);
+      tagAttrCache.set(tag, null);
+      fetch(`/api/tags_attributes/${encodeURIComponent(tag)}`)
+        .then(r => {
+          if(r.status === 404) return {attributes: (tagsAttrs && tagsAttrs.global) || []};
+          if(!r.ok) throw new Error(`attributes of <${tag}> not available`);
+          return r.json();
+        })
+        .then(data => {
+          tagAttrCache.set(tag, data.attributes || []);
+          onLoaded();
+        })
+        .catch(err => {
+          tagAttrCache.delete(tag);
+          console.warn(err);
+        });
+      return null;
+    }
+
     // ---------- Parent overlay (no injection into iframe) ----------
     function ensureParentOverlay(){
       let ov = document.getElementById("__editor_highlight_overlay_parent");
@@ -483,10 +506,10 @@
       const tag = node.tagName ? node.tagName.toLowerCase() : "#text";
       if(attrStatic.info) attrStatic.info.textContent = `<${tag}>`;
 
-      // gather global + specific attributes
-      let list = [];
-      if(tagsAttrs && tagsAttrs.global) list = list.concat(tagsAttrs.global);
-      if(tagsAttrs && tagsAttrs[tag]) list = list.concat(tagsAttrs[tag]);
+      // gather global + specific attributes (id/class only until they arrive)
+      let list = (attributesForTag(tag, () => {
+        if(selectedElement === node) fillAttrPanelDynamic(node);
+      }) || []).slice();
 
       // ensure id/class appear at top
       if(!list.includes("id")) list.unshift("id");
@@ -593,20 +616,32 @@
     // ------------------ Style tab: schema-driven inspector & tab switching ------------------
     // Paste this block IMMEDIATELY after the end of function fillAttrPanel(node) { ... }
       
-    // load css schema once (schema file exists at /static/css-schema-full.json)
-    let cssSchema = null;
-    async function loadCssSchema() {
-      try {
-        const r = await fetch('/static/css-schema-full.json');
-        if (!r.ok) throw new Error('schema not found');
-        cssSchema = await r.json();
-        console.log('CSS schema loaded');
-      } catch (err) {
-        console.warn('Failed to load css schema:', err);
-        cssSchema = null;
+    // CSS schema lookups go through the server-side index instead of
+    // downloading the whole schema: one request per search returns the
+    // matching properties with their entries, which are kept once fetched
+    const CSS_LIST_LIMIT = 40;
+    const cssPropertyCache = new Map();
+    async function completeCssProperties(filter) {
+      const q = new URLSearchParams({
+        prefix: filter, match: 'contains', documents: '1', limit: String(CSS_LIST_LIMIT)
+      });
+      const r = await fetch(`/api/css/complete?${q}`);
+      if (!r.ok) throw new Error('css completion not available');
+      const data = await r.json();
+      Object.entries(data.documents || {}).forEach(([name, def]) => cssPropertyCache.set(name, def));
+      return data.properties || [];
+    }
+    // entries for `names`, fetching the ones not cached yet in one request
+    async function loadCssProperties(names) {
+      const missing = names.filter(n => !cssPropertyCache.has(n));
+      if (missing.length) {
+        const r = await fetch(`/api/css/properties?${new URLSearchParams({ names: missing.join(',') })}`);
+        if (!r.ok) throw new Error('css properties not available');
+        const found = (await r.json()).properties || {};
+        missing.forEach(n => cssPropertyCache.set(n, found[n] || {}));
       }
+      return names.map(n => cssPropertyCache.get(n));
     }
-    loadCssSchema();
     
     // helper: compute a usable selector for the element (prefer id, then first class, then tag)
     function computeSelectorForElement(el) {
@@ -1059,7 +1094,7 @@
   }
 
 
-    // render the searchable properties list from cssSchema into attr-dynamic-list
+    // render the searchable properties list into attr-dynamic-list
     function renderPropertiesList(node) {
       const container = attrDynamicList || document.getElementById('attr-dynamic-list');
       if(!container) return;
@@ -1074,25 +1109,41 @@
       const listWrap = document.createElement('div'); listWrap.id = 'props-list'; listWrap.style.maxHeight='380px'; listWrap.style.overflow='auto';
       container.appendChild(listWrap);
     
-      if(!cssSchema || !cssSchema.properties) {
-        const hint = document.createElement('div'); hint.className='muted'; hint.textContent = 'CSS schema not loaded yet.';
-        listWrap.appendChild(hint); return;
-      }
-    
-      const allProps = Object.keys(cssSchema.properties || {}).sort();
       const common = ['display','color','background-color','font-size','margin','padding','width','height','border','box-shadow','opacity'];
-      const ordered = [...new Set([...common.filter(p => allProps.includes(p)), ...allProps])];
+      let generation = 0;
+    
+      function showHint(text) {
+        const hint = document.createElement('div'); hint.className='muted'; hint.textContent = text;
+        listWrap.appendChild(hint);
+      }
     
-      function populate(filter='') {
+      async function populate(filter='') {
+        const mine = ++generation;
+        filter = filter.toLowerCase();
+        let names, defs;
+        try {
+          names = await completeCssProperties(filter);
+          names = [...new Set([...common.filter(p => p.includes(filter)), ...names])];
+          defs = await loadCssProperties(names);
+        } catch (err) {
+          console.warn('Failed to complete css properties:', err);
+          if (mine !== generation) return;
+          listWrap.innerHTML = '';
+          showHint('CSS schema not available.');
+          return;
+        }
+        // a newer search finished first
+        if (mine !== generation) return;
         listWrap.innerHTML = '';
-        ordered.filter(p => p.indexOf(filter) !== -1).forEach(p => {
-          const def = cssSchema.properties[p] || {};
-          const row = createPropRow(p, def);
-          listWrap.appendChild(row);
-        });
+        names.forEach((p, i) => listWrap.appendChild(createPropRow(p, defs[i])));
+        if (names.length >= CSS_LIST_LIMIT) showHint('Type to search more properties...');
       }
       populate('');
-      search.addEventListener('input', () => populate(search.value.trim()));
+      let searchTimer = null;
+      search.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => populate(search.value.trim()), 150);
+      });
     }
     
     // Build CSS rule string from visible inspector rows (selector included)
@@ -1477,6 +1528,60 @@
     if(refreshBtn) refreshBtn.addEventListener("click", loadProjects);
     loadProjects();
 
+    // ---------- Live reload (server-sent change events) ----------
+    // Live reload is best-effort: a WSGI worker serves only a few streams and
+    // answers 503 past that. EventSource cannot see the status, so any error
+    // closes the stream and we reconnect with exponential backoff, giving up
+    // after LIVE_MAX_FAILURES attempts in a row that never connected.
+    const LIVE_RETRY_MS = 2000;
+    const LIVE_RETRY_MAX_MS = 120000;
+    const LIVE_MAX_FAILURES = 6;
+    let liveEvents = null;
+    let liveRetry = null;
+    function startLiveReload(projectName, failures = 0){
+      stopLiveReload();
+      if(!window.EventSource) return;
+      const source = new EventSource(`/api/projects/${encodeURIComponent(projectName)}/events`);
+      let opened = false;
+      liveEvents = source;
+      source.addEventListener("open", () => { opened = true; });
+      source.addEventListener("error", () => {
+        if(liveEvents !== source) return;
+        stopLiveReload();
+        const failed = opened ? 0 : failures + 1;
+        if(failed >= LIVE_MAX_FAILURES){
+          console.warn("Live reload unavailable; reopen the project to retry");
+          return;
+        }
+        // jitter keeps tabs refused together from retrying together
+        const delay = Math.min(LIVE_RETRY_MS * 2 ** failed, LIVE_RETRY_MAX_MS) * (1 + Math.random() / 2);
+        liveRetry = setTimeout(() => startLiveReload(projectName, failed), delay);
+      });
+      source.addEventListener("change", (e) => {
+        let ev = null;
+        try { ev = JSON.parse(e.data); } catch(err){ return; }
+        if(!iframe || currentProject !== projectName) return;
+        // css: swap matching stylesheets in place when the iframe document is reachable
+        if(ev.kind === "css" && !ev.deleted){
+          try {
+            const idoc = iframe.contentDocument;
+            const links = idoc ? Array.from(idoc.querySelectorAll('link[rel="stylesheet"]')) : [];
+            const hits = links.filter(l => (l.getAttribute("href") || "").split("?")[0].endsWith(ev.file));
+            if(hits.length){
+              hits.forEach(l => { l.href = `${l.getAttribute("href").split("?")[0]}?v=${ev.hash}`; });
+              return;
+            }
+          } catch(err){ /* sandboxed preview: fall through to reload */ }
+        }
+        // the editor (load mode) owns its document; only preview reloads wholesale
+        if(currentMode === "preview") iframe.src = `/projects/${encodeURIComponent(projectName)}/index.html`;
+      });
+    }
+    function stopLiveReload(){
+      if(liveRetry){ clearTimeout(liveRetry); liveRetry = null; }
+      if(liveEvents){ liveEvents.close(); liveEvents = null; }
+    }
+
     // ---------- Open / Close modal ----------
     function openModal(projectName, mode = "preview"){
       currentProject = projectName;
@@ -1507,6 +1612,7 @@
         if(domTree) domTree.style.display = "none";
       }
       if(iframe) iframe.src = `/projects/${encodeURIComponent(projectName)}/index.html`;
+      startLiveReload(projectName);
       // try to fetch the project's style.css into full-css-editor (non-blocking)
       fetch(`/projects/${encodeURIComponent(projectName)}/style.css`).then(r => {
         if(!r.ok) throw new Error('no css');
@@ -1534,6 +1640,7 @@
     }
 
     function closeModal(){
+      stopLiveReload();
       if(modalWrap){
         modalWrap.classList.add("modal-hidden");
         modalWrap.style.display = "none";
@@ -0,0 +1,127 @@
+import io
+import stat
+import zipfile
+
+import pytest
+
+from archive import (
+    ArchiveError,
+    declared_totals,
+    extract_zip,
+    import_into,
+    stream_zip,
+)
+
+
+def make_zip(entries, compression=zipfile.ZIP_DEFLATED) -> io.BytesIO:
+    """ZIP of {name or ZipInfo: bytes}."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def files_under(root):
+    return sorted(
+        p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file()
+    )
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["../evil.html", "a/../../evil.html", "..\\evil.html", "a\\..\\..\\evil.html"],
+)
+def test_path_traversal_is_rejected(tmp_path, name):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    with pytest.raises(ArchiveError, match="unsafe path"):
+        extract_zip(make_zip({"index.html": b"ok", name: b"evil"}), dest)
+    assert not (tmp_path / "evil.html").exists()
+
+
+def test_absolute_path_is_rejected(tmp_path):
+    info = zipfile.ZipInfo("x")
+    info.filename = "/etc/evil"
+    with pytest.raises(ArchiveError, match="unsafe path"):
+        extract_zip(make_zip({info: b"evil"}), tmp_path)
+
+
+def test_symlink_entry_is_rejected(tmp_path):
+    info = zipfile.ZipInfo("link")
+    info.external_attr = (stat.S_IFLNK | 0o777) << 16
+    with pytest.raises(ArchiveError, match="symlinks"):
+        extract_zip(make_zip({info: b"/etc/passwd"}), tmp_path)
+    assert not (tmp_path / "link").exists()
+
+
+def test_entry_limit(tmp_path):
+    archive = make_zip({f"f{i}.txt": b"x" for i in range(5)})
+    with pytest.raises(ArchiveError, match="too many entries"):
+        extract_zip(archive, tmp_path, max_entries=4)
+
+
+def test_declared_total_limit(tmp_path):
+    archive = make_zip({"a.txt": b"x" * 600, "b.txt": b"y" * 600})
+    with pytest.raises(ArchiveError, match="too large"):
+        extract_zip(archive, tmp_path, max_total_bytes=1000)
+    assert files_under(tmp_path) == []
+
+
+def test_compression_ratio_limit(tmp_path):
+    archive = make_zip({"bomb.txt": b"\0" * (1024 * 1024)})
+    with pytest.raises(ArchiveError, match="ratio"):
+        extract_zip(archive, tmp_path, max_ratio=50)
+
+
+def test_not_a_zip(tmp_path):
+    with pytest.raises(ArchiveError, match="not a zip"):
+        extract_zip(io.BytesIO(b"plain text"), tmp_path)
+    with pytest.raises(ArchiveError, match="not a zip"):
+        declared_totals(io.BytesIO(b"plain text"))
+
+
+def test_wrapping_folder_is_stripped_and_internal_files_skipped(tmp_path):
+    archive = make_zip(
+        {
+            "site/index.html": b"<p>hi</p>",
+            "site/css/style.css": b"p {}",
+            "site/.history/x": b"internal",
+        }
+    )
+    files, total = extract_zip(archive, tmp_path)
+    assert (files, total) == (2, len(b"<p>hi</p>") + len(b"p {}"))
+    assert files_under(tmp_path) == ["css/style.css", "index.html"]
+
+
+def test_declared_totals():
+    archive = make_zip({"a/": b"", "a/b.txt": b"xyz", "c.txt": b"12345"})
+    assert declared_totals(archive) == (2, 8)
+
+
+def test_failed_import_leaves_nothing_behind(tmp_path):
+    staging, final = tmp_path / "staging" / "job", tmp_path / "project"
+    archive = make_zip({"index.html": b"ok", "../evil": b"evil"})
+    with pytest.raises(ArchiveError):
+        import_into(archive, staging, final)
+    assert not staging.exists()
+    assert not final.exists()
+
+
+def test_export_then_import_round_trip(tmp_path):
+    src = tmp_path / "src"
+    (src / "images").mkdir(parents=True)
+    (src / ".history").mkdir()
+    (src / "index.html").write_bytes(b"<html></html>" * 100)
+    (src / "images" / "logo.png").write_bytes(bytes(range(256)) * 10)
+    (src / ".history" / "index.jsonl").write_bytes(b"internal")
+
+    archive = io.BytesIO(b"".join(stream_zip(src)))
+    final = tmp_path / "copy"
+    files, _ = import_into(archive, tmp_path / "staging", final)
+
+    assert files == 2
+    assert files_under(final) == ["images/logo.png", "index.html"]
+    for rel in files_under(final):
+        assert (final / rel).read_bytes() == (src / rel).read_bytes()
@@ -0,0 +1,146 @@
+import base64
+
+import pytest
+
+from app import ALLOWED_UPLOAD_EXT, ProjectManager, UploadManager
+from batch import BatchError, BatchRunner, parse_batch
+
+
+@pytest.fixture
+def pm(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    for name in ("p1", "p2"):
+        assert pm.create_project(name)[0]
+    # not valid UTF-8: a rollback must restore the bytes, not a decoding of them
+    (pm.project_path("p1") / "index.html").write_bytes(b"caf\xe9 latin-1")
+    (pm.project_path("p2") / "index.html").write_bytes(b"<p>p2</p>")
+    return pm
+
+
+@pytest.fixture
+def runner(pm):
+    um = UploadManager(ALLOWED_UPLOAD_EXT, on_saved=pm.file_written, blobs=pm.blobs)
+    return BatchRunner(pm, um)
+
+
+def run(runner, operations, atomic=True):
+    ops, atomic = parse_batch({"operations": operations, "atomic": atomic})
+    events = list(runner.run(ops, atomic=atomic))
+    summary = events.pop()
+    return {e["index"]: e for e in events}, summary
+
+
+def projects(pm):
+    return sorted(p.name for p in pm.projects_dir.iterdir() if p.name[0] != ".")
+
+
+FAILING = {"op": "save", "project": "missing", "html": "x"}
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\0" * 32).decode()
+
+
+def test_atomic_failure_rolls_back_every_change(pm, runner):
+    results, summary = run(
+        runner,
+        [
+            {"op": "create", "project": "p3"},
+            {"op": "save", "project": "p1", "html": "<p>new</p>"},
+            {"op": "save_css", "project": "p1", "css": "p {}"},
+            {
+                "op": "upload",
+                "project": "p2",
+                "filename": "logo.png",
+                "content_base64": PNG,
+            },
+            {"op": "duplicate", "project": "p2", "new_name": "p2_copy"},
+            FAILING,
+        ],
+    )
+    assert not summary["ok"]
+    assert results[5]["error"] == "project not found"
+    # operations on other projects run in parallel: those that had not started
+    # when the failure came are skipped, the others are undone
+    assert summary["rolled_back"] == sorted(i for i, r in results.items() if r["ok"])
+    assert projects(pm) == ["p1", "p2"]
+    p1, p2 = pm.project_path("p1"), pm.project_path("p2")
+    assert (p1 / "index.html").read_bytes() == b"caf\xe9 latin-1"
+    assert not (p1 / "style.css").exists()
+    assert not list(p2.rglob("logo.png"))
+
+
+def test_atomic_failure_restores_deleted_projects(pm, runner):
+    results, summary = run(
+        runner,
+        [
+            {"op": "save", "project": "p1", "html": "<p>new</p>"},
+            {"op": "delete", "project": "p2"},
+            {"op": "delete", "project": "missing"},
+        ],
+    )
+    assert not summary["ok"]
+    assert summary["rolled_back"] == sorted(i for i, r in results.items() if r["ok"])
+    assert 0 in summary["rolled_back"]
+    assert projects(pm) == ["p1", "p2"]
+    assert (pm.project_path("p2") / "index.html").read_bytes() == b"<p>p2</p>"
+    assert (pm.project_path("p1") / "index.html").read_bytes() == b"caf\xe9 latin-1"
+
+
+def test_deletes_are_skipped_after_a_failure(pm, runner):
+    results, summary = run(runner, [FAILING, {"op": "delete", "project": "p2"}])
+    assert results[1] == {
+        "index": 1,
+        "op": "delete",
+        "project": "p2",
+        "ok": False,
+        "elapsed_ms": 0.0,
+        "error": "skipped: batch aborted",
+    }
+    assert projects(pm) == ["p1", "p2"]
+
+
+def test_successful_atomic_batch_releases_deleted_projects(pm, runner):
+    _, summary = run(
+        runner,
+        [
+            {"op": "save", "project": "p1", "html": "<p>new</p>"},
+            {"op": "delete", "project": "p2"},
+        ],
+    )
+    assert summary["ok"]
+    assert summary["rolled_back"] == []
+    assert projects(pm) == ["p1"]
+    # no longer held for a rollback: the next reaper pass removes it
+    pm.reaper.reap_all()
+    assert not any((pm.projects_dir / ".trash").iterdir())
+
+
+def test_non_atomic_failure_keeps_other_changes(pm, runner):
+    _, summary = run(
+        runner,
+        [{"op": "save", "project": "p1", "html": "<p>new</p>"}, FAILING],
+        atomic=False,
+    )
+    assert (summary["succeeded"], summary["failed"]) == (1, 1)
+    assert summary["rolled_back"] == []
+    assert (pm.project_path("p1") / "index.html").read_bytes() == b"<p>new</p>"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        None,
+        {"operations": []},
+        {"operations": [{"op": "nope", "project": "p1"}]},
+        {"operations": [{"op": "save", "project": "p1"}]},
+        {"operations": [{"op": "create", "project": "../"}]},
+        {
+            "atomic": True,
+            "operations": [
+                {"op": "save", "project": "p1", "html": "x"},
+                {"op": "delete", "project": "p1"},
+            ],
+        },
+    ],
+)
+def test_malformed_batches_are_rejected(payload):
+    with pytest.raises(BatchError):
+        parse_batch(payload)
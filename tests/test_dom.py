@@ -0,0 +1,129 @@
+import pytest
+
+from dom import DomDocument, DomError
+from patching import apply_edits
+
+PAGE = """<!doctype html>
+<html>
+<head><title>T</title><style>p { color: red }</style></head>
+<body>
+  <header id="top" class="bar wide"><h1>Title</h1><br></header>
+  <main class="content">
+    <p class="lead">One <b>bold</b> word</p>
+    <p>Two</p>
+    <img src="a.png" alt="a" />
+    <ul id="list"><li class="item">a</li><li class="item">b</li></ul>
+  </main>
+  <footer id="bottom"><p class="fine">fin</p></footer>
+</body>
+</html>
+"""
+
+
+def snapshot(doc: DomDocument):
+    """Everything observable about a document's tree and indexes."""
+    nodes = list(doc.find())
+    ids = {n.attr("id") for n in nodes if n.attr("id")}
+    classes = {c for n in nodes for c in (n.attr("class") or "").split()}
+    tags = {n.tag for n in nodes}
+    return {
+        "nodes": nodes,
+        "stats": {k: v for k, v in doc.stats().items() if k != "hash"},
+        "ids": {i: list(doc.find(id=i)) for i in ids},
+        "classes": {c: list(doc.find(cls=c)) for c in classes},
+        "tags": {t: list(doc.find(tag=t)) for t in tags},
+    }
+
+
+def path_of(doc: DomDocument, **query) -> str:
+    return next(doc.find(**query)).path
+
+
+def check(doc: DomDocument, path: str, change: dict) -> DomDocument:
+    """Apply `change`; the derived document must match a fresh parse."""
+    edit, updated = doc.apply(path, change)
+    assert apply_edits(doc.text, [edit]) == updated.text
+    assert snapshot(updated) == snapshot(DomDocument(updated.text))
+    return updated
+
+
+@pytest.fixture
+def doc():
+    return DomDocument(PAGE)
+
+
+def test_source_ranges(doc):
+    node = next(doc.find(cls="lead"))
+    assert doc.outer_html(node) == '<p class="lead">One <b>bold</b> word</p>'
+    assert doc.inner_html(node) == "One <b>bold</b> word"
+    img = next(doc.find(tag="img"))
+    assert img.self_closing and img.end == img.open_end
+
+
+@pytest.mark.parametrize(
+    "query, change",
+    [
+        ({"id": "top"}, {"attrs": {"class": "bar", "data-x": "1"}}),
+        ({"id": "top"}, {"attrs": {"id": None}}),
+        ({"tag": "img"}, {"attrs": {"hidden": True, "alt": "<b> & \"q\""}}),
+        ({"cls": "lead"}, {"text": "<not> & markup"}),
+        (
+            {"cls": "lead"},
+            {"inner_html": '<i id="new">x</i><span class="item">y</span>'},
+        ),
+        ({"id": "list"}, {"inner_html": ""}),
+        ({"id": "list"}, {"html": '<ol id="list"><li>z</li></ol>'}),
+        ({"id": "top"}, {"html": ""}),
+        ({"id": "top"}, {"html": '<nav class="bar">a</nav><nav id="second">b</nav>'}),
+        ({"tag": "style"}, {"text": "p { color: blue }"}),
+        ({"tag": "title"}, {"text": "New & improved"}),
+        ({"tag": "li"}, {"inner_html": "<p>unclosed"}),
+    ],
+)
+def test_apply_matches_a_fresh_parse(doc, query, change):
+    check(doc, path_of(doc, **query), change)
+
+
+def test_edits_can_be_chained(doc):
+    two_divs = "<div id='a'>1</div><div>2</div>"
+    doc = check(doc, path_of(doc, id="top"), {"html": two_divs})
+    doc = check(doc, path_of(doc, cls="lead"), {"attrs": {"class": "lead big"}})
+    doc = check(doc, path_of(doc, id="list"), {"inner_html": "<li class='item'>c</li>"})
+    doc = check(doc, path_of(doc, id="bottom"), {"text": "bye"})
+    assert [n.attr("id") for n in doc.find(tag="div")] == ["a", None]
+    assert len(list(doc.find(cls="item"))) == 1
+
+
+def test_original_document_is_unchanged(doc):
+    before = snapshot(doc)
+    doc.apply(path_of(doc, id="list"), {"html": ""})
+    assert snapshot(doc) == before
+
+
+@pytest.mark.parametrize(
+    "path, change",
+    [
+        ("9", {"text": "x"}),
+        ("", {"text": "x"}),
+        ("0/a", {"text": "x"}),
+        ("0/1", {}),
+        ("0/1", {"text": "x", "html": "y"}),
+        ("0/1", {"attrs": {}}),
+        ("0/1", {"attrs": {"bad name": "x"}}),
+        ("0/1", {"attrs": {"x": 1}}),
+        ("0/1", {"text": None}),
+    ],
+)
+def test_invalid_changes_raise_dom_error(doc, path, change):
+    with pytest.raises(DomError):
+        doc.apply(path, change)
+
+
+def test_void_elements_have_no_content(doc):
+    with pytest.raises(DomError, match="no content"):
+        doc.apply(path_of(doc, tag="img"), {"text": "x"})
+
+
+def test_raw_text_cannot_close_its_element(doc):
+    with pytest.raises(DomError, match="end tag"):
+        doc.apply(path_of(doc, tag="style"), {"text": "</style><script>x</script>"})
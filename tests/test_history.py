@@ -0,0 +1,169 @@
+import random
+
+import pytest
+
+from history import (
+    HISTORY_KEYFRAME_INTERVAL,
+    HistoryStore,
+    VersionInfo,
+    apply_delta,
+    make_delta,
+    retained,
+)
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+
+
+def document(seed: int, lines: int = 200) -> bytes:
+    rng = random.Random(seed)
+    return b"".join(b"line %d %d\n" % (i, rng.randrange(10)) for i in range(lines))
+
+
+def edited(data: bytes, rng: random.Random) -> bytes:
+    lines = data.splitlines(keepends=True)
+    pos = rng.randrange(len(lines) + 1)
+    choice = rng.randrange(3)
+    if choice == 0 and lines:
+        del lines[min(pos, len(lines) - 1)]
+    elif choice == 1:
+        lines.insert(pos, b"inserted %d\n" % rng.randrange(1000))
+    elif lines:
+        lines[min(pos, len(lines) - 1)] = b"changed %d\n" % rng.randrange(1000)
+    return b"".join(lines)
+
+
+@pytest.mark.parametrize(
+    "base, new",
+    [
+        (b"", b""),
+        (b"", b"a\nb\n"),
+        (b"a\nb\n", b""),
+        (b"a\nb\nc\n", b"a\nB\nc\n"),
+        (b"a\nb", b"a\nb\n"),
+        (b"a\r\nb\r\n", b"a\r\nx\r\nb\r\n"),
+        (b"\x00\xff\n\x01", b"\x00\xfe\n\x01\x02"),
+        (document(1), document(2)),
+    ],
+)
+def test_delta_round_trip(base, new):
+    assert apply_delta(base, make_delta(base, new)) == new
+
+
+def test_local_edit_delta_is_small():
+    base = document(1, lines=2000)
+    new = base.replace(b"line 1000 ", b"line 1000 edited ")
+    assert len(make_delta(base, new)) < 100
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(tmp_path / "history")
+
+
+def record_edits(store, count: int, now: float = 0.0, step: float = 1.0):
+    rng = random.Random(7)
+    data = document(0)
+    contents = {}
+    for i in range(count):
+        data = edited(data, rng)
+        version = store.record("p", "index.html", data, now=now + i * step)
+        contents[version] = data
+    return contents
+
+
+def test_every_version_reads_back(store, tmp_path):
+    contents = record_edits(store, 3 * HISTORY_KEYFRAME_INTERVAL + 5)
+    for version, data in contents.items():
+        assert store.get("p", "index.html", version) == data
+    # a second store (another worker) reads the same files from disk
+    other = HistoryStore(tmp_path / "history")
+    for version, data in contents.items():
+        assert other.get("p", "index.html", version) == data
+
+
+def test_keyframes_bound_the_delta_chain(store):
+    record_edits(store, 3 * HISTORY_KEYFRAME_INTERVAL + 5)
+    versions = store.versions("p", "index.html")
+    assert versions[0].full
+    assert not all(v.full for v in versions)
+    run = longest = 0
+    for info in versions:
+        run = 0 if info.full else run + 1
+        longest = max(longest, run)
+    assert longest < HISTORY_KEYFRAME_INTERVAL
+
+
+def test_unchanged_content_is_not_recorded(store):
+    assert store.record("p", "a.css", b"a {}\n", now=1) == 1
+    assert store.record("p", "a.css", b"a {}\n", now=2) is None
+    assert [v.version for v in store.versions("p", "a.css")] == [1]
+
+
+def test_previous_content_is_kept(store):
+    store.record("p", "a.css", b"v1\n", now=1)
+    # v2 was written outside the app; the save replacing it records it first
+    version = store.record("p", "a.css", b"v3\n", previous=b"v2\n", now=2)
+    assert version == 3
+    assert store.get("p", "a.css", 2) == b"v2\n"
+    assert store.get("p", "a.css", 3) == b"v3\n"
+
+
+def test_missing_version_raises_key_error(store):
+    store.record("p", "a.css", b"v1\n", now=1)
+    with pytest.raises(KeyError):
+        store.get("p", "a.css", 5)
+
+
+def test_compaction_keeps_retained_versions_readable(store, tmp_path):
+    # one version an hour for ten days
+    contents = record_edits(store, 240, step=HOUR)
+    now = 240 * HOUR
+    before = store.versions("p", "index.html")
+    expected = [v.version for v in retained(before, now)]
+
+    count_before, count_after = store.compact("p", "index.html", now=now)
+
+    assert count_before == 240
+    assert count_after == len(expected) < 240
+    after = store.versions("p", "index.html")
+    assert [v.version for v in after] == expected
+    assert after[-1].version == 240
+    for version in expected:
+        assert store.get("p", "index.html", version) == contents[version]
+    dropped = next(v for v in contents if v not in expected)
+    with pytest.raises(KeyError):
+        store.get("p", "index.html", dropped)
+    # recording continues after the compacted versions, readable from disk
+    store.record("p", "index.html", b"after\n", now=now + 1)
+    other = HistoryStore(tmp_path / "history")
+    assert other.get("p", "index.html", 241) == b"after\n"
+    assert other.get("p", "index.html", expected[0]) == contents[expected[0]]
+
+
+def test_compaction_without_drops_is_a_no_op(store):
+    record_edits(store, 5)
+    assert store.compact("p", "index.html", now=10) == (5, 5)
+
+
+def info(version: int, time: float) -> VersionInfo:
+    return VersionInfo(version, time, 0, "", True, 0, 0)
+
+
+def test_retention_tiers():
+    now = 400 * DAY
+    versions = [
+        info(1, now - 300 * DAY),  # past the last tier: dropped
+        info(2, now - 100 * DAY),  # same day as 3: only the newer kept
+        info(3, now - 100 * DAY + 60),
+        info(4, now - 3 * DAY),  # same hour as 5
+        info(5, now - 3 * DAY + 60),
+        info(6, now - HOUR),  # last day: all kept
+        info(7, now - HOUR + 1),
+    ]
+    assert [v.version for v in retained(versions, now)] == [3, 5, 6, 7]
+
+
+def test_retention_always_keeps_the_newest():
+    now = 1000 * DAY
+    assert [v.version for v in retained([info(1, 0), info(2, 1)], now)] == [2]
@@ -0,0 +1,100 @@
+import difflib
+
+import pytest
+
+from patching import PatchError, apply_edits, apply_unified_diff
+
+
+def udiff(a: str, b: str) -> str:
+    """`diff -u` output, including its marker for a missing final newline."""
+    lines = difflib.unified_diff(
+        a.splitlines(keepends=True), b.splitlines(keepends=True), "a", "b"
+    )
+    return "".join(
+        line if line.endswith("\n") else line + "\n\\ No newline at end of file\n"
+        for line in lines
+    )
+
+
+def test_edits_use_base_offsets_in_any_order():
+    text = "hello world"
+    edits = [
+        {"start": 6, "end": 11, "text": "there"},
+        {"start": 0, "end": 5, "text": "hi"},
+    ]
+    assert apply_edits(text, edits) == "hi there"
+
+
+def test_edit_insert_and_delete():
+    assert apply_edits("abc", [{"start": 1, "end": 1, "text": "X"}]) == "aXbc"
+    assert apply_edits("abc", [{"start": 0, "end": 3}]) == ""
+
+
+def test_edit_offsets_are_code_points():
+    assert apply_edits("é€x", [{"start": 1, "end": 2, "text": "E"}]) == "éEx"
+
+
+@pytest.mark.parametrize(
+    "edits",
+    [
+        {"start": 0, "end": 1, "text": "x"},
+        "edit",
+        None,
+        [None],
+        ["start"],
+        [{"start": 0, "end": 1, "text": None}],
+        [{"start": 0, "end": 1, "text": 5}],
+        [{"start": 0, "text": "x"}],
+        [{"start": "a", "end": 1, "text": "x"}],
+        [{"start": 2, "end": 1, "text": "x"}],
+        [{"start": 0, "end": 99, "text": "x"}],
+        [{"start": -1, "end": 0, "text": "x"}],
+        [{"start": 0, "end": 2, "text": "x"}, {"start": 1, "end": 3, "text": "y"}],
+    ],
+)
+def test_malformed_edits_raise_patch_error(edits):
+    with pytest.raises(PatchError):
+        apply_edits("abcdef", edits)
+
+
+@pytest.mark.parametrize(
+    "base, new",
+    [
+        ("a\nb\nc\n", "a\nB\nc\n"),
+        ("a\nb\nc\n", "x\na\nb\nc\n"),
+        ("a\nb\nc\n", "a\nb\nc\nd\n"),
+        ("a\nb\nc\n", ""),
+        ("", "new\n"),
+        ("a\nb", "a\nb\n"),
+        ("a\nb\n", "a\nc"),
+        (
+            "".join(f"line {i}\n" for i in range(50)),
+            "".join(f"line {i}\n" for i in range(50) if i not in (3, 30)) + "end\n",
+        ),
+    ],
+)
+def test_unified_diff_round_trip(base, new):
+    assert apply_unified_diff(base, udiff(base, new)) == new
+
+
+def test_unified_diff_context_mismatch():
+    diff = udiff("a\nb\nc\n", "a\nB\nc\n")
+    with pytest.raises(PatchError, match="context mismatch"):
+        apply_unified_diff("a\nX\nc\n", diff)
+
+
+@pytest.mark.parametrize(
+    "diff",
+    [
+        None,
+        b"@@ -1 +1 @@\n-a\n+b\n",
+        "",
+        "--- a\n+++ b\n",
+        "@@ -1,2 +1,2 @@\n-a\n+b\n",
+        "@@ -1 +1 @@\n?a\n",
+        "@@ -5 +5 @@\n-a\n+b\n",
+    ],
+)
+def test_malformed_diffs_raise_patch_error(diff):
+    with pytest.raises(PatchError):
+        apply_unified_diff("a\nb\n", diff)
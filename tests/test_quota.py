@@ -0,0 +1,108 @@
+import io
+
+import pytest
+
+from quota import LimitedReader, Quota, QuotaExceeded, QuotaManager
+from registry import ProjectRegistry
+
+
+@pytest.fixture
+def quotas(tmp_path):
+    """Project "p" using 100 bytes in 1 file, allowed 1000 bytes in 5 files."""
+    project = tmp_path / "p"
+    project.mkdir()
+    (project / "index.html").write_bytes(b"x" * 100)
+    registry = ProjectRegistry(tmp_path)
+    registry.refresh("p")
+    return QuotaManager(registry, default=Quota(max_bytes=1000, max_files=5))
+
+
+def reserved(quotas):
+    usage = quotas.usage("p")
+    return usage["reserved_bytes"], usage["reserved_files"]
+
+
+def test_known_size_holds_bytes_and_a_file_until_exit(quotas):
+    with quotas.reserve("p", 300) as reservation:
+        assert reservation.limit == 900
+        assert reserved(quotas) == (300, 1)
+        assert quotas.usage("p")["available_bytes"] == 600
+    assert reserved(quotas) == (0, 0)
+
+
+def test_concurrent_reservations_cannot_overshoot(quotas):
+    with quotas.reserve("p", 600):
+        with pytest.raises(QuotaExceeded):
+            with quotas.reserve("p", 400):
+                pass
+        with quotas.reserve("p", 300):
+            assert reserved(quotas) == (900, 2)
+    assert reserved(quotas) == (0, 0)
+
+
+def test_unknown_size_holds_the_limit_until_settled(quotas):
+    with quotas.reserve("p", None) as reservation:
+        assert reservation.limit == 900
+        assert reserved(quotas) == (900, 1)
+        with pytest.raises(QuotaExceeded):
+            with quotas.reserve("p", 1):
+                pass
+        reservation.settle(250)
+        assert reserved(quotas) == (250, 1)
+        # settling never grows the hold
+        reservation.settle(400)
+        assert reserved(quotas) == (250, 1)
+        with quotas.reserve("p", 600):
+            pass
+    assert reserved(quotas) == (0, 0)
+
+
+def test_replacing_a_file_holds_only_the_growth(quotas):
+    with quotas.reserve("p", 950, previous_size=100) as reservation:
+        assert reservation.limit == 1000
+        assert reserved(quotas) == (850, 0)
+    with pytest.raises(QuotaExceeded):
+        with quotas.reserve("p", 1001, previous_size=100):
+            pass
+
+
+def test_settle_counts_the_replaced_file(quotas):
+    with quotas.reserve("p", None, previous_size=100) as reservation:
+        assert reserved(quotas) == (900, 0)
+        reservation.settle(150)
+        assert reserved(quotas) == (50, 0)
+
+
+def test_hold_is_released_when_the_write_fails(quotas):
+    with pytest.raises(RuntimeError):
+        with quotas.reserve("p", 500):
+            raise RuntimeError("write failed")
+    assert reserved(quotas) == (0, 0)
+
+
+def test_file_quota(quotas):
+    with quotas.reserve("p", 10, files=4):
+        assert reserved(quotas) == (10, 4)
+        with pytest.raises(QuotaExceeded, match="file quota"):
+            with quotas.reserve("p", 10):
+                pass
+    with pytest.raises(QuotaExceeded, match="4 files of quota left"):
+        with quotas.reserve("p", 10, files=5):
+            pass
+
+
+def test_new_project_gets_the_default_quota(quotas):
+    with pytest.raises(QuotaExceeded):
+        with quotas.reserve("new", 1001, files=1):
+            pass
+    quotas.overrides["big"] = Quota(max_bytes=None)
+    with quotas.reserve("big", 10**9, files=1000):
+        pass
+
+
+def test_limited_reader_stops_past_the_limit():
+    reader = LimitedReader(io.BytesIO(b"x" * 100), 60, "p")
+    assert len(reader.read(50)) == 50
+    with pytest.raises(QuotaExceeded):
+        reader.read(50)
+    assert reader.count == 100